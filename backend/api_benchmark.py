@@ -0,0 +1,341 @@
+"""
+API Benchmark
+p50 / p99 latency and throughput per endpoint and parameter mix, saved as JSON for diffing between commits
+
+Usage: python -m api_benchmark [--requests 200] [--concurrency 4] [--only tariffs_first_page,stats] [--no-cache]
+       python -m api_benchmark --url http://localhost:8000      (benchmark a running server)
+       python -m api_benchmark --compare old.json new.json [--threshold 0.1]
+       python -m api_benchmark --no-cache --scaling 1,2,4,8   (throughput of the heavy endpoints per client count)
+
+Without --url a uvicorn server is started on DATABASE_URL (SQLite or Postgres);
+fill it first with python -m synthetic_data.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import platform
+import argparse
+import threading
+import subprocess
+import numpy as np
+import requests
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, func
+from database import (
+    SessionLocal, engine, DATABASE_URL, Tariff, TariffHistory, TariffTrendInterval, TariffTrendRollup
+)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = "benchmark_results"
+SAMPLE_CODES = 500
+CURSOR_PAGES = 20
+SERVER_START_SECONDS = 120
+# CPU-heavy handlers whose throughput should rise with concurrency when they run off the event loop
+SCALING_SCENARIOS = ["trends_raw_code", "hierarchy_trends", "lookup_1000", "duty_10000"]
+
+
+def _sample(db, country: str) -> list:
+    codes = db.execute(select(Tariff.hs_code).where(Tariff.country == country).limit(20000)).scalars().all()
+    return random.Random(country).sample(codes, min(SAMPLE_CODES, len(codes)))
+
+
+def _context(base_url: str, session: requests.Session) -> dict:
+    """Codes, prefixes and keyset cursors the scenarios draw their parameters from"""
+    db = SessionLocal()
+    try:
+        context = {"codes": {country: _sample(db, country) for country in ("US", "China")}}
+    finally:
+        db.close()
+    context["chapters"] = sorted({code[:2] for codes in context["codes"].values() for code in codes})
+    context["headings"] = sorted({code[:4] for code in context["codes"]["US"]})
+
+    cursors, cursor = [], None
+    for _ in range(CURSOR_PAGES):
+        params = {"limit": 100, "include_total": "false"}
+        if cursor:
+            params["cursor"] = cursor
+        cursor = session.get(f"{base_url}/api/tariffs", params=params).json().get("next_cursor")
+        if not cursor:
+            break
+        cursors.append(cursor)
+    context["cursors"] = cursors or [None]
+    return context
+
+
+def _us_code(rng, context):
+    return rng.choice(context["codes"]["US"] or [""])
+
+
+# name -> (method, path, parameter/body factory, share of --requests to run)
+SCENARIOS = {
+    "tariffs_first_page": ("GET", "/api/tariffs", lambda rng, ctx: {"limit": 100}, 1.0),
+    "tariffs_prefix": ("GET", "/api/tariffs", lambda rng, ctx: {
+        "hs_code": rng.choice(ctx["chapters"] + ctx["headings"]), "limit": 100}, 1.0),
+    "tariffs_offset": ("GET", "/api/tariffs", lambda rng, ctx: {
+        "skip": rng.randrange(0, 20000, 100), "limit": 100, "include_total": "false"}, 1.0),
+    "tariffs_cursor": ("GET", "/api/tariffs", lambda rng, ctx: {
+        "cursor": rng.choice(ctx["cursors"]), "limit": 100, "include_total": "false"}, 1.0),
+    "tariffs_columnar_1000": ("GET", "/api/tariffs", lambda rng, ctx: {
+        "hs_code": rng.choice(ctx["chapters"]), "limit": 1000, "format": "columnar"}, 0.5),
+    "changes_7d": ("GET", "/api/changes", lambda rng, ctx: {"days": 7, "limit": 100}, 1.0),
+    "changes_window": ("GET", "/api/changes", lambda rng, ctx: {
+        "days": rng.choice([30, 90, 365]), "country": "US", "limit": 100}, 1.0),
+    "trends_raw_code": ("GET", "/api/trends", lambda rng, ctx: {
+        "country": "US", "hs_code": _us_code(rng, ctx), "days": 1825}, 1.0),
+    "trends_raw_code_downsampled": ("GET", "/api/trends", lambda rng, ctx: {
+        "country": "US", "hs_code": _us_code(rng, ctx), "days": 1825, "max_points": 200}, 1.0),
+    "trends_week_code": ("GET", "/api/trends", lambda rng, ctx: {
+        "country": "US", "hs_code": _us_code(rng, ctx), "days": 1825, "granularity": "week"}, 1.0),
+    "trends_raw_country_30d": ("GET", "/api/trends", lambda rng, ctx: {
+        "country": "US", "days": rng.choice([7, 14, 30])}, 0.05),
+    "hierarchy_chapters": ("GET", "/api/hierarchy", lambda rng, ctx: {"country": "US"}, 1.0),
+    "hierarchy_trends": ("GET", "/api/hierarchy/trends", lambda rng, ctx: {
+        "country": "US", "prefix": rng.choice(ctx["headings"] or ["01"]), "days": 365}, 0.5),
+    "stats": ("GET", "/api/stats", lambda rng, ctx: {}, 1.0),
+    "as_of": ("GET", "/api/tariffs/as-of", lambda rng, ctx: {
+        "country": "US", "hs_code": _us_code(rng, ctx),
+        "at": (datetime.utcnow() - timedelta(days=rng.randrange(1825))).date().isoformat()}, 1.0),
+    "lookup_1000": ("POST", "/api/tariffs/lookup", lambda rng, ctx: {"keys": [
+        {"country": "US", "hs_code": _us_code(rng, ctx)} for _ in range(1000)]}, 0.25),
+    "duty_10000": ("POST", "/api/duty/calculate", lambda rng, ctx: {
+        "country": ["US"] * 10000,
+        "hs_code": [_us_code(rng, ctx) for _ in range(10000)],
+        "customs_value": [round(rng.uniform(100, 100000), 2) for _ in range(10000)]}, 0.25),
+}
+
+
+def _percentile(values, q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def run_scenario(base_url: str, name: str, context: dict, requests_count: int, concurrency: int,
+                 warmup: int, seed: int) -> dict:
+    """Issue requests_count requests from `concurrency` threads; latencies in ms"""
+    method, path, factory, _ = SCENARIOS[name]
+    rng = random.Random(f"{seed}:{name}")
+    calls = [factory(rng, context) for _ in range(requests_count + warmup)]
+    local = threading.local()
+
+    def call(arguments):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        if method == "GET":
+            response = session.get(f"{base_url}{path}", params=arguments)
+        else:
+            response = session.post(f"{base_url}{path}", json=arguments)
+        size = len(response.content)
+        return (time.perf_counter() - started) * 1000, response.status_code, size
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, calls[:warmup]))
+        started = time.perf_counter()
+        results = list(pool.map(call, calls[warmup:]))
+        wall = time.perf_counter() - started
+
+    latencies = [ms for ms, status, _ in results if status < 400]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, status, _ in results if status >= 400),
+        "p50_ms": _percentile(latencies, 50),
+        "p90_ms": _percentile(latencies, 90),
+        "p99_ms": _percentile(latencies, 99),
+        "mean_ms": round(float(np.mean(latencies)), 3) if latencies else None,
+        "max_ms": round(max(latencies), 3) if latencies else None,
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "mean_bytes": int(np.mean([size for _, _, size in results])) if results else 0
+    }
+
+
+def run_scaling(base_url: str, names, levels, context: dict, requests_count: int, warmup: int, seed: int) -> dict:
+    """
+    Throughput of each scenario at each client concurrency, with its speedup over the first level.
+
+    A handler that stalls the event loop serves one request at a time however
+    many clients wait, so its speedup stays near 1.
+    """
+    results = {}
+    for name in names:
+        count = max(1, int(requests_count * SCENARIOS[name][3]))
+        runs = {}
+        for level in levels:
+            run = run_scenario(base_url, name, context, count, level, warmup, seed)
+            base = next(iter(runs.values()), run)["throughput_rps"]
+            run["speedup"] = round(run["throughput_rps"] / base, 2) if base and run["throughput_rps"] else None
+            runs[str(level)] = run
+            print(f"{name:32} x{level:<4} p50 {run['p50_ms']:>9} ms  {run['throughput_rps']:>8} req/s  "
+                  f"speedup {run['speedup']}  errors {run['errors']}", flush=True)
+        results[name] = runs
+    return results
+
+
+def _dataset() -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            model.__tablename__: db.execute(select(func.count()).select_from(model)).scalar()
+            for model in (Tariff, TariffHistory, TariffTrendInterval, TariffTrendRollup)
+        }
+    finally:
+        db.close()
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(no_cache: bool = False):
+    """uvicorn on a free local port against DATABASE_URL; returns (process, base_url)"""
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=DATABASE_URL)
+    if no_cache:
+        env["RESPONSE_CACHE_SIZE"] = "0"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {process.returncode})")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"Server did not answer /health within {SERVER_START_SECONDS}s")
+
+
+def run_benchmarks(base_url: str = None, scenarios=None, requests_count: int = 200, concurrency: int = 4,
+                   warmup: int = 5, seed: int = 1, no_cache: bool = False, scaling=None) -> dict:
+    """
+    Run every scenario (or the named ones) and return the result document.
+
+    With scaling (a list of client counts) the named scenarios, or
+    SCALING_SCENARIOS, are instead swept across those concurrency levels.
+    """
+    names = list(scenarios or SCENARIOS)
+    process = None
+    if base_url is None:
+        process, base_url = start_server(no_cache)
+    try:
+        context = _context(base_url, requests.Session())
+        results = {}
+        if scaling:
+            results = run_scaling(base_url, list(scenarios or SCALING_SCENARIOS), scaling, context,
+                                  requests_count, warmup, seed)
+        for name in [] if scaling else names:
+            count = max(1, int(requests_count * SCENARIOS[name][3]))
+            results[name] = run_scenario(base_url, name, context, count, concurrency, warmup, seed)
+            print(f"{name:32} p50 {results[name]['p50_ms']:>9} ms  p99 {results[name]['p99_ms']:>9} ms  "
+                  f"{results[name]['throughput_rps']:>8} req/s  errors {results[name]['errors']}", flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "database": engine.dialect.name,
+            "server": "spawned" if process is not None else base_url,
+            "response_cache": not no_cache,
+            "requests": requests_count,
+            "concurrency": scaling or concurrency,
+            "warmup": warmup,
+            "seed": seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "dataset": _dataset()
+        },
+        "scaling" if scaling else "scenarios": results
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float = 0.1) -> int:
+    """Print p50/p99 changes between two result files; returns how many scenarios regressed"""
+    with open(old_path) as handle:
+        old = json.load(handle)
+    with open(new_path) as handle:
+        new = json.load(handle)
+    if "scenarios" not in old or "scenarios" not in new:
+        print("Concurrency sweeps (--scaling) are not compared; diff their speedup columns by hand")
+        return 0
+    print(f"{old['meta'].get('commit')} ({old['meta']['database']}) -> "
+          f"{new['meta'].get('commit')} ({new['meta']['database']})")
+    regressions = 0
+    for name in sorted(set(old["scenarios"]) | set(new["scenarios"])):
+        before, after = old["scenarios"].get(name), new["scenarios"].get(name)
+        if not before or not after or before["p50_ms"] is None or after["p50_ms"] is None:
+            print(f"{name:32} only in {'new' if after else 'old'} results")
+            continue
+        changes = {q: (after[q] - before[q]) / before[q] if before[q] else 0.0 for q in ("p50_ms", "p99_ms")}
+        regressed = changes["p50_ms"] > threshold
+        regressions += regressed
+        print(f"{name:32} p50 {before['p50_ms']:>9} -> {after['p50_ms']:>9} ms ({changes['p50_ms']:+.0%})  "
+              f"p99 {before['p99_ms']:>9} -> {after['p99_ms']:>9} ms ({changes['p99_ms']:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the read API")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario (heavy ones run fewer)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent client threads")
+    parser.add_argument("--scaling", help="Comma-separated client counts to sweep (e.g. 1,2,4,8) instead of --concurrency")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument("--only", help=f"Comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--seed", type=int, default=1, help="Parameter-mix seed")
+    parser.add_argument("--no-cache", action="store_true", help="Start the server with the response cache disabled")
+    parser.add_argument("--output", help=f"Result file (default: {DEFAULT_OUTPUT_DIR}/api-<db>-<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    only = [name for name in (args.only or "").split(",") if name]
+    unknown = [name for name in only if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    try:
+        scaling = [int(level) for level in args.scaling.split(",") if level] if args.scaling else None
+    except ValueError:
+        parser.error("--scaling takes comma-separated integers")
+    document = run_benchmarks(args.url, only, args.requests, args.concurrency, args.warmup, args.seed, args.no_cache,
+                              scaling)
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR,
+        f"api-{document['meta']['database']}-{document['meta']['commit'] or 'unknown'}-"
+        f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(document, handle, indent=2)
+    print(f"Results written to {output}")
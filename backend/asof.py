@@ -0,0 +1,113 @@
+"""
+As-Of Rate Lookup
+In-memory temporal index over tariff_trend_intervals for point-in-time rate lookups
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import TariffTrendInterval
+from hs_search import normalize_hs_code
+from response_cache import current_generation, single_flight
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsOfIndex:
+    """
+    Rate timelines per (upper-cased country, normalized HS code).
+
+    Each timeline is a sorted array of interval starts with the matching rates,
+    so the rate in effect at any moment is one bisect. Intervals are contiguous
+    per code, which makes the next start the previous interval's end. The index
+    rebuilds itself when the data generation moves.
+    """
+
+    def __init__(self):
+        self._timelines = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def refresh(self, db: Session):
+        generation = current_generation(db)
+        if generation == self._generation:
+            return
+        with single_flight(self._building, self._generation is not None) as build:
+            if build:
+                self._rebuild(db, generation)
+
+    def _rebuild(self, db: Session, generation: int):
+        # Build outside the lock: readers on other worker threads keep using the
+        # current index while this one runs its queries
+        started = time.perf_counter()
+        timelines = {}
+        rows = db.execute(
+            select(
+                TariffTrendInterval.country, TariffTrendInterval.hs_code,
+                TariffTrendInterval.product_description, TariffTrendInterval.rate,
+                TariffTrendInterval.valid_from
+            ).order_by(TariffTrendInterval.country, TariffTrendInterval.hs_code, TariffTrendInterval.valid_from)
+        )
+        for country, hs_code, description, rate, valid_from in rows:
+            key = ((country or "").upper(), normalize_hs_code(hs_code))
+            timeline = timelines.get(key)
+            if timeline is None:
+                timeline = timelines[key] = {
+                    "country": country, "hs_code": hs_code, "starts": [], "rates": [], "descriptions": []
+                }
+            timeline["starts"].append(valid_from)
+            timeline["rates"].append(rate)
+            timeline["descriptions"].append(description)
+        with self._lock:
+            if self._generation is None or generation > self._generation:
+                self._timelines = timelines
+                self._generation = generation
+        logger.info(
+            f"As-of index rebuilt for generation {generation}: {len(timelines)} codes "
+            f"in {round(time.perf_counter() - started, 4)}s"
+        )
+
+    def _resolve(self, timeline: dict, moment: datetime):
+        starts = timeline["starts"]
+        position = bisect_right(starts, moment) - 1
+        if position < 0:
+            return None
+        return {
+            "country": timeline["country"],
+            "hs_code": timeline["hs_code"],
+            "product_description": timeline["descriptions"][position],
+            "rate": timeline["rates"][position],
+            "valid_from": starts[position],
+            "valid_to": starts[position + 1] if position + 1 < len(starts) else None
+        }
+
+    def lookup(self, country: str, hs_code: str, moment: datetime):
+        """Rate in effect for one code at moment, or None if unknown then"""
+        timeline = self._timelines.get(((country or "").upper(), normalize_hs_code(hs_code)))
+        if timeline is None:
+            return None
+        return self._resolve(timeline, moment)
+
+    def snapshot(self, moment: datetime, country: str = None, prefix: str = None) -> list:
+        """Every code's rate at moment, optionally limited to a country and HS digits prefix"""
+        country = country.upper() if country else None
+        results = []
+        for (code_country, digits), timeline in self._timelines.items():
+            if country and code_country != country:
+                continue
+            if prefix and not digits.startswith(prefix):
+                continue
+            entry = self._resolve(timeline, moment)
+            if entry is not None:
+                results.append(entry)
+        results.sort(key=lambda entry: (entry["country"], entry["hs_code"]))
+        return results
+
+
+as_of_index = AsOfIndex()
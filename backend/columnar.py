@@ -0,0 +1,162 @@
+"""
+Columnar Responses
+ORM-free {"columns": [...], "rows": [[...]]} payloads for the list endpoints, encoded with orjson
+
+Usage: python -m columnar [--rows N] [--repeat N]   (per-row cost of records vs columnar)
+"""
+
+import json
+import time
+import argparse
+from datetime import datetime, date, timedelta
+from sqlalchemy import create_engine, desc, insert
+from sqlalchemy.orm import sessionmaker
+from database import Base, Tariff, TariffHistory, TariffTrendRollup
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the stdlib encoder
+    orjson = None
+
+FORMATS = ("records", "columnar")
+
+# Response column name -> selected column, in output order
+TARIFF_COLUMNS = {
+    "id": Tariff.id,
+    "country": Tariff.country,
+    "hs_code": Tariff.hs_code,
+    "product_description": Tariff.product_description,
+    "rate": Tariff.rate,
+    "effective_date": Tariff.effective_date,
+    "last_updated": Tariff.last_updated
+}
+CHANGE_COLUMNS = {
+    "id": TariffHistory.id,
+    "country": TariffHistory.country,
+    "hs_code": TariffHistory.hs_code,
+    "old_rate": TariffHistory.old_rate,
+    "new_rate": TariffHistory.new_rate,
+    "change_date": TariffHistory.change_date,
+    "change_reason": TariffHistory.change_reason
+}
+ROLLUP_COLUMNS = (
+    TariffTrendRollup.bucket_start, TariffTrendRollup.country, TariffTrendRollup.hs_code,
+    TariffTrendRollup.last_rate, TariffTrendRollup.rate_sum, TariffTrendRollup.samples,
+    TariffTrendRollup.min_rate, TariffTrendRollup.max_rate, TariffTrendRollup.product_description,
+    TariffTrendRollup.last_record_date
+)
+TREND_FIELDS = ["date", "country", "hs_code", "rate", "product_description"]
+ROLLUP_FIELDS = ["date", "country", "hs_code", "rate", "avg_rate", "min_rate", "max_rate", "product_description"]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """Encode to JSON bytes; datetimes come out as ISO strings either way"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def columnar_body(meta: dict, columns, rows) -> bytes:
+    """meta plus a column list and one JSON array per row, encoded in one pass"""
+    return dumps({**meta, "columns": list(columns), "rows": [tuple(row) for row in rows]})
+
+
+def trend_rows(points) -> list:
+    return [
+        (point.record_date.date(), point.country, point.hs_code, point.rate, point.product_description)
+        for point in points
+    ]
+
+
+def rollup_rows(buckets) -> list:
+    return [
+        (bucket.bucket_start.date(), bucket.country, bucket.hs_code, bucket.last_rate,
+         bucket.rate_sum / bucket.samples, bucket.min_rate, bucket.max_rate, bucket.product_description)
+        for bucket in buckets
+    ]
+
+
+def benchmark(rows: int = 20000, repeat: int = 5) -> dict:
+    """
+    Time one /api/tariffs page of `rows` rows both ways on a scratch
+    in-memory database: ORM objects + dicts + jsonable_encoder (records)
+    against a column select + orjson (columnar). Best of `repeat` runs.
+    """
+    from response_cache import _serialize  # The encoder the records path goes through
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Tariff), [
+            {
+                "country": "US" if i % 2 else "CHINA",
+                "hs_code": f"{i // 100:04d}.{i % 100:02d}",
+                "hs_digits": f"{i // 100:04d}{i % 100:02d}",
+                "product_description": f"Synthetic product {i}",
+                "rate": round((i % 250) / 10, 1),
+                "effective_date": now - timedelta(days=i % 365),
+                "last_updated": now - timedelta(seconds=i)
+            }
+            for i in range(rows)
+        ])
+    session = sessionmaker(bind=engine)()
+
+    def records():
+        started = time.perf_counter()
+        tariffs = session.query(Tariff).order_by(desc(Tariff.last_updated), desc(Tariff.id)).limit(rows).all()
+        data = [
+            {
+                "id": t.id,
+                "country": t.country,
+                "hs_code": t.hs_code,
+                "product_description": t.product_description,
+                "rate": t.rate,
+                "effective_date": t.effective_date,
+                "last_updated": t.last_updated
+            }
+            for t in tariffs
+        ]
+        fetched = time.perf_counter()
+        body = _serialize({"total": rows, "data": data})
+        session.expunge_all()
+        return fetched - started, time.perf_counter() - fetched, len(body)
+
+    def columnar():
+        started = time.perf_counter()
+        result = session.query(*TARIFF_COLUMNS.values()).order_by(
+            desc(Tariff.last_updated), desc(Tariff.id)).limit(rows).all()
+        fetched = time.perf_counter()
+        body = columnar_body({"total": rows}, TARIFF_COLUMNS, result)
+        return fetched - started, time.perf_counter() - fetched, len(body)
+
+    results = {"rows": rows, "encoder": "orjson" if orjson is not None else "json"}
+    try:
+        for name, run in (("records", records), ("columnar", columnar)):
+            runs = [run() for _ in range(repeat)]
+            fetch = min(r[0] for r in runs)
+            encode = min(r[1] for r in runs)
+            results[name] = {
+                "fetch_us_per_row": round(fetch / rows * 1e6, 3),
+                "encode_us_per_row": round(encode / rows * 1e6, 3),
+                "total_ms": round((fetch + encode) * 1000, 2),
+                "bytes": runs[0][2]
+            }
+    finally:
+        session.close()
+        engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare records and columnar response costs")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the page")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per format (best is reported)")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.rows, args.repeat), indent=2))
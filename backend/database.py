@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Index
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Index, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -10,12 +13,46 @@ load_dotenv()
 # Use SQLite for simplicity (can switch to PostgreSQL later)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tariff_data.db")
 
+# Read handlers run their sync query and post-processing code on this many
+# worker threads, each holding one pooled connection while it works
+READ_WORKERS = int(os.getenv("READ_WORKERS", "16"))
+
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=max(READ_WORKERS, int(os.getenv("DB_POOL_SIZE", "20"))),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str) -> str:
+    """Swap a sync driver URL for its asyncio equivalent"""
+    if url.startswith("sqlite+aiosqlite") or url.startswith("postgresql+asyncpg"):
+        return url
+    if url.startswith("sqlite"):
+        return "sqlite+aiosqlite" + url[len("sqlite"):]
+    if url.startswith("postgres"):
+        # postgresql://, postgresql+psycopg2:// and Heroku-style postgres://
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+# Async engine for the read endpoints, so queries don't block the event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True
+    )
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
 class Tariff(Base):
@@ -24,6 +61,7 @@ class Tariff(Base):
     id = Column(Integer, primary_key=True, index=True)
     country = Column(String, index=True)  # "US" or "China"
     hs_code = Column(String, index=True)  # Product code
+    hs_digits = Column(String)  # Digits-only hs_code for prefix search
     product_description = Column(Text)
     rate = Column(Float)  # Tariff rate
     effective_date = Column(DateTime)
@@ -31,8 +69,10 @@ class Tariff(Base):
     last_updated = Column(DateTime, default=datetime.utcnow)
     
     __table_args__ = (
-        Index('idx_country_hs_code', 'country', 'hs_code'),
+        Index('idx_country_hs_code', 'country', 'hs_code', unique=True),  # Upsert conflict target
         Index('idx_effective_date', 'effective_date'),
+        Index('idx_last_updated_id', 'last_updated', 'id'),  # Keyset pagination
+        Index('idx_country_hs_digits', 'country', 'hs_digits'),  # HS prefix search
     )
 
 class TariffHistory(Base):
@@ -46,6 +86,10 @@ class TariffHistory(Base):
     new_rate = Column(Float)
     change_date = Column(DateTime, default=datetime.utcnow)
     change_reason = Column(Text)
+    
+    __table_args__ = (
+        Index('idx_change_date_id', 'change_date', 'id'),  # Keyset pagination
+    )
 
 class TariffTrend(Base):
     __tablename__ = "tariff_trends"
@@ -63,8 +107,166 @@ class TariffTrend(Base):
         Index('idx_hs_code_date', 'hs_code', 'record_date'),
     )
 
+class TariffTrendInterval(Base):
+    __tablename__ = "tariff_trend_intervals"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String)
+    hs_code = Column(String)
+    product_description = Column(Text)
+    rate = Column(Float)
+    valid_from = Column(DateTime)  # Inclusive
+    valid_to = Column(DateTime, nullable=True)  # Exclusive; NULL while the rate is current
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_interval_key', 'country', 'hs_code', 'valid_from', unique=True),
+        Index('idx_interval_valid_to', 'valid_to'),
+    )
+
+class TariffProgramRate(Base):
+    __tablename__ = "tariff_program_rates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String)  # Importing country whose schedule the program belongs to
+    hs_code = Column(String)
+    hs_digits = Column(String)
+    program = Column(String)  # e.g. "base", "section_301", "retaliatory"
+    rate = Column(Float)  # Ad valorem percentage, stacked on the other programs
+    effective_date = Column(DateTime)  # Rate applies from here until the program's next row
+    source = Column(String)
+    last_updated = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_program_rate_key', 'country', 'hs_code', 'program', 'effective_date', unique=True),
+        Index('idx_program_rate_digits', 'country', 'hs_digits'),
+    )
+
+class HSHierarchyRollup(Base):
+    __tablename__ = "hs_hierarchy_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String)
+    level = Column(String)  # "chapter" (2 digits), "heading" (4) or "subheading" (6)
+    prefix = Column(String)  # HS digits of this node
+    parent = Column(String, nullable=True)  # Prefix of the enclosing node; NULL for chapters
+    codes = Column(Integer)  # Tariff lines under this node
+    rate_sum = Column(Float)
+    min_rate = Column(Float)
+    max_rate = Column(Float)
+    child_avg_rate = Column(Float)  # Unweighted mean of the child nodes' averages
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_hierarchy_key', 'country', 'prefix', unique=True),
+        Index('idx_hierarchy_parent', 'country', 'level', 'parent'),
+    )
+
+class TariffTrendRollup(Base):
+    __tablename__ = "tariff_trend_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String)  # "day", "week" or "month"
+    bucket_start = Column(DateTime)  # Start of the day / ISO week / month
+    country = Column(String)
+    hs_code = Column(String)
+    product_description = Column(Text)
+    samples = Column(Integer)  # Raw trend rows merged into this bucket
+    rate_sum = Column(Float)
+    min_rate = Column(Float)
+    max_rate = Column(Float)
+    last_rate = Column(Float)  # Rate of the latest record in the bucket
+    last_record_date = Column(DateTime)
+    
+    __table_args__ = (
+        Index('idx_rollup_key', 'granularity', 'country', 'hs_code', 'bucket_start', unique=True),
+        Index('idx_rollup_bucket', 'granularity', 'bucket_start'),
+    )
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+    
+    id = Column(String, primary_key=True)  # uuid4 hex
+    kind = Column(String)  # "scrape" or "import"
+    active_kind = Column(String, nullable=True)  # Same as kind while queued or running; NULL once finished
+    trigger = Column(String)  # "manual", "scheduled" or "import"
+    status = Column(String)  # queued, running, succeeded, failed or skipped
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)  # Refreshed by the worker that owns the job
+    progress = Column(Text, default="[]")  # JSON list of {stage, seconds, count}
+    coalesced_triggers = Column(Integer, default=0)
+    tariffs_processed = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_scrape_job_active', 'active_kind', unique=True),  # One live job per kind across workers
+        Index('idx_scrape_job_finished', 'finished_at'),
+    )
+
+class Watermark(Base):
+    __tablename__ = "watermarks"
+    
+    name = Column(String, primary_key=True)  # e.g. "trend_rollups"
+    value = Column(Integer, default=0)  # Last processed row id
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    
+    name = Column(String, primary_key=True)  # e.g. "tariffs:US", "changes:2024-12-11"
+    value = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+def get_watermark(db, name: str) -> int:
+    """Value of a named watermark, 0 if never set"""
+    mark = db.get(Watermark, name)
+    return mark.value if mark else 0
+
+def set_watermark(db, name: str, value: int):
+    """Set a named watermark in the caller's transaction"""
+    mark = db.get(Watermark, name)
+    if mark is None:
+        db.add(Watermark(name=name, value=value, updated_at=datetime.utcnow()))
+    else:
+        mark.value = value
+        mark.updated_at = datetime.utcnow()
+
+def migrate_schema():
+    """Bring databases created by older versions up to the current schema"""
+    inspector = inspect(engine)
+    tariff_columns = {c["name"] for c in inspector.get_columns("tariffs")}
+    tariff_indexes = {i["name"]: i for i in inspector.get_indexes("tariffs")}
+    hierarchy_columns = {c["name"] for c in inspector.get_columns("hs_hierarchy_rollups")}
+    with engine.begin() as conn:
+        if not tariff_indexes.get("idx_country_hs_code", {}).get("unique"):
+            # Older databases could hold duplicate (country, hs_code) rows; keep the first
+            conn.execute(text(
+                "DELETE FROM tariffs WHERE id NOT IN "
+                "(SELECT MIN(id) FROM tariffs GROUP BY country, hs_code)"
+            ))
+            conn.execute(text("DROP INDEX IF EXISTS idx_country_hs_code"))
+            conn.execute(text("CREATE UNIQUE INDEX idx_country_hs_code ON tariffs (country, hs_code)"))
+        if "hs_digits" not in tariff_columns:
+            conn.execute(text("ALTER TABLE tariffs ADD COLUMN hs_digits VARCHAR"))
+            conn.execute(text(
+                "UPDATE tariffs SET hs_digits = "
+                "REPLACE(REPLACE(REPLACE(hs_code, '.', ''), ' ', ''), '-', '')"
+            ))
+        if "weighted_avg_rate" in hierarchy_columns:
+            # Same values; the old name claimed a weighting it never had
+            conn.execute(text("ALTER TABLE hs_hierarchy_rollups RENAME COLUMN weighted_avg_rate TO child_avg_rate"))
+        # Day rollups are rebuilt from the trend intervals now instead of stored
+        conn.execute(text("DELETE FROM tariff_trend_rollups WHERE granularity = 'day'"))
+        # Indexes added to existing tables are not created by create_all()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 # Create tables
 Base.metadata.create_all(bind=engine)
+migrate_schema()
 
 def get_db():
     db = SessionLocal()
@@ -72,3 +274,31 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    Yield an AsyncSession for short reads made on the event loop itself
+    (e.g. the response cache's generation check). Anything that hydrates
+    rows or computes over them goes through run_in_session() instead.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="read")
+
+async def off_loop(func, *args):
+    """Run func(*args) on a read worker thread and await its result"""
+    return await asyncio.get_running_loop().run_in_executor(read_executor, func, *args)
+
+async def run_in_session(func, *args):
+    """
+    Run func(session, *args) with its own sync Session on a read worker thread.
+
+    AsyncSession.run_sync() only yields while the driver waits on I/O; ORM
+    hydration and everything the handler computes afterwards would still run
+    on the event loop and stall every other request.
+    """
+    def call():
+        with SessionLocal() as db:
+            return func(db, *args)
+    return await off_loop(call)
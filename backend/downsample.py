@@ -0,0 +1,107 @@
+"""
+Series Downsampling
+Shape-preserving point reduction (min/max per bucket, LTTB) for trend charts
+"""
+
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Keep the first and last point plus the min and max of each bucket.
+
+    Extremes survive per bucket, so a step change in tariff rate is never
+    averaged away. Fully vectorized: two lexsorts, no per-point Python loop.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    # Two endpoints plus a min and a max per bucket must fit in max_points
+    buckets = (max_points - 2) // 2
+    if buckets < 1:
+        # No room for a whole bucket: keep the endpoints and, if there is space, the largest swing
+        if max_points < 3:
+            return np.array([0, n - 1][:max_points], dtype=int)
+        extreme = 1 + int(np.argmax(np.abs(y[1:-1] - y[0])))
+        return np.array([0, extreme, n - 1])
+
+    bucket_ids = (np.arange(n) * buckets) // n
+
+    # lexsort sorts by the last key first: within each bucket, ascending / descending y
+    by_min = np.lexsort((y, bucket_ids))
+    by_max = np.lexsort((-y, bucket_ids))
+    firsts = np.flatnonzero(np.r_[True, np.diff(bucket_ids[by_min]) != 0])
+
+    keep = np.concatenate(([0, n - 1], by_min[firsts], by_max[firsts]))
+    return np.unique(keep)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets point selection.
+
+    Each bucket's triangle areas are computed as one vector operation; the
+    loop runs once per output point, not once per input point.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return minmax_indices(y, max_points)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def downsample_rows(rows: list, max_points: int, method: str, key, x, y) -> list:
+    """
+    Reduce each series in rows to at most max_points points.
+
+    rows must be in x order within each series; key, x and y extract the
+    series key, position and value of a row. Returns the kept rows in their
+    original order.
+    """
+    if not rows or not max_points:
+        return rows
+
+    series = {}
+    series_ids = np.fromiter(
+        (series.setdefault(key(row), len(series)) for row in rows), dtype=int, count=len(rows)
+    )
+    xs = np.fromiter((x(row) for row in rows), dtype=float, count=len(rows))
+    ys = np.fromiter((y(row) for row in rows), dtype=float, count=len(rows))
+
+    order = np.argsort(series_ids, kind="stable")
+    boundaries = np.flatnonzero(np.diff(series_ids[order])) + 1
+
+    keep = []
+    for positions in np.split(order, boundaries):
+        if method == "lttb":
+            chosen = lttb_indices(xs[positions], ys[positions], max_points)
+        else:
+            chosen = minmax_indices(ys[positions], max_points)
+        keep.append(positions[chosen])
+
+    return [rows[i] for i in np.sort(np.concatenate(keep))]
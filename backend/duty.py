@@ -0,0 +1,231 @@
+"""
+Duty Calculation
+Vectorized landed-duty calculation stacking every rate program in effect on each line's date
+
+Usage: python -m duty invoices.csv duties.csv [--chunksize N]
+       (CSV columns: country, hs_code, customs_value and optionally date)
+"""
+
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import SessionLocal, TariffProgramRate
+from response_cache import current_generation, single_flight
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lines are matched on key_id * KEY_SPAN + epoch seconds, which keeps one
+# sorted int64 array per program; 2**34 seconds reaches past the year 2500
+KEY_SPAN = 1 << 34
+DEFAULT_CHUNK_SIZE = 500000
+MAX_REQUEST_LINES = 100000
+
+
+class DutyRequest(BaseModel):
+    """Invoice lines as parallel arrays (one entry per line)"""
+    country: List[str]
+    hs_code: List[str]
+    customs_value: List[float]
+    date: Optional[List[Optional[str]]] = None  # ISO dates; omitted or null means today
+
+
+def _line_keys(countries, hs_codes) -> pd.Series:
+    """'US|85176200'-style keys: upper-cased country plus HS digits"""
+    countries = pd.Series(countries, dtype="string").fillna("").str.upper()
+    digits = pd.Series(hs_codes, dtype="string").fillna("").str.replace(r"\D", "", regex=True)
+    return (countries + "|" + digits).astype(object)
+
+
+def _key_ids(keys: pd.Index, countries, hs_codes) -> np.ndarray:
+    """
+    Position of each line's key in keys (-1 when unknown).
+
+    Invoices repeat a small set of codes, so strings are normalized once per
+    distinct (country, hs_code) pair and mapped back with integer codes.
+    """
+    country_ids, country_values = pd.factorize(pd.Series(countries, dtype=object).fillna(""))
+    code_ids, code_values = pd.factorize(pd.Series(hs_codes, dtype=object).fillna(""))
+    pair_ids, pairs = pd.factorize(country_ids.astype(np.int64) * max(len(code_values), 1) + code_ids)
+    pair_keys = _line_keys(
+        np.asarray(country_values, dtype=object)[pairs // max(len(code_values), 1)],
+        np.asarray(code_values, dtype=object)[pairs % max(len(code_values), 1)]
+    )
+    return keys.get_indexer(pair_keys).astype(np.int64)[pair_ids]
+
+
+def _epoch_seconds(dates, default: pd.Timestamp):
+    """
+    Naive-UTC epoch seconds plus a mask of dates that could not be parsed.
+
+    Only missing dates fall back to default; a malformed one is flagged, not
+    priced at the default. Pre-1970 dates clip to 0.
+    """
+    date_ids, values = pd.factorize(pd.Series(dates, dtype=object), use_na_sentinel=False)
+    values = pd.Series(values, dtype=object)
+    stamps = pd.to_datetime(values, utc=True, errors="coerce", format="mixed").dt.tz_convert(None)
+    invalid = (stamps.isna() & values.notna()).to_numpy()
+    seconds = stamps.fillna(default).to_numpy(dtype="datetime64[s]").astype(np.int64)
+    return np.clip(seconds, 0, KEY_SPAN - 1)[date_ids], invalid[date_ids]
+
+
+class ProgramRateTable:
+    """
+    Rate programs as sorted NumPy arrays, one set per program.
+
+    The applicable rate for a line is the program row with the same key and
+    the latest effective_date at or before the line's date, found for all
+    lines at once with np.searchsorted. Rebuilt when the data generation moves.
+    """
+
+    def __init__(self):
+        self.programs = []
+        self._keys = pd.Index([], dtype=object)
+        self._arrays = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def refresh(self, db: Session):
+        generation = current_generation(db)
+        if generation == self._generation:
+            return
+        with single_flight(self._building, self._generation is not None) as build:
+            if build:
+                self._rebuild(db, generation)
+
+    def _rebuild(self, db: Session, generation: int):
+        # Built outside the lock (see AsOfIndex.refresh); only the swap below is guarded
+        started = time.perf_counter()
+        rows = db.execute(select(
+            TariffProgramRate.country, TariffProgramRate.hs_digits, TariffProgramRate.program,
+            TariffProgramRate.rate, TariffProgramRate.effective_date
+        )).all()
+        frame = pd.DataFrame(rows, columns=["country", "hs_digits", "program", "rate", "effective_date"])
+        line_keys = _line_keys(frame["country"], frame["hs_digits"])
+        keys = pd.Index(line_keys.unique())
+        key_ids = keys.get_indexer(line_keys).astype(np.int64)
+        compound = key_ids * KEY_SPAN + _epoch_seconds(frame["effective_date"], pd.Timestamp(0))[0]
+        rates = frame["rate"].fillna(0.0).to_numpy(dtype=np.float64)
+
+        arrays = {}
+        for program in sorted(frame["program"].fillna("base").unique()):
+            mask = (frame["program"].fillna("base") == program).to_numpy()
+            order = np.argsort(compound[mask], kind="stable")
+            arrays[program] = (compound[mask][order], key_ids[mask][order], rates[mask][order])
+
+        with self._lock:
+            if self._generation is None or generation > self._generation:
+                self.programs = list(arrays)
+                self._keys = keys
+                self._arrays = arrays
+                self._generation = generation
+        logger.info(
+            f"Program rate table rebuilt for generation {generation}: {len(rows)} rates, "
+            f"{len(arrays)} programs in {round(time.perf_counter() - started, 4)}s"
+        )
+
+    def calculate(self, countries, hs_codes, customs_values, dates=None) -> pd.DataFrame:
+        """
+        Duty for each line: customs_value * sum of program rates / 100.
+
+        Returns one row per input line with a rate column per program,
+        total_rate, duty, matched (False when no program covers the line) and
+        error. A line with a malformed date or a missing or non-numeric
+        customs_value gets an error message, no duty (NaN) and matched False.
+        """
+        key_ids = _key_ids(self._keys, countries, hs_codes)
+        count = len(key_ids)
+        now = pd.Timestamp.utcnow().tz_convert(None)
+        seconds, bad_dates = _epoch_seconds(dates if dates is not None else [None] * count, now)
+        compound = key_ids * KEY_SPAN + seconds
+        known = key_ids >= 0
+
+        result = pd.DataFrame(index=pd.RangeIndex(count))
+        total = np.zeros(count, dtype=np.float64)
+        matched = np.zeros(count, dtype=bool)
+        for program, (sorted_compound, sorted_keys, sorted_rates) in self._arrays.items():
+            position = np.searchsorted(sorted_compound, compound, side="right") - 1
+            safe = np.clip(position, 0, len(sorted_keys) - 1)  # Every program has at least one row
+            applies = known & (position >= 0) & (sorted_keys[safe] == key_ids)
+            rates = np.where(applies, sorted_rates[safe], 0.0)
+            result[f"rate_{program}"] = rates
+            total += rates
+            matched |= applies
+
+        values = pd.to_numeric(pd.Series(customs_values).reset_index(drop=True), errors="coerce").to_numpy(dtype=np.float64)
+        bad_values = np.isnan(values)
+        invalid = bad_dates | bad_values
+        errors = np.full(count, None, dtype=object)
+        errors[bad_values] = "invalid customs_value"
+        errors[bad_dates] = "invalid date"
+        errors[bad_dates & bad_values] = "invalid date; invalid customs_value"
+
+        result["total_rate"] = np.where(invalid, np.nan, total)
+        result["duty"] = np.where(invalid, np.nan, values * total / 100.0)
+        result["matched"] = matched & ~invalid
+        result["error"] = errors
+        return result
+
+
+program_rate_table = ProgramRateTable()
+
+
+def invalid_lines(duties: pd.DataFrame, limit: int = 20) -> str:
+    """'3 (invalid date), 7 (invalid customs_value)' for the first flagged lines, or '' when none are"""
+    flagged = duties["error"].dropna()
+    listed = ", ".join(f"{index} ({error})" for index, error in flagged.head(limit).items())
+    return listed + (f" and {len(flagged) - limit} more" if len(flagged) > limit else "")
+
+
+def calculate_file(input_path: str, output_path: str, chunksize: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Price a CSV of invoice lines in bounded-memory chunks.
+
+    Lines with a malformed date or customs_value are written with an error
+    and no duty, counted in the summary's invalid, and logged.
+    """
+    db = SessionLocal()
+    try:
+        program_rate_table.refresh(db)
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    lines = 0
+    invalid = 0
+    total_duty = 0.0
+    for number, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize, dtype={"hs_code": str})):
+        duties = program_rate_table.calculate(
+            chunk["country"], chunk["hs_code"], chunk["customs_value"],
+            chunk["date"] if "date" in chunk else None
+        )
+        duties.index = chunk.index
+        if duties["error"].notna().any():
+            invalid += int(duties["error"].notna().sum())
+            logger.error(f"Lines not priced: {invalid_lines(duties)}")
+        pd.concat([chunk, duties], axis=1).to_csv(output_path, mode="w" if number == 0 else "a",
+                                                  header=number == 0, index=False)
+        lines += len(chunk)
+        total_duty += float(duties["duty"].sum())
+
+    seconds = round(time.perf_counter() - started, 4)
+    logger.info(f"Priced {lines - invalid} of {lines} lines in {seconds}s")
+    return {"lines": lines, "invalid": invalid, "total_duty": round(total_duty, 2), "seconds": seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute stacked landed duty for a CSV of invoice lines")
+    parser.add_argument("input", help="CSV with country, hs_code, customs_value[, date] columns")
+    parser.add_argument("output", help="Where to write the input columns plus duty columns")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE, help="Lines per chunk")
+    args = parser.parse_args()
+    summary = calculate_file(args.input, args.output, args.chunksize)
+    print(f"{summary['lines']} lines ({summary['invalid']} invalid), total duty {summary['total_duty']}, {summary['seconds']}s")
@@ -0,0 +1,189 @@
+"""
+Change Events
+In-process broker that pushes new tariff_history rows and stats deltas to Server-Sent Events subscribers
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from database import SessionLocal, TariffHistory
+from response_cache import current_generation
+from stats import read_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Picks up scrapes committed by other worker processes; only runs while someone is subscribed
+POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "30"))
+KEEPALIVE_SECONDS = 15
+MAX_EVENT_CHANGES = 500  # Larger bursts are truncated; clients refetch instead
+SUBSCRIBER_QUEUE_SIZE = 100
+STATS_FIELDS = ("us_tariffs", "china_tariffs", "total_tariffs", "recent_changes_7d")
+
+
+def _change_payload(row) -> dict:
+    return {
+        "id": row.id,
+        "tariff_id": row.tariff_id,
+        "country": row.country,
+        "hs_code": row.hs_code,
+        "old_rate": row.old_rate,
+        "new_rate": row.new_rate,
+        "change_date": row.change_date.isoformat() if row.change_date else None,
+        "change_reason": row.change_reason
+    }
+
+
+def _stats_payload(stats: dict) -> dict:
+    return {
+        name: value.isoformat() if isinstance(value, datetime) else value
+        for name, value in stats.items()
+    }
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['last_id']}\nevent: changes\ndata: {json.dumps(event)}\n\n"
+
+
+class ChangeBroker:
+    """
+    Fans change events out to subscriber queues.
+
+    publish_pending() may be called from any thread (the scrape worker, the
+    poller); it reads history rows past the last published id, so the same
+    change is never sent twice however many paths report it.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._generation = None
+        self._stats = None
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            first = not self._subscribers
+            self._subscribers.add(entry)
+        return entry, first
+
+    def unsubscribe(self, entry):
+        with self._lock:
+            self._subscribers.discard(entry)
+
+    def prime(self, db: Session):
+        """Start publishing from the current state (nothing already committed is re-sent)"""
+        # Queried before taking the lock: subscribe() takes it on the event loop thread
+        last_id = db.execute(select(func.max(TariffHistory.id))).scalar() or 0
+        generation = current_generation(db)
+        stats = read_stats(db)
+        with self._lock:
+            self._last_id = last_id
+            self._generation = generation
+            self._stats = stats
+
+    def replay(self, db: Session, after_id: int):
+        """Event with the changes a reconnecting client missed, or None"""
+        rows = db.execute(
+            select(TariffHistory).where(TariffHistory.id > after_id)
+            .order_by(TariffHistory.id).limit(MAX_EVENT_CHANGES + 1)
+        ).scalars().all()
+        if not rows:
+            return None
+        stats = read_stats(db)
+        return {
+            "last_id": rows[min(len(rows), MAX_EVENT_CHANGES) - 1].id,
+            "generation": current_generation(db),
+            "changes": [_change_payload(row) for row in rows[:MAX_EVENT_CHANGES]],
+            "truncated": len(rows) > MAX_EVENT_CHANGES,
+            "stats": _stats_payload(stats),
+            "stats_delta": None
+        }
+
+    def publish_pending(self, db: Session):
+        """Send committed changes past the last published id to every subscriber"""
+        if not self._subscribers:
+            return None
+        with self._lock:
+            after_id, published = self._last_id, self._generation
+        if after_id is None:
+            return None
+        generation = current_generation(db)
+        if generation == published:
+            return None
+        rows = db.execute(
+            select(TariffHistory).where(TariffHistory.id > after_id)
+            .order_by(TariffHistory.id).limit(MAX_EVENT_CHANGES + 1)
+        ).scalars().all()
+        stats = read_stats(db)
+        truncated = len(rows) > MAX_EVENT_CHANGES
+        # A truncated burst still advances to the newest id; the client refetches
+        newest_id = db.execute(select(func.max(TariffHistory.id))).scalar() if truncated else None
+
+        with self._lock:
+            # Another publisher may have sent part of this while we queried
+            if self._generation is not None and generation <= self._generation:
+                return None
+            rows = [row for row in rows if row.id > self._last_id]
+            previous = self._stats or {}
+            last_id = max(newest_id or (rows[-1].id if rows else 0), self._last_id)
+            event = {
+                "last_id": last_id,
+                "generation": generation,
+                "changes": [_change_payload(row) for row in rows[:MAX_EVENT_CHANGES]],
+                "truncated": truncated,
+                "stats": _stats_payload(stats),
+                "stats_delta": {name: stats[name] - previous.get(name, 0) for name in STATS_FIELDS}
+            }
+            self._last_id = last_id
+            self._generation = generation
+            self._stats = stats
+            subscribers = list(self._subscribers)
+
+        if not event["changes"] and not any(event["stats_delta"].values()):
+            return None
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, event)
+        logger.info(f"Published {len(event['changes'])} changes to {len(subscribers)} stream subscribers")
+        return event
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()  # A stalled client loses its oldest event, not the newest
+        queue.put_nowait(event)
+
+
+change_broker = ChangeBroker()
+
+
+def publish_pending():
+    """publish_pending() with its own session, for callers outside a request"""
+    db = SessionLocal()
+    try:
+        return change_broker.publish_pending(db)
+    finally:
+        db.close()
+
+
+async def poll_changes():
+    """Background task: publish changes committed by any process, while anyone is listening"""
+    while True:
+        await asyncio.sleep(POLL_SECONDS)
+        if not change_broker.has_subscribers:
+            continue
+        try:
+            await asyncio.to_thread(publish_pending)
+        except Exception as e:
+            logger.error(f"Change poll failed: {str(e)}")
@@ -0,0 +1,88 @@
+"""
+Streaming Export
+Constant-memory NDJSON / CSV dumps of tariffs, tariff_history, tariff_trends and tariff_trend_intervals
+"""
+
+import io
+import csv
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, or_
+from database import SessionLocal, Tariff, TariffHistory, TariffTrend, TariffTrendInterval
+from hs_search import normalize_hs_code, prefix_filter
+
+STREAM_BATCH_SIZE = 1000
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_COLUMNS = {
+    "tariffs": (Tariff, ["id", "country", "hs_code", "product_description", "rate",
+                         "effective_date", "source_url", "last_updated"]),
+    "history": (TariffHistory, ["id", "tariff_id", "country", "hs_code", "old_rate", "new_rate",
+                                "change_date", "change_reason"]),
+    "trends": (TariffTrend, ["id", "country", "hs_code", "product_description", "rate",
+                             "record_date", "created_at"]),
+    "intervals": (TariffTrendInterval, ["id", "country", "hs_code", "product_description", "rate",
+                                        "valid_from", "valid_to", "updated_at"]),
+}
+
+
+def build_export_query(table: str, country: str = None, hs_code: str = None,
+                       hs_mode: str = "prefix", days: int = None):
+    """SELECT for an export, with the same filters as the matching list endpoint"""
+    model, columns = EXPORT_COLUMNS[table]
+    query = select(*[getattr(model, name) for name in columns])
+
+    if country:
+        query = query.where(model.country == country.upper())
+
+    if hs_code and table == "tariffs" and hs_mode != "substring":
+        query = query.where(prefix_filter(Tariff.hs_digits, normalize_hs_code(hs_code)))
+    elif hs_code and table == "tariffs":
+        query = query.where(Tariff.hs_code.contains(hs_code))
+    elif hs_code:
+        query = query.where(model.hs_code == hs_code)
+
+    if days is not None and table == "intervals":
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        query = query.where(or_(TariffTrendInterval.valid_to.is_(None), TariffTrendInterval.valid_to > cutoff))
+    elif days is not None and table != "tariffs":
+        date_column = TariffHistory.change_date if table == "history" else TariffTrend.record_date
+        query = query.where(date_column >= datetime.utcnow() - timedelta(days=days))
+
+    return query.order_by(model.id), columns
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_rows(query, batch_size: int = STREAM_BATCH_SIZE):
+    """Yield row batches from a server-side cursor; owns its own session"""
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=batch_size, stream_results=True))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def iter_ndjson(query, columns):
+    for batch in stream_rows(query):
+        yield "".join(
+            json.dumps({name: _json_value(value) for name, value in zip(columns, row)}) + "\n"
+            for row in batch
+        )
+
+
+def iter_csv(query, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in stream_rows(query):
+        writer.writerows([_json_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,125 @@
+"""
+Concurrent Source Fetching
+Pooled keep-alive HTTP sessions and a thread-pool fetch stage for scraper sources
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30  # seconds per source
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_PER_HOST = 2  # concurrent connections per host
+QUEUED_POLL_SECONDS = 0.05  # How often to look for queued sources that have started
+
+
+class HostSessionPool:
+    """One keep-alive requests.Session per host, each with a bounded connection pool"""
+
+    def __init__(self, max_per_host: int = DEFAULT_MAX_PER_HOST, headers: dict = None):
+        self.max_per_host = max_per_host
+        self.headers = headers or {"User-Agent": "TariffDashboard/1.0"}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        """Return the shared session for the URL's host, creating it on first use"""
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                # pool_block caps in-flight requests per host instead of opening extra sockets
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host, pool_block=True)
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def get(self, url: str, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+        """GET a URL through its host's pooled session"""
+        return self.session_for(url).get(url, timeout=timeout, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Shared pool reused across scrape runs so connections stay warm
+session_pool = HostSessionPool()
+
+
+def fetch_concurrently(sources: dict, max_workers: int = DEFAULT_MAX_WORKERS,
+                       timeout: float = DEFAULT_TIMEOUT, timeouts: dict = None,
+                       urls: dict = None, pool: HostSessionPool = session_pool):
+    """
+    Run source fetch callables in parallel.
+
+    sources maps a source name to a callable taking the pooled session for
+    its host (urls[name], from pool; None when the source has no URL) and
+    returning a list of records. Each source gets its own timeout
+    (timeouts[name], else timeout), counted from when that source starts
+    running rather than from the start of the stage, so a source queued
+    behind busy workers keeps its full budget. A source that fails or
+    overruns contributes an empty list. Returns (results, timings) keyed by
+    source name, in the order of sources.
+    """
+    timeouts = timeouts or {}
+    urls = urls or {}
+    results = {name: [] for name in sources}
+    timings = {name: None for name in sources}
+    starts = {}
+
+    def run(name, func, session):
+        starts[name] = time.perf_counter()
+        records = func(session) or []
+        return records, round(time.perf_counter() - starts[name], 4)
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+    try:
+        pending = {
+            name: executor.submit(run, name, func, pool.session_for(urls[name]) if name in urls else None)
+            for name, func in sources.items()
+        }
+        while pending:
+            now = time.perf_counter()
+            for name, future in list(pending.items()):
+                limit = timeouts.get(name, timeout)
+                if future.done():
+                    del pending[name]
+                    try:
+                        results[name], timings[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error fetching from {name}: {str(e)}")
+                elif name in starts and now - starts[name] >= limit:
+                    del pending[name]
+                    logger.error(f"Source {name} timed out after {limit}s")
+            if not pending:
+                break
+            # Sleep until a source finishes or the earliest deadline passes; while sources are
+            # still queued, wake up often enough to start their clocks when they begin
+            deadlines = [starts[name] + timeouts.get(name, timeout) for name in pending if name in starts]
+            wait_for = min(deadlines) - now if deadlines else QUEUED_POLL_SECONDS
+            if len(deadlines) < len(pending):
+                wait_for = min(wait_for, QUEUED_POLL_SECONDS)
+            wait(pending.values(), timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+    finally:
+        # Don't wait on stragglers; their results are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(
+        f"Fetched {len(sources)} sources in {round(time.perf_counter() - started, 4)}s: "
+        + ", ".join(f"{name}={timings.get(name)}s" for name in sources)
+    )
+    return results, timings
@@ -0,0 +1,173 @@
+"""
+HS Hierarchy
+Chapter / heading / subheading rate aggregates, recomputed only for the chapters a scrape touched
+
+Usage: python -m hierarchy   (full rebuild)
+"""
+
+import time
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+from database import SessionLocal, Tariff, TariffTrendInterval, HSHierarchyRollup, get_watermark, set_watermark
+from hs_search import normalize_hs_code, prefix_filter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEVELS = {"chapter": 2, "heading": 4, "subheading": 6}
+PARENT_LEVEL = {"heading": "chapter", "subheading": "heading"}
+CHILD_LENGTH = {2: 4, 4: 6, 6: None}
+BUILT_WATERMARK = "hs_hierarchy_built"
+
+
+def _aggregate(country: str, chapter: str, rates: list, now: datetime) -> list:
+    """
+    Rollup rows for one chapter from its (hs_digits, rate) pairs.
+
+    child_avg_rate is the unweighted mean of the child nodes' averages (codes
+    for subheadings), so one crowded heading does not dominate its chapter the
+    way it does the code-weighted rate_sum / codes. A code too short to have a
+    child level counts as its own child.
+    """
+    nodes = {}
+    for digits, rate in rates:
+        for level, length in LEVELS.items():
+            if len(digits) < length:
+                break
+            prefix = digits[:length]
+            node = nodes.get(prefix)
+            if node is None:
+                node = nodes[prefix] = {"level": level, "rates": [], "children": {}}
+            node["rates"].append(rate)
+            child_length = CHILD_LENGTH[length]
+            child = digits[:child_length] if child_length and len(digits) >= child_length else digits
+            node["children"].setdefault(child, []).append(rate)
+
+    rows = []
+    for prefix, node in nodes.items():
+        child_averages = [sum(values) / len(values) for values in node["children"].values()]
+        rows.append({
+            "country": country,
+            "level": node["level"],
+            "prefix": prefix,
+            "parent": prefix[:LEVELS[PARENT_LEVEL[node["level"]]]] if node["level"] in PARENT_LEVEL else None,
+            "codes": len(node["rates"]),
+            "rate_sum": sum(node["rates"]),
+            "min_rate": min(node["rates"]),
+            "max_rate": max(node["rates"]),
+            "child_avg_rate": sum(child_averages) / len(child_averages),
+            "updated_at": now
+        })
+    return rows
+
+
+def refresh_chapters(db: Session, country: str, chapters) -> int:
+    """Recompute every node under the given chapters (caller commits)"""
+    now = datetime.utcnow()
+    written = 0
+    for chapter in sorted(chapters):
+        rates = [
+            (row.hs_digits, row.rate)
+            for row in db.execute(
+                select(Tariff.hs_digits, Tariff.rate).where(
+                    Tariff.country == country,
+                    prefix_filter(Tariff.hs_digits, chapter),
+                    Tariff.rate.is_not(None)
+                )
+            )
+        ]
+        db.execute(delete(HSHierarchyRollup).where(
+            HSHierarchyRollup.country == country,
+            prefix_filter(HSHierarchyRollup.prefix, chapter)
+        ))
+        rows = _aggregate(country, chapter, rates, now)
+        if rows:
+            db.execute(insert(HSHierarchyRollup), rows)
+        written += len(rows)
+    return written
+
+
+def chapters_of(hs_codes) -> set:
+    return {digits[:2] for digits in map(normalize_hs_code, hs_codes) if len(digits) >= 2}
+
+
+def refresh_for_codes(db: Session, country: str, hs_codes) -> int:
+    """Incremental hook for ingestion: refresh the chapters containing hs_codes"""
+    chapters = chapters_of(hs_codes)
+    return refresh_chapters(db, country, chapters) if chapters else 0
+
+
+def rebuild_hierarchy(db: Session) -> int:
+    """Recompute every chapter of every country"""
+    started = time.perf_counter()
+    db.execute(delete(HSHierarchyRollup))
+    written = 0
+    for country in db.execute(select(Tariff.country).distinct()).scalars().all():
+        chapters = {
+            digits[:2]
+            for digits in db.execute(select(Tariff.hs_digits).where(Tariff.country == country)).scalars()
+            if digits and len(digits) >= 2
+        }
+        written += refresh_chapters(db, country, chapters)
+    set_watermark(db, BUILT_WATERMARK, 1)
+    db.commit()
+    logger.info(f"HS hierarchy rebuilt: {written} nodes in {round(time.perf_counter() - started, 4)}s")
+    return written
+
+
+def hierarchy_built(db: Session) -> bool:
+    return get_watermark(db, BUILT_WATERMARK) > 0
+
+
+def prefix_trend(db: Session, country: str, prefix: str, start: datetime, end: datetime = None) -> list:
+    """
+    Daily average rate of the codes under prefix, from the trend intervals.
+
+    Each interval adds its rate at valid_from and removes it at valid_to, so
+    one sweep over the change points yields every day's average.
+    """
+    end = end or datetime.utcnow()
+    events = {}
+    query = select(
+        TariffTrendInterval.hs_code, TariffTrendInterval.rate,
+        TariffTrendInterval.valid_from, TariffTrendInterval.valid_to
+    ).where(
+        TariffTrendInterval.country == country,
+        TariffTrendInterval.hs_code.startswith(prefix[:2]),  # Chapter digits never contain separators
+        TariffTrendInterval.valid_from <= end
+    )
+    for hs_code, rate, valid_from, valid_to in db.execute(query):
+        if rate is None or not normalize_hs_code(hs_code).startswith(prefix):
+            continue
+        for moment, sign in ((valid_from, 1), (valid_to, -1)):
+            if moment is None:
+                continue
+            # A rate counts from the day it takes effect (the day of a change shows the new rate)
+            delta = events.setdefault(moment.date(), [0.0, 0])
+            delta[0] += sign * rate
+            delta[1] += sign
+
+    points = []
+    rate_total, codes = 0.0, 0
+    changes = sorted(events.items())
+    position = 0
+    day = start.date()
+    while day <= end.date():
+        while position < len(changes) and changes[position][0] <= day:
+            rate_total += changes[position][1][0]
+            codes += changes[position][1][1]
+            position += 1
+        if codes:
+            points.append({"date": day.isoformat(), "avg_rate": round(rate_total / codes, 4), "codes": codes})
+        day += timedelta(days=1)
+    return points
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_hierarchy(session)} hierarchy nodes")
+    finally:
+        session.close()
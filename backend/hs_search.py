@@ -0,0 +1,97 @@
+"""
+HS Code Search
+Digits-only code normalization and index-backed prefix matching
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_left
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database import Tariff
+from response_cache import single_flight
+
+# Serve prefix-search totals from the in-memory index instead of COUNT(*)
+PREFIX_INDEX_ENABLED = os.getenv("HS_PREFIX_INDEX", "false").lower() == "true"
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_hs_code(hs_code: str) -> str:
+    """Strip dots, spaces and other separators: '8517.62.00' -> '85176200'"""
+    return _NON_DIGITS.sub("", hs_code or "")
+
+
+def prefix_upper_bound(prefix: str):
+    """
+    Smallest digit string greater than every string starting with prefix.
+
+    '8517' -> '8518', '8519' -> '852'; None when there is no upper bound ('99').
+    Comparing against digit strings keeps the range collation-independent.
+    """
+    stripped = prefix.rstrip("9")
+    if not stripped:
+        return None
+    return stripped[:-1] + str(int(stripped[-1]) + 1)
+
+
+def prefix_filter(column, prefix: str):
+    """Range predicate equivalent to column LIKE 'prefix%' that can use a B-tree index"""
+    upper = prefix_upper_bound(prefix)
+    if upper is None:
+        return column >= prefix
+    return (column >= prefix) & (column < upper)
+
+
+class HSPrefixIndex:
+    """
+    In-memory prefix index over Tariff.hs_digits.
+
+    Codes are kept as sorted arrays per country, which gives trie-style prefix
+    lookups via two bisects. The index rebuilds itself when the table's
+    (max id, max last_updated) version moves, so it never serves stale counts.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def _current_version(self, db: Session):
+        return tuple(db.execute(select(func.max(Tariff.id), func.max(Tariff.last_updated))).one())
+
+    def refresh(self, db: Session):
+        version = self._current_version(db)
+        if version == self._version:
+            return
+        with single_flight(self._building, self._version is not None) as build:
+            if build:
+                self._rebuild(db, version)
+
+    def _rebuild(self, db: Session, version: tuple):
+        # No queries under the lock: a reader waiting on it would hold a read worker idle
+        codes = {}
+        for country, digits in db.execute(select(Tariff.country, Tariff.hs_digits)):
+            codes.setdefault(country, []).append(digits or "")
+        for values in codes.values():
+            values.sort()
+        with self._lock:
+            self._codes = codes
+            self._version = version
+
+    def count(self, db: Session, prefix: str, country: str = None) -> int:
+        """Number of tariffs whose normalized code starts with prefix"""
+        self.refresh(db)
+        countries = [country] if country else list(self._codes)
+        total = 0
+        upper = prefix_upper_bound(prefix)
+        for name in countries:
+            values = self._codes.get(name, [])
+            end = bisect_left(values, upper) if upper is not None else len(values)
+            total += end - bisect_left(values, prefix)
+        return total
+
+
+hs_prefix_index = HSPrefixIndex()
@@ -0,0 +1,109 @@
+"""
+Conditional-Request Response Cache
+On-disk store of ETag / Last-Modified validators and body hashes per source URL
+"""
+
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fetcher import session_pool, DEFAULT_TIMEOUT, DEFAULT_MAX_WORKERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Remembers what each source URL looked like on the last successful run.
+
+    check() sends a conditional GET and reports whether the source is
+    unchanged (304, or same body hash). Validators are only persisted by
+    commit() once the caller has saved the data, so a failed run is retried
+    in full next time.
+    """
+
+    def __init__(self, cache_dir: str, pool=session_pool):
+        self.cache_dir = cache_dir
+        self.pool = pool
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, url: str):
+        """Return the stored entry for a URL, or None"""
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def check(self, url: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+        """Conditionally fetch a URL and compare it with the last run"""
+        stored = self.load(url)
+        headers = {}
+        if stored and stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+
+        try:
+            response = self.pool.get(url, timeout=timeout, headers=headers)
+        except Exception as e:
+            # Fail open: an unreachable validator check never suppresses a scrape
+            logger.warning(f"Cache check failed for {url}: {str(e)}")
+            return {"url": url, "unchanged": False, "entry": None}
+
+        checked_at = datetime.utcnow().isoformat()
+        if response.status_code == 304 and stored:
+            return {"url": url, "unchanged": True, "entry": {**stored, "checked_at": checked_at}}
+
+        if response.status_code != 200:
+            logger.warning(f"Cache check for {url} returned HTTP {response.status_code}")
+            return {"url": url, "unchanged": False, "entry": None}
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        entry = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "checked_at": checked_at
+        }
+        unchanged = bool(stored) and stored.get("content_hash") == content_hash
+        return {"url": url, "unchanged": unchanged, "entry": entry}
+
+    def check_all(self, urls: dict, timeout: float = DEFAULT_TIMEOUT,
+                  max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+        """Check several named URLs in parallel; returns {name: check result}"""
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-check") as executor:
+            futures = {name: executor.submit(self.check, url, timeout) for name, url in urls.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def commit(self, checks):
+        """Persist validators for checks whose data has been saved"""
+        for check in checks:
+            entry = check.get("entry")
+            if not entry:
+                continue
+            path = self._path(entry["url"])
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+
+
+def all_unchanged(checks: dict, names) -> bool:
+    """True when every named source was reported unchanged"""
+    names = list(names)
+    return bool(names) and all(checks.get(name, {}).get("unchanged") for name in names)
+
+
+def default_cache():
+    """Cache configured by HTTP_CACHE_DIR, or None when caching is disabled"""
+    cache_dir = os.getenv("HTTP_CACHE_DIR")
+    return ResponseCache(cache_dir) if cache_dir else None
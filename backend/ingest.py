@@ -0,0 +1,386 @@
+"""
+Bulk Tariff Ingestion
+Shared set-based save path used by both scrapers
+"""
+
+import time
+import logging
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import itemgetter
+from datetime import datetime
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+from database import Tariff, TariffHistory, TariffProgramRate
+from hs_search import normalize_hs_code
+from response_cache import bump_generation, generation_clock
+from rollups import merge_observations
+from events import change_broker
+from hierarchy import chapters_of, refresh_for_codes
+from stats import ensure_counters, record_batch
+from trend_intervals import apply_observations
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PROGRAM = "base"
+
+
+def _stage_timer(progress):
+    """mark(stage, count) reports the time since the previous mark to progress; a no-op without one"""
+    if progress is None:
+        return lambda stage, count=None: None
+    last = [time.perf_counter()]
+
+    def mark(stage: str, count: int = None):
+        now = time.perf_counter()
+        progress(stage, round(now - last[0], 4), count)
+        last[0] = now
+    return mark
+
+
+def _dialect_insert(db: Session):
+    """Return the dialect-specific insert() that supports ON CONFLICT, or None"""
+    name = db.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    return None
+
+
+def _load_existing(db: Session, country: str, hs_codes):
+    """Load current tariff rows for a set of HS codes in one query"""
+    rows = db.execute(
+        select(Tariff.id, Tariff.hs_code, Tariff.rate).where(
+            Tariff.country == country,
+            Tariff.hs_code.in_(hs_codes)
+        )
+    ).all()
+    return {row.hs_code: {"id": row.id, "rate": row.rate} for row in rows}
+
+
+def _upsert_rows(db: Session, rows: list, update_columns: list):
+    """Write tariff rows with a native upsert where the dialect supports it"""
+    if not rows:
+        return
+
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(Tariff)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Tariff.country, Tariff.hs_code],
+            set_={col: stmt.excluded[col] for col in update_columns}
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback: lookup ids, then bulk insert new rows and bulk update the rest
+    existing = _load_existing(db, rows[0]["country"], [r["hs_code"] for r in rows])
+    new_rows = [r for r in rows if r["hs_code"] not in existing]
+    updated_rows = [
+        {"id": existing[r["hs_code"]]["id"], **{col: r[col] for col in update_columns}}
+        for r in rows if r["hs_code"] in existing
+    ]
+    if new_rows:
+        db.execute(insert(Tariff), new_rows)
+    if updated_rows:
+        db.execute(update(Tariff), updated_rows)
+
+
+def _load_program_timelines(db: Session, country: str, hs_codes) -> dict:
+    """(hs_code, program) -> [(effective_date, rate), ...] in date order, in one query"""
+    timelines = {}
+    for row in db.execute(
+        select(
+            TariffProgramRate.hs_code, TariffProgramRate.program,
+            TariffProgramRate.effective_date, TariffProgramRate.rate
+        ).where(
+            TariffProgramRate.country == country,
+            TariffProgramRate.hs_code.in_(hs_codes)
+        ).order_by(TariffProgramRate.effective_date)
+    ):
+        timelines.setdefault((row.hs_code, row.program or DEFAULT_PROGRAM), []).append((row.effective_date, row.rate))
+    return timelines
+
+
+def _stacked_rate(timelines: dict, programs, code: str, at: datetime):
+    """
+    (sum of each program's rate in effect at `at`, date the newest of them took
+    effect), or (None, None) when no program is in effect yet
+    """
+    total, since = None, None
+    for program in programs:
+        entries = timelines[(code, program)]
+        position = bisect_right(entries, at, key=itemgetter(0))
+        if position:
+            effective_date, rate = entries[position - 1]
+            total = (total or 0.0) + rate
+            since = effective_date if since is None else max(since, effective_date)
+    return total, since
+
+
+def _save_program_rates(db: Session, items: list, country: str, use_item_dates: bool, now: datetime,
+                        timelines: dict):
+    """
+    Keep one row per (code, program, effective date) so stacked programs are not
+    overwritten by whichever source was merged last.
+
+    A program only gets a new row when its rate changes; a source restating a
+    known effective date updates that row in place. timelines (from
+    _load_program_timelines) is updated to match what was written.
+    """
+    codes = {item["hs_code"] for item in items}
+    rows = {}
+    for item in items:
+        code = item["hs_code"]
+        program = item.get("program") or DEFAULT_PROGRAM
+        effective_date = (item.get("effective_date") or now) if use_item_dates else now
+        entries = timelines.setdefault((code, program), [])
+        current = entries[-1] if entries else None
+        if current is not None and current[1] == item["rate"] and effective_date >= current[0]:
+            continue
+        rows[(code, program, effective_date)] = {
+            "country": country,
+            "hs_code": code,
+            "hs_digits": normalize_hs_code(code),
+            "program": program,
+            "rate": item["rate"],
+            "effective_date": effective_date,
+            "source": item.get("source", ""),
+            "last_updated": now
+        }
+        position = bisect_left(entries, effective_date, key=itemgetter(0))
+        if position < len(entries) and entries[position][0] == effective_date:
+            entries[position] = (effective_date, item["rate"])
+        else:
+            entries.insert(position, (effective_date, item["rate"]))
+    if not rows:
+        return 0
+
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(TariffProgramRate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[
+                TariffProgramRate.country, TariffProgramRate.hs_code,
+                TariffProgramRate.program, TariffProgramRate.effective_date
+            ],
+            set_={col: stmt.excluded[col] for col in ("rate", "source", "last_updated")}
+        )
+        db.execute(stmt, list(rows.values()))
+        return len(rows)
+
+    existing = {
+        (row.hs_code, row.program, row.effective_date): row.id
+        for row in db.execute(
+            select(
+                TariffProgramRate.id, TariffProgramRate.hs_code,
+                TariffProgramRate.program, TariffProgramRate.effective_date
+            ).where(TariffProgramRate.country == country, TariffProgramRate.hs_code.in_(codes))
+        )
+    }
+    new_rows = [row for key, row in rows.items() if key not in existing]
+    updated_rows = [
+        {"id": existing[key], "rate": row["rate"], "source": row["source"], "last_updated": now}
+        for key, row in rows.items() if key in existing
+    ]
+    if new_rows:
+        db.execute(insert(TariffProgramRate), new_rows)
+    if updated_rows:
+        db.execute(update(TariffProgramRate), updated_rows)
+    return len(rows)
+
+
+def _save_batch(db: Session, items: list, country: str, use_item_dates: bool, touched_chapters: set = None,
+                progress=None):
+    """
+    Diff one batch against the database and write it in a single transaction.
+
+    Program rates are saved first; a code's tariff rate is then the sum of its
+    programs in effect (the stacked rate /api/duty/calculate charges), so a
+    base source and an add-on source for the same code no longer overwrite
+    each other and a run without real changes writes no history.
+    """
+    mark = _stage_timer(progress)
+    now = datetime.utcnow()
+    codes = {item["hs_code"] for item in items}
+    existing = _load_existing(db, country, codes)
+    timelines = _load_program_timelines(db, country, codes)
+    mark("load", len(existing))
+    mark("programs", _save_program_rates(db, items, country, use_item_dates, now, timelines))
+
+    programs = {}
+    for code, program in timelines:
+        programs.setdefault(code, []).append(program)
+
+    # One entry per code in first-seen order, with every date it was observed on
+    observed = {}
+    for item in items:
+        entry = observed.setdefault(item["hs_code"], {"item": item, "dates": set(), "sources": []})
+        entry["rate"] = item["rate"]
+        entry["dates"].add((item.get("effective_date") or now) if use_item_dates else now)
+        source = item.get("source")
+        if source and source not in entry["sources"]:
+            entry["sources"].append(source)
+
+    rows = {}
+    changes = []
+    trends = []
+    inserted = 0
+
+    for code, entry in observed.items():
+        item = entry["item"]
+        rate, since = _stacked_rate(timelines, programs[code], code, now)
+        if rate is None:  # Every program for the code starts in the future
+            rate, since = entry["rate"], max(entry["dates"])
+        effective_date = since if use_item_dates else now
+        current = existing.get(code)
+
+        if current is None:
+            inserted += 1
+            rows[code] = {
+                "country": country,
+                "hs_code": code,
+                "hs_digits": normalize_hs_code(code),
+                "product_description": item["description"],
+                "rate": rate,
+                "effective_date": effective_date,
+                "source_url": item.get("source", ""),
+                "last_updated": now
+            }
+        else:
+            changed = current["rate"] != rate
+            if changed:
+                changes.append({
+                    "tariff_id": current["id"],
+                    "hs_code": code,
+                    "old_rate": current["rate"],
+                    "new_rate": rate,
+                    "change_reason": f"Updated from {', '.join(entry['sources'])}",
+                    "change_date": now
+                })
+            if changed or use_item_dates:
+                rows[code] = {
+                    "country": country,
+                    "hs_code": code,
+                    "hs_digits": normalize_hs_code(code),
+                    "product_description": item["description"],
+                    "rate": rate,
+                    "effective_date": effective_date,
+                    "source_url": item.get("source", ""),
+                    "last_updated": now
+                }
+
+        for observed_on in sorted(entry["dates"]):
+            stacked, _ = _stacked_rate(timelines, programs[code], code, observed_on)
+            trends.append({
+                "hs_code": code,
+                "product_description": item["description"],
+                "rate": stacked if stacked is not None else entry["rate"],
+                "record_date": observed_on
+            })
+
+    mark("diff", len(items))
+
+    update_columns = ["rate", "last_updated"]
+    if use_item_dates:
+        update_columns.append("effective_date")
+    _upsert_rows(db, list(rows.values()), update_columns)
+    mark("tariffs", len(rows))
+
+    if changes:
+        db.execute(insert(TariffHistory), [{"country": country, **c} for c in changes])
+    mark("history", len(changes))
+
+    # Trend storage only grows when a rate actually changes
+    apply_observations(db, country, trends)
+    merge_observations(db, country, trends)
+    mark("trends", len(trends))
+
+    # Only chapters holding new or re-rated codes are re-aggregated
+    touched = {code for code in rows if existing.get(code) is None}
+    touched.update(c["hs_code"] for c in changes)
+    if touched_chapters is not None:
+        touched_chapters.update(chapters_of(touched))
+    else:
+        refresh_for_codes(db, country, touched)
+    mark("hierarchy", len(touched))
+
+    record_batch(db, country, inserted, len(changes), now)
+    bump_generation(db)
+    db.commit()
+    generation_clock.expire()  # This worker serves the new data immediately
+    mark("commit")
+    return {
+        "rows": len(items),
+        "inserted": inserted,
+        "updated": len(rows) - inserted,
+        "changes": len(changes),
+        "trends": len(trends)
+    }
+
+
+def iter_batches(items, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Lists of at most batch_size items from any iterable, without materializing it"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_tariffs(db: Session, data, country: str, use_item_dates: bool = False,
+                   batch_size: int = DEFAULT_BATCH_SIZE, touched_chapters: set = None, progress=None):
+    """
+    Save tariff data in set-based batches and track changes.
+
+    data may be a list or any iterable (e.g. a file being parsed); only one
+    batch is held in memory at a time.
+
+    Bulk loads can pass a touched_chapters set: HS hierarchy chapters are then
+    collected into it instead of being re-aggregated after every batch, and
+    the caller refreshes them once (hierarchy.refresh_chapters).
+
+    use_item_dates=False keeps effective_date at first insert and only touches
+    rows whose rate changed; use_item_dates=True refreshes every row with the
+    item's effective_date and records trends on that date.
+
+    progress, if given, is called as progress(stage, seconds, count) for each
+    stage of every batch (load, programs, diff, tariffs, history, trends,
+    hierarchy, commit) and once for publish.
+    """
+    ensure_counters(db)
+    totals = {"rows": 0, "inserted": 0, "updated": 0, "changes": 0, "trends": 0, "batches": []}
+
+    for batch in iter_batches(data, batch_size):
+        started = time.perf_counter()
+        try:
+            result = _save_batch(db, batch, country, use_item_dates, touched_chapters, progress)
+        except Exception:
+            db.rollback()
+            raise
+        result["seconds"] = round(time.perf_counter() - started, 4)
+
+        logger.info(
+            f"Batch {len(totals['batches']) + 1} for {country}: {result['rows']} rows "
+            f"({result['inserted']} new, {result['updated']} updated, {result['changes']} changes) "
+            f"in {result['seconds']}s"
+        )
+        totals["batches"].append(result)
+        for key in ("rows", "inserted", "updated", "changes", "trends"):
+            totals[key] += result[key]
+
+    # Push what was just committed to stream subscribers in this process
+    started = time.perf_counter()
+    try:
+        change_broker.publish_pending(db)
+    except Exception as e:
+        logger.error(f"Publishing change events failed: {str(e)}")
+    if progress:
+        progress("publish", round(time.perf_counter() - started, 4), None)
+    return totals
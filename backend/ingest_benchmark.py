@@ -0,0 +1,308 @@
+"""
+Ingestion Benchmark
+Replays recorded source payloads through fetch -> merge -> save at several catalogue sizes,
+with time, peak memory and SQL statement count per stage
+
+Usage: python -m ingest_benchmark [--scales 1,10,100] [--passes load,unchanged,changed] [--reset]
+       [--no-memory] [--profile DIR [--profiler cprofile|pyinstrument]] [--output FILE]
+       python -m ingest_benchmark --record      (refresh the fixtures from the source functions)
+
+Runs against DATABASE_URL (SQLite or Postgres) and empties its tariff tables before each
+scale, so point it at a scratch database.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import cProfile
+import logging
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from sqlalchemy import event, select, func
+from database import SessionLocal, Tariff, engine
+from real_data_scraper import fetch_all_real_tariffs, US_SOURCES, CHINA_SOURCES, SOURCE_URLS
+from synthetic_data import reset_tables
+from api_benchmark import BACKEND_DIR, DEFAULT_OUTPUT_DIR, _git_commit
+
+try:
+    import pyinstrument
+except ImportError:  # Optional; cProfile is always available
+    pyinstrument = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.join(BACKEND_DIR, "fixtures", "sources")
+DEFAULT_SCALES = (1, 10, 100)
+# load: empty database; unchanged: the same payloads again (the usual nightly run);
+# changed: the same codes with CHANGE_SHARE of their rates moved
+PASSES = ("load", "unchanged", "changed")
+CHANGE_SHARE = 0.05
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def record_fixtures(directory: str = FIXTURE_DIR) -> dict:
+    """Call every source function once and save what it returns, one JSON file per source"""
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name, fetch in {**US_SOURCES, **CHINA_SOURCES}.items():
+        records = fetch()
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as handle:
+            json.dump({"source": name, "url": SOURCE_URLS[name],
+                       "recorded_at": datetime.utcnow().isoformat(timespec="seconds"), "records": records},
+                      handle, default=_json_default, ensure_ascii=False, indent=1)
+        counts[name] = len(records)
+    return counts
+
+
+def load_fixtures(directory: str = FIXTURE_DIR) -> dict:
+    """Recorded records per source name; FileNotFoundError names the missing fixture"""
+    fixtures = {}
+    for name in {**US_SOURCES, **CHINA_SOURCES}:
+        path = os.path.join(directory, f"{name}.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No fixture for source {name} at {path} (run with --record)")
+        with open(path, encoding="utf-8") as handle:
+            fixtures[name] = json.load(handle)["records"]
+    return fixtures
+
+
+def _scaled_code(code: str, copy: int, width: int) -> str:
+    """'8517.62.00' -> '8517.62.00.07': copy k of a code, as a further 2-digit split"""
+    if copy == 0:
+        return code
+    suffix = f"{copy:0{width}d}"
+    return code + "".join(f".{suffix[i:i + 2]}" for i in range(0, width, 2))
+
+
+def scale_payloads(fixtures: dict, scale: int, changed: bool = False, seed: int = 1) -> dict:
+    """
+    JSON payload text per source with each record repeated `scale` times under
+    distinct codes. Copies keep their source's code set, so codes shared
+    between sources still overlap and merge as they do at 1x.
+    """
+    width = max(2, len(str(scale - 1)) + len(str(scale - 1)) % 2)
+    rng = random.Random(seed)
+    payloads = {}
+    for name, records in fixtures.items():
+        scaled = []
+        for copy in range(scale):
+            for record in records:
+                rate = record["rate"]
+                if changed and rng.random() < CHANGE_SHARE:
+                    rate = round(rate + 2.5, 2)
+                scaled.append(dict(record, hs_code=_scaled_code(record["hs_code"], copy, width), rate=rate))
+        payloads[name] = json.dumps(scaled)
+    return payloads
+
+
+def _replay_source(payload: str):
+    """Fetch callable returning the payload's records, decoded as the live source would parse them"""
+    def fetch(session=None):
+        records = json.loads(payload)
+        for record in records:
+            if record.get("effective_date"):
+                record["effective_date"] = datetime.fromisoformat(record["effective_date"])
+        return records
+    return fetch
+
+
+class StageRecorder:
+    """
+    progress(stage, seconds, count) callback that also attributes SQL
+    statements and traced memory to the stage that just ended. Stages that
+    repeat (once per batch, once per country) are summed; peak is the largest.
+    """
+
+    def __init__(self, bind, trace_memory: bool = True):
+        self.bind = bind
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.statements = 0
+        self._base = 0
+
+    def _count(self, *args):
+        self.statements += 1
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._count)
+        if self.trace_memory:
+            tracemalloc.start()
+            self._base = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.bind, "before_cursor_execute", self._count)
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def __call__(self, stage: str, seconds: float, count: int = None):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "count": 0, "sql": 0, "peak_mb": 0.0})
+        entry["seconds"] = round(entry["seconds"] + seconds, 4)
+        entry["calls"] += 1
+        entry["count"] += count or 0
+        entry["sql"] += self.statements
+        self.statements = 0
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            entry["peak_mb"] = max(entry["peak_mb"], round((peak - self._base) / 1e6, 3))
+            tracemalloc.reset_peak()
+            self._base = current
+
+
+def _profiled(profiler: str, path: str, call):
+    """Run call() under the chosen profiler and write its report to path"""
+    if profiler == "pyinstrument":
+        session = pyinstrument.Profiler()
+        session.start()
+        try:
+            return call()
+        finally:
+            session.stop()
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(session.output_html())
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(call)
+    finally:
+        profile.dump_stats(path)
+
+
+def replay(payloads: dict, trace_memory: bool = True, profiler: str = None, profile_path: str = None) -> dict:
+    """One fetch_all_real_tariffs() run over the given payloads; returns totals and per-stage figures"""
+    sources = {
+        country: {name: _replay_source(payloads[name]) for name in group}
+        for country, group in (("US", US_SOURCES), ("China", CHINA_SOURCES))
+    }
+    db = SessionLocal()
+    try:
+        with StageRecorder(engine, trace_memory) as recorder:
+            started = time.perf_counter()
+            call = lambda: fetch_all_real_tariffs(db, sources=sources, progress=recorder)
+            records = _profiled(profiler, profile_path, call) if profiler else call()
+            seconds = round(time.perf_counter() - started, 4)
+    finally:
+        db.close()
+    return {
+        "records": records,
+        "seconds": seconds,
+        "sql": sum(stage["sql"] for stage in recorder.stages.values()),
+        "peak_mb": max((stage["peak_mb"] for stage in recorder.stages.values()), default=0.0) if trace_memory else None,
+        "stages": recorder.stages
+    }
+
+
+def _print_run(label: str, result: dict):
+    memory = result["peak_mb"] is not None
+    print(f"\n{label}: {result['records']} records in {result['seconds']}s, {result['sql']} SQL statements"
+          + (f", peak {result['peak_mb']} MB" if memory else ""))
+    print(f"  {'stage':10} {'seconds':>9} {'calls':>6} {'count':>8} {'sql':>6}" + (f" {'peak MB':>8}" if memory else ""))
+    for stage, entry in result["stages"].items():
+        print(f"  {stage:10} {entry['seconds']:>9} {entry['calls']:>6} {entry['count']:>8} {entry['sql']:>6}"
+              + (f" {entry['peak_mb']:>8}" if memory else ""))
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, passes=PASSES, fixture_dir: str = FIXTURE_DIR, trace_memory: bool = True,
+                   profiler: str = None, profile_dir: str = None, seed: int = 1) -> dict:
+    """Replay every pass at every scale, each scale on emptied tables; returns the result document"""
+    fixtures = load_fixtures(fixture_dir)
+    if profiler:
+        os.makedirs(profile_dir, exist_ok=True)
+    runs = {}
+    for scale in scales:
+        db = SessionLocal()
+        try:
+            reset_tables(db)
+        finally:
+            db.close()
+        for name in passes:
+            payloads = scale_payloads(fixtures, scale, changed=name == "changed", seed=seed)
+            path = None
+            if profiler:
+                path = os.path.join(profile_dir, f"ingest-{scale}x-{name}."
+                                    + ("html" if profiler == "pyinstrument" else "prof"))
+            result = replay(payloads, trace_memory, profiler, path)
+            if path:
+                result["profile"] = path
+            runs.setdefault(f"{scale}x", {})[name] = result
+            _print_run(f"{scale}x {name}", result)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "database": engine.dialect.name,
+            "fixtures": {name: len(records) for name, records in fixtures.items()},
+            "memory_traced": trace_memory,
+            "profiler": profiler,
+            "seed": seed,
+            "python": platform.python_version(),
+            "machine": platform.machine()
+        },
+        "runs": runs
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrape -> save pipeline stage by stage")
+    parser.add_argument("--record", action="store_true", help="Re-record the source fixtures and exit")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="Directory of recorded source payloads")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="Comma-separated catalogue multipliers")
+    parser.add_argument("--passes", default=",".join(PASSES), help=f"Comma-separated passes ({', '.join(PASSES)})")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip tracemalloc (it slows allocation-heavy stages, so times are lower without it)")
+    parser.add_argument("--profile", metavar="DIR", help="Write one profile per scale and pass to DIR")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile", help="Profiler used with --profile")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for which rates move in the changed pass")
+    parser.add_argument("--reset", action="store_true", help="Allow emptying a database that already holds tariffs")
+    parser.add_argument("--output", help=f"Result file (default: {DEFAULT_OUTPUT_DIR}/ingest-<db>-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    if args.record:
+        counts = record_fixtures(args.fixtures)
+        print(", ".join(f"{name}: {count} records" for name, count in counts.items()) + f" -> {args.fixtures}")
+        sys.exit(0)
+
+    try:
+        scales = [int(s) for s in args.scales.split(",") if s]
+    except ValueError:
+        parser.error("--scales must be comma-separated integers")
+    if not scales or min(scales) < 1:
+        parser.error("--scales must be positive")
+    passes = [p for p in args.passes.split(",") if p]
+    unknown = [p for p in passes if p not in PASSES]
+    if unknown:
+        parser.error(f"unknown pass: {', '.join(unknown)}")
+    if args.profile and args.profiler == "pyinstrument" and pyinstrument is None:
+        parser.error("--profiler pyinstrument requires the pyinstrument package")
+
+    session = SessionLocal()
+    try:
+        populated = session.execute(select(func.count()).select_from(Tariff)).scalar()
+    finally:
+        session.close()
+    if populated and not args.reset:
+        parser.error("the database already holds tariffs and is emptied for each scale; pass --reset to allow it")
+
+    document = run_benchmarks(scales, passes, args.fixtures, not args.no_memory,
+                              args.profiler if args.profile else None, args.profile, args.seed)
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"ingest-{document['meta']['database']}-{document['meta']['commit'] or 'nogit'}-"
+        f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(document, handle, indent=2)
+    print(f"\nResults written to {output}")
@@ -0,0 +1,203 @@
+"""
+Scrape Jobs
+Bounded background queue for scrapes with job IDs, progress and coalescing of duplicate triggers.
+Job rows live in the database, so every worker process sees and coalesces into the same jobs.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, ScrapeJob
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_FINISHED_JOBS = 100  # Finished jobs kept for status polling
+# The owning worker refreshes its jobs' heartbeat this often; a live job whose
+# heartbeat is older than JOB_STALE_SECONDS belonged to a worker that died
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_POLL_SECONDS = 1.0  # How often a job waiting behind another worker's job re-checks
+
+
+class ScrapeSkipped(Exception):
+    """Raised by a scrape function that decided not to run (e.g. lock held elsewhere)"""
+
+
+def _as_dict(job: ScrapeJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "trigger": job.trigger,
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "progress": json.loads(job.progress or "[]"),
+        "coalesced_triggers": job.coalesced_triggers,
+        "tariffs_processed": job.tariffs_processed,
+        "error": job.error
+    }
+
+
+class ScrapeJobQueue:
+    """
+    Runs scrapes on a small worker pool, one at a time.
+
+    A trigger while a job of the same kind is queued or running anywhere
+    returns that job instead of starting a second one, so overlapping
+    triggers never write duplicate rows. The unique active_kind index makes
+    that atomic across worker processes. A job of another kind (a scrape
+    during a schedule import) queues behind the running one instead of being
+    swallowed by it, including when the import runs on another worker.
+    """
+
+    def __init__(self, scrape_func, max_workers: int = 1):
+        self.scrape_func = scrape_func
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape")
+        self._owned = {}  # id -> progress list of the jobs this process runs
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._heartbeat, name="scrape-heartbeat", daemon=True).start()
+
+    def submit(self, trigger: str = "manual", scrape_func=None, kind: str = "scrape"):
+        """Queue a job, or return the in-flight one of the same kind; returns (job, coalesced)"""
+        with SessionLocal() as db:
+            self._expire_abandoned(db)
+            while True:
+                coalesced = db.execute(
+                    update(ScrapeJob).where(ScrapeJob.active_kind == kind)
+                    .values(coalesced_triggers=ScrapeJob.coalesced_triggers + 1)
+                )
+                db.commit()
+                if coalesced.rowcount:
+                    job = db.execute(select(ScrapeJob).where(ScrapeJob.active_kind == kind)).scalar_one_or_none()
+                    if job is not None:
+                        return _as_dict(job), True
+                    continue  # Finished between the two statements; start a new one
+
+                now = datetime.utcnow()
+                job = ScrapeJob(
+                    id=uuid.uuid4().hex, kind=kind, active_kind=kind, trigger=trigger, status="queued",
+                    created_at=now, heartbeat_at=now, progress="[]", coalesced_triggers=0
+                )
+                db.add(job)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # Another worker queued one first; coalesce into it
+                    continue
+                break
+
+            with self._lock:
+                self._owned[job.id] = []
+            self._prune(db)
+            self._executor.submit(self._run, job.id, kind, scrape_func or self.scrape_func)
+            return _as_dict(job), False
+
+    def get(self, job_id: str):
+        with SessionLocal() as db:
+            job = db.get(ScrapeJob, job_id)
+            return _as_dict(job) if job else None
+
+    def _update(self, job_id: str, **fields):
+        with SessionLocal() as db:
+            db.execute(update(ScrapeJob).where(ScrapeJob.id == job_id).values(heartbeat_at=datetime.utcnow(), **fields))
+            db.commit()
+
+    def _record_stage(self, job_id: str, stage: str, seconds: float, count: int = None):
+        with self._lock:
+            progress = self._owned[job_id]
+            progress.append({"stage": stage, "seconds": seconds, "count": count})
+            encoded = json.dumps(progress)
+        self._update(job_id, progress=encoded)
+
+    def _wait_turn(self, job_id: str, kind: str):
+        """Block while a job of another kind is running on any worker"""
+        while not self._stopped.is_set():
+            with SessionLocal() as db:
+                running = db.execute(select(ScrapeJob.id).where(
+                    ScrapeJob.status == "running",
+                    ScrapeJob.active_kind.is_not(None),
+                    ScrapeJob.kind != kind,
+                    ScrapeJob.heartbeat_at >= datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+                ).limit(1)).scalar()
+            if running is None:
+                return
+            logger.info(f"Scrape job {job_id} waiting for job {running}")
+            self._stopped.wait(JOB_POLL_SECONDS)
+
+    def _run(self, job_id: str, kind: str, scrape_func):
+        self._wait_turn(job_id, kind)
+        started = time.perf_counter()
+        self._update(job_id, status="running", started_at=datetime.utcnow())
+        result = {}
+        db = SessionLocal()
+        try:
+            count = scrape_func(
+                db, progress=lambda stage, seconds, count=None: self._record_stage(job_id, stage, seconds, count)
+            )
+            result = {"status": "succeeded", "tariffs_processed": count}
+        except ScrapeSkipped as e:
+            result = {"status": "skipped", "error": str(e)}
+        except Exception as e:
+            logger.error(f"Scrape job {job_id} failed: {str(e)}")
+            result = {"status": "failed", "error": str(e)}
+        finally:
+            db.close()
+            self._update(job_id, finished_at=datetime.utcnow(), active_kind=None, **result)
+            with self._lock:
+                self._owned.pop(job_id, None)
+            logger.info(f"Scrape job {job_id} finished in {round(time.perf_counter() - started, 4)}s")
+
+    def _heartbeat(self):
+        while not self._stopped.wait(JOB_HEARTBEAT_SECONDS):
+            with self._lock:
+                owned = list(self._owned)
+            if not owned:
+                continue
+            try:
+                with SessionLocal() as db:
+                    db.execute(update(ScrapeJob).where(ScrapeJob.id.in_(owned)).values(heartbeat_at=datetime.utcnow()))
+                    db.commit()
+            except Exception as e:
+                logger.error(f"Scrape job heartbeat failed: {str(e)}")
+
+    def _expire_abandoned(self, db):
+        """Fail live jobs whose worker stopped refreshing them, so they no longer absorb triggers"""
+        expired = db.execute(
+            update(ScrapeJob).where(
+                ScrapeJob.active_kind.is_not(None),
+                ScrapeJob.heartbeat_at < datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+            ).values(status="failed", error="Abandoned: its worker stopped", finished_at=datetime.utcnow(),
+                     active_kind=None)
+        )
+        db.commit()
+        if expired.rowcount:
+            logger.warning(f"Marked {expired.rowcount} abandoned scrape job(s) failed")
+
+    def _prune(self, db):
+        keep = select(ScrapeJob.id).where(ScrapeJob.finished_at.is_not(None)) \
+            .order_by(ScrapeJob.finished_at.desc()).limit(MAX_FINISHED_JOBS)
+        db.execute(delete(ScrapeJob).where(ScrapeJob.finished_at.is_not(None), ScrapeJob.id.not_in(keep)))
+        db.commit()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            owned = list(self._owned)
+        if owned:
+            # Jobs that never started would otherwise absorb triggers until they go stale
+            queued = update(ScrapeJob).where(ScrapeJob.id.in_(owned), ScrapeJob.status == "queued")
+            with SessionLocal() as db:
+                db.execute(queued.values(status="failed", error="Worker shut down before the job started",
+                                              finished_at=datetime.utcnow(), active_kind=None))
+                db.commit()
@@ -0,0 +1,113 @@
+"""
+Scrape Leadership
+Cross-process lock so only one worker or container runs each scrape
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import engine, DATABASE_URL, get_watermark, set_watermark
+from jobs import ScrapeSkipped
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_KEY = 724830112  # Arbitrary, shared by every process of this app
+SCHEDULE_WATERMARK = "scheduled_scrape"
+
+
+def default_lock_file() -> str:
+    """Lock file next to the SQLite database, so containers sharing the volume share the lock"""
+    if DATABASE_URL.startswith("sqlite:///"):
+        db_path = DATABASE_URL[len("sqlite:///"):]
+        if db_path and db_path != ":memory:":
+            return f"{db_path}.scrape.lock"
+    return os.path.join(os.getcwd(), "tariff_scrape.lock")
+
+
+LOCK_FILE = os.getenv("SCRAPE_LOCK_FILE") or default_lock_file()
+
+
+@contextmanager
+def _advisory_lock():
+    """Postgres session-level advisory lock; released automatically if the holder dies"""
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+        conn.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                conn.commit()
+
+
+@contextmanager
+def _file_lock():
+    """Exclusive OS file lock; the kernel drops it when the holding process exits"""
+    handle = open(LOCK_FILE, "a+")
+    acquired = False
+    try:
+        try:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            acquired = True
+        except OSError:
+            acquired = False
+        yield acquired
+    finally:
+        if acquired:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        handle.close()
+
+
+def scrape_lock():
+    """Non-blocking cross-process scrape lock; yields True when this process holds it"""
+    if engine.dialect.name == "postgresql":
+        return _advisory_lock()
+    return _file_lock()
+
+
+def locked_scrape(scrape_func, scheduled: bool = False):
+    """
+    Wrap a scrape so it only runs while holding the scrape lock.
+
+    Scheduled runs also record the day they ran for, so a worker whose cron
+    fires after the leader has already finished does not run it again.
+    """
+    def run(db: Session, progress=None):
+        slot = int(datetime.now().strftime("%Y%m%d"))
+        started = time.perf_counter()
+        with scrape_lock() as acquired:
+            if not acquired:
+                logger.info(f"Scrape skipped: another process holds the scrape lock (pid {os.getpid()})")
+                raise ScrapeSkipped("Another process is already scraping")
+            if scheduled and get_watermark(db, SCHEDULE_WATERMARK) >= slot:
+                logger.info(f"Scheduled scrape for {slot} already ran; skipping (pid {os.getpid()})")
+                raise ScrapeSkipped(f"Scheduled scrape for {slot} already ran")
+
+            logger.info(f"Scrape lock acquired by pid {os.getpid()} in {round(time.perf_counter() - started, 4)}s")
+            count = scrape_func(db, progress=progress)
+            if scheduled:
+                set_watermark(db, SCHEDULE_WATERMARK, slot)
+                db.commit()
+            logger.info(f"Locked scrape finished in {round(time.perf_counter() - started, 4)}s (pid {os.getpid()})")
+            return count
+    return run
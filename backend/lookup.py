@@ -0,0 +1,135 @@
+"""
+Bulk Rate Lookup
+Resolve thousands of (country, hs_code[, date]) keys per request against in-memory hash indexes
+"""
+
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import Tariff
+from hs_search import normalize_hs_code
+from response_cache import current_generation, single_flight
+from asof import as_of_index
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_LOOKUP_KEYS = 10000
+
+
+class LookupKey(BaseModel):
+    country: str
+    hs_code: str
+    date: Optional[datetime] = None  # Omit for the current rate
+
+
+class LookupRequest(BaseModel):
+    keys: List[LookupKey]
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class CurrentRateIndex:
+    """
+    Hash index of current tariff rows keyed by (upper-cased country, HS digits).
+
+    Entries are stored already JSON-ready, so a lookup is a dict probe plus a
+    copy. Rebuilt when the data generation moves, like the as-of index.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def refresh(self, db: Session):
+        generation = current_generation(db)
+        if generation == self._generation:
+            return
+        with single_flight(self._building, self._generation is not None) as build:
+            if build:
+                self._rebuild(db, generation)
+
+    def _rebuild(self, db: Session, generation: int):
+        # Loaded without holding the lock, as in AsOfIndex.refresh
+        started = time.perf_counter()
+        entries = {}
+        rows = db.execute(select(
+            Tariff.id, Tariff.country, Tariff.hs_code, Tariff.hs_digits, Tariff.product_description,
+            Tariff.rate, Tariff.effective_date, Tariff.last_updated
+        ).order_by(Tariff.id))
+        for row in rows:
+            entries.setdefault(((row.country or "").upper(), row.hs_digits or ""), {
+                "id": row.id,
+                "matched_hs_code": row.hs_code,
+                "product_description": row.product_description,
+                "rate": row.rate,
+                "effective_date": _iso(row.effective_date),
+                "last_updated": _iso(row.last_updated)
+            })
+        with self._lock:
+            if self._generation is None or generation > self._generation:
+                self._entries = entries
+                self._generation = generation
+        logger.info(
+            f"Current rate index rebuilt for generation {generation}: {len(entries)} codes "
+            f"in {round(time.perf_counter() - started, 4)}s"
+        )
+
+    def get(self, country_key: str, digits: str):
+        return self._entries.get((country_key, digits))
+
+
+current_rate_index = CurrentRateIndex()
+
+
+def resolve_keys(db: Session, keys: list) -> list:
+    """JSON-ready results in request order; keys that match nothing come back with found=False"""
+    current_rate_index.refresh(db)
+    if any(key.date is not None for key in keys):
+        as_of_index.refresh(db)
+
+    results = []
+    for key in keys:
+        country_key = (key.country or "").upper()
+        digits = normalize_hs_code(key.hs_code)
+        result = {"country": key.country, "hs_code": key.hs_code, "date": _iso(key.date), "found": False}
+        if key.date is None:
+            entry = current_rate_index.get(country_key, digits)
+            if entry is not None:
+                result["found"] = True
+                result.update(entry)
+        elif digits:
+            entry = as_of_index.lookup(country_key, digits, _naive_utc(key.date))
+            if entry is not None:
+                result.update(
+                    found=True,
+                    matched_hs_code=entry["hs_code"],
+                    product_description=entry["product_description"],
+                    rate=entry["rate"],
+                    valid_from=_iso(entry["valid_from"]),
+                    valid_to=_iso(entry["valid_to"])
+                )
+        results.append(result)
+    return results
+
+
+def render_lookup(results: list) -> str:
+    """Serialize directly; results are already JSON-ready, so skip FastAPI's generic encoder"""
+    found = sum(1 for result in results if result["found"])
+    return json.dumps({"total": len(results), "found": found, "missing": len(results) - found, "data": results})
@@ -1,11 +1,36 @@
-from fastapi import FastAPI, Depends, Query
+from fastapi import FastAPI, Depends, Query, HTTPException, Header, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse, FileResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
-from datetime import datetime, timedelta
-from database import get_db, Tariff, TariffHistory, TariffTrend
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func
+from datetime import datetime, date, timedelta, timezone
+from typing import List
+from database import get_async_db, run_in_session, SessionLocal, Tariff, TariffHistory, TariffProgramRate, TariffTrendRollup, HSHierarchyRollup
 from scraper import run_daily_scrape
+from jobs import ScrapeJobQueue
+from leader import locked_scrape, scrape_lock
+from pagination import paginate_keyset
+from rollups import GRANULARITIES, bucket_start, day_buckets
+from asof import as_of_index
+from duty import DutyRequest, program_rate_table, invalid_lines, MAX_REQUEST_LINES as MAX_DUTY_LINES
+from lookup import LookupRequest, resolve_keys, render_lookup, MAX_LOOKUP_KEYS
+from events import change_broker, format_sse, poll_changes, KEEPALIVE_SECONDS
+from hierarchy import LEVELS as HS_LEVELS, hierarchy_built, rebuild_hierarchy, prefix_trend
+from trend_intervals import trend_points, legacy_trends_pending, migrate_legacy_trends
+from stats import ensure_counters, read_stats
+from schedule_import import import_job, normalize_country, stage_uploads, MAX_WORKERS as MAX_IMPORT_WORKERS
+from response_cache import cached_endpoint, response_cache
+from export import EXPORT_COLUMNS, FORMATS as EXPORT_FORMATS, build_export_query, iter_csv, iter_ndjson
+from parquet_export import export_all as export_parquet, list_files as list_parquet_files, resolve_file as resolve_parquet_file
+from downsample import downsample_rows, METHODS as DOWNSAMPLE_METHODS
+from columnar import FORMATS as RESPONSE_FORMATS, TARIFF_COLUMNS, CHANGE_COLUMNS, ROLLUP_COLUMNS, TREND_FIELDS, ROLLUP_FIELDS, columnar_body, trend_rows, rollup_rows
+from hs_search import normalize_hs_code, prefix_filter, hs_prefix_index, PREFIX_INDEX_ENABLED
 from apscheduler.schedulers.background import BackgroundScheduler
+import os
+import json
+import shutil
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -29,23 +54,54 @@ app.add_middleware(
 # Initialize scheduler for daily scraping
 scheduler = BackgroundScheduler()
 
+# Scrapes run one at a time off the request path; job rows are shared through the
+# database so duplicate triggers coalesce across workers, and the cross-process
+# lock keeps other workers from scraping concurrently
+scrape_jobs = ScrapeJobQueue(locked_scrape(run_daily_scrape))
+scheduled_scrape = locked_scrape(run_daily_scrape, scheduled=True)
+
+def run_migrations():
+    """One-time data migrations (stat counters, legacy trends to intervals, first HS hierarchy build); one worker does them"""
+    db = SessionLocal()
+    try:
+        ensure_counters(db)
+        if not legacy_trends_pending(db) and hierarchy_built(db):
+            return
+        with scrape_lock() as acquired:
+            if not acquired:
+                logger.info("Data migrations running in another process")
+                return
+            if legacy_trends_pending(db):
+                migrate_legacy_trends(db)
+            if not hierarchy_built(db):
+                rebuild_hierarchy(db)
+    except Exception as e:
+        logger.error(f"Data migration failed: {str(e)}")
+    finally:
+        db.close()
+
 @app.on_event("startup")
 def start_scheduler():
     """Start the background scheduler for daily tariff updates"""
     def daily_job():
-        db = next(get_db())
-        try:
-            run_daily_scrape(db)
-        except Exception as e:
-            logger.error(f"Error in daily scrape job: {str(e)}")
+        job, coalesced = scrape_jobs.submit(trigger="scheduled", scrape_func=scheduled_scrape)
+        if coalesced:
+            logger.info(f"Scheduled scrape coalesced into running job {job['id']}")
     
+    run_migrations()
     scheduler.add_job(daily_job, "cron", hour=0, minute=0)  # Run at midnight daily
     scheduler.start()
     logger.info("Scheduler started")
 
+@app.on_event("startup")
+async def start_change_poller():
+    """Publish scrapes committed by other workers to this worker's stream subscribers"""
+    app.state.change_poller = asyncio.create_task(poll_changes())
+
 @app.on_event("shutdown")
 def stop_scheduler():
     scheduler.shutdown()
+    scrape_jobs.shutdown()
 
 # Routes
 @app.get("/")
@@ -58,6 +114,7 @@ async def root():
             "changes": "/api/changes",
             "trends": "/api/trends",
             "stats": "/api/stats",
+            "stream": "/api/stream",
             "health": "/health"
         }
     }
@@ -67,29 +124,64 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.get("/api/tariffs")
+@cached_endpoint("tariffs")
 async def get_tariffs(
     country: str = Query(None, description="Filter by country: US or China"),
     hs_code: str = Query(None, description="Filter by HS code"),
+    hs_mode: str = Query("prefix", description="prefix (indexed chapter/heading/subheading match) or substring (slow scan)"),
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: str = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: bool = Query(True, description="Set false to skip the COUNT query"),
+    format: str = Query("records", description="records (list of objects) or columnar ({columns, rows})"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get tariff rates"""
-    query = db.query(Tariff)
+    """Get tariff rates (newest first; pass cursor for keyset pagination)"""
+    return await run_in_session(_get_tariffs, country, hs_code, hs_mode, skip, limit, cursor, include_total, format)
+
+def _check_format(format: str):
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be records or columnar")
+
+def _get_tariffs(db: Session, country, hs_code, hs_mode, skip, limit, cursor, include_total, format="records"):
+    _check_format(format)
+    # Columnar pages select plain columns and skip ORM objects entirely
+    query = db.query(*TARIFF_COLUMNS.values()) if format == "columnar" else db.query(Tariff)
     
     if country:
         query = query.filter(Tariff.country == country.upper())
     
-    if hs_code:
+    hs_prefix = None
+    if hs_code and hs_mode == "substring":
         query = query.filter(Tariff.hs_code.contains(hs_code))
+    elif hs_code:
+        hs_prefix = normalize_hs_code(hs_code)
+        if not hs_prefix:
+            raise HTTPException(status_code=400, detail="hs_code must contain digits for prefix search")
+        query = query.filter(prefix_filter(Tariff.hs_digits, hs_prefix))
     
-    total = query.count()
-    tariffs = query.order_by(desc(Tariff.last_updated)).offset(skip).limit(limit).all()
+    if not include_total:
+        total = None
+    elif hs_prefix and PREFIX_INDEX_ENABLED:
+        total = hs_prefix_index.count(db, hs_prefix, country.upper() if country else None)
+    else:
+        total = query.count()
+    if cursor is not None or skip == 0:
+        tariffs, next_cursor = paginate_keyset(query, Tariff.last_updated, Tariff.id, cursor, limit)
+    else:
+        tariffs = query.order_by(desc(Tariff.last_updated), desc(Tariff.id)).offset(skip).limit(limit).all()
+        next_cursor = None
     
+    if format == "columnar":
+        return columnar_body(
+            {"total": total, "skip": skip, "limit": limit, "next_cursor": next_cursor},
+            TARIFF_COLUMNS, tariffs
+        )
     return {
         "total": total,
         "skip": skip,
         "limit": limit,
+        "next_cursor": next_cursor,
         "data": [
             {
                 "id": t.id,
@@ -104,29 +196,144 @@ async def get_tariffs(
         ]
     }
 
+@app.get("/api/tariffs/as-of")
+@cached_endpoint("as_of")
+async def get_tariffs_as_of(
+    at: datetime = Query(..., description="Point in time (ISO date or datetime, UTC)"),
+    country: str = Query(None, description="Filter by country: US or China"),
+    hs_code: str = Query(None, description="Exact HS code; omit for a catalogue snapshot"),
+    prefix: str = Query(None, description="HS digits prefix for a partial snapshot"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Rates in effect at a point in time, from the in-memory temporal index"""
+    return await run_in_session(_get_tariffs_as_of, at, country, hs_code, prefix)
+
+def _get_tariffs_as_of(db: Session, at, country, hs_code, prefix):
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    as_of_index.refresh(db)
+    
+    if hs_code:
+        if not country:
+            raise HTTPException(status_code=400, detail="country is required with hs_code")
+        entry = as_of_index.lookup(country, hs_code, at)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"No {country} rate for {hs_code} at {at.isoformat()}")
+        return {"at": at, **entry}
+    
+    digits = normalize_hs_code(prefix) if prefix else None
+    if prefix and not digits:
+        raise HTTPException(status_code=400, detail="prefix must contain digits")
+    data = as_of_index.snapshot(at, country, digits)
+    return {"at": at, "total": len(data), "data": data}
+
+@app.post("/api/tariffs/lookup")
+async def lookup_tariffs(request: LookupRequest):
+    """Resolve many (country, hs_code[, date]) keys in one call; results follow request order"""
+    if len(request.keys) > MAX_LOOKUP_KEYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_KEYS} keys per request")
+    return Response(await run_in_session(_lookup_tariffs, request.keys), media_type="application/json")
+
+def _lookup_tariffs(db: Session, keys):
+    return render_lookup(resolve_keys(db, keys))
+
+@app.get("/api/tariffs/programs")
+@cached_endpoint("programs")
+async def get_program_rates(
+    country: str = Query(..., description="US or China"),
+    hs_code: str = Query(..., description="HS code"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Every rate program recorded for a code, oldest first"""
+    return await run_in_session(_get_program_rates, country, hs_code)
+
+def _get_program_rates(db: Session, country, hs_code):
+    digits = normalize_hs_code(hs_code)
+    if not digits:
+        raise HTTPException(status_code=400, detail="hs_code must contain digits")
+    rates = db.query(TariffProgramRate).filter(
+        TariffProgramRate.hs_digits == digits,
+        func.upper(TariffProgramRate.country) == country.upper()
+    ).order_by(TariffProgramRate.program, TariffProgramRate.effective_date).all()
+    return {
+        "country": country,
+        "hs_code": hs_code,
+        "data": [
+            {
+                "program": r.program,
+                "rate": r.rate,
+                "effective_date": r.effective_date,
+                "source": r.source,
+                "last_updated": r.last_updated
+            }
+            for r in rates
+        ]
+    }
+
+@app.post("/api/duty/calculate")
+async def calculate_duty(request: DutyRequest):
+    """Stacked duty for a batch of invoice lines, computed column-wise"""
+    count = len(request.hs_code)
+    if len(request.country) != count or len(request.customs_value) != count or (
+            request.date is not None and len(request.date) != count):
+        raise HTTPException(status_code=400, detail="country, hs_code, customs_value and date must have equal lengths")
+    if count > MAX_DUTY_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DUTY_LINES} lines per request")
+    
+    return Response(await run_in_session(_calculate_duty, request), media_type="application/json")
+
+def _calculate_duty(db: Session, request: DutyRequest) -> str:
+    program_rate_table.refresh(db)
+    duties = program_rate_table.calculate(request.country, request.hs_code, request.customs_value, request.date)
+    if duties["error"].notna().any():
+        raise HTTPException(status_code=400, detail=f"Lines not priced: {invalid_lines(duties)}")
+    duties = duties.drop(columns="error")
+    body = {"lines": len(duties), "total_duty": round(float(duties["duty"].sum()), 2), "programs": program_rate_table.programs}
+    body.update({column: duties[column].tolist() for column in duties.columns})
+    return json.dumps(body)
+
 @app.get("/api/changes")
+@cached_endpoint("changes", rolling_window=True)
 async def get_tariff_changes(
     days: int = Query(7, description="Number of days to look back"),
     country: str = Query(None, description="Filter by country: US or China"),
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: str = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: bool = Query(True, description="Set false to skip the COUNT query"),
+    format: str = Query("records", description="records (list of objects) or columnar ({columns, rows})"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get recent tariff changes"""
+    """Get recent tariff changes (newest first; pass cursor for keyset pagination)"""
+    return await run_in_session(_get_tariff_changes, days, country, skip, limit, cursor, include_total, format)
+
+def _get_tariff_changes(db: Session, days, country, skip, limit, cursor, include_total, format="records"):
+    _check_format(format)
     cutoff_date = datetime.utcnow() - timedelta(days=days)
-    query = db.query(TariffHistory).filter(TariffHistory.change_date >= cutoff_date)
+    query = db.query(*CHANGE_COLUMNS.values()) if format == "columnar" else db.query(TariffHistory)
+    query = query.filter(TariffHistory.change_date >= cutoff_date)
     
     if country:
         query = query.filter(TariffHistory.country == country.upper())
     
-    total = query.count()
-    changes = query.order_by(desc(TariffHistory.change_date)).offset(skip).limit(limit).all()
+    total = query.count() if include_total else None
+    if cursor is not None or skip == 0:
+        changes, next_cursor = paginate_keyset(query, TariffHistory.change_date, TariffHistory.id, cursor, limit)
+    else:
+        changes = query.order_by(desc(TariffHistory.change_date), desc(TariffHistory.id)).offset(skip).limit(limit).all()
+        next_cursor = None
     
+    if format == "columnar":
+        return columnar_body(
+            {"total": total, "days": days, "skip": skip, "limit": limit, "next_cursor": next_cursor},
+            CHANGE_COLUMNS, changes
+        )
     return {
         "total": total,
         "days": days,
         "skip": skip,
         "limit": limit,
+        "next_cursor": next_cursor,
         "data": [
             {
                 "id": c.id,
@@ -142,23 +349,52 @@ async def get_tariff_changes(
     }
 
 @app.get("/api/trends")
+@cached_endpoint("trends", rolling_window=True)
 async def get_tariff_trends(
     country: str = Query(None, description="Filter by country: US or China"),
     hs_code: str = Query(None, description="Filter by HS code"),
     days: int = Query(90, description="Number of days to look back"),
-    db: Session = Depends(get_db)
+    granularity: str = Query("raw", description="raw, day, week or month"),
+    max_points: int = Query(None, ge=3, description="Downsample each series to at most this many points"),
+    downsample: str = Query("minmax", description="minmax (keeps step changes) or lttb"),
+    format: str = Query("records", description="records (grouped by date) or columnar (one row per code and date)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get historical tariff trends for charting"""
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    query = db.query(TariffTrend).filter(TariffTrend.record_date >= cutoff_date)
-    
-    if country:
-        query = query.filter(TariffTrend.country == country.upper())
+    return await run_in_session(_get_tariff_trends, country, hs_code, days, granularity, max_points, downsample, format)
+
+def _get_tariff_trends(db: Session, country, hs_code, days, granularity, max_points, downsample, format="records"):
+    _check_format(format)
+    if granularity != "raw" and granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be raw, day, week or month")
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail="downsample must be minmax or lttb")
     
-    if hs_code:
-        query = query.filter(TariffTrend.hs_code == hs_code)
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    meta = {"country": country, "hs_code": hs_code, "days": days, "granularity": granularity, "max_points": max_points}
+    if granularity != "raw" and format == "columnar":
+        buckets = _rollup_buckets(db, country, hs_code, cutoff_date, granularity, max_points, downsample, ROLLUP_COLUMNS)
+        return columnar_body(meta, ROLLUP_FIELDS, rollup_rows(buckets))
+    if granularity != "raw":
+        return {
+            "country": country,
+            "hs_code": hs_code,
+            "days": days,
+            "granularity": granularity,
+            "max_points": max_points,
+            "data": _rollup_trends(db, country, hs_code, cutoff_date, granularity, max_points, downsample)
+        }
     
-    trends = query.order_by(TariffTrend.record_date).all()
+    # Daily points are rebuilt from the stored rate intervals
+    trends = trend_points(db, country.upper() if country else None, hs_code, start=cutoff_date)
+    trends = downsample_rows(
+        trends, max_points, downsample,
+        key=lambda t: (t.country, t.hs_code),
+        x=lambda t: t.record_date.timestamp(),
+        y=lambda t: t.rate
+    )
+    if format == "columnar":
+        return columnar_body(meta, TREND_FIELDS, trend_rows(trends))
     
     # Group by date for chart display
     grouped_data = {}
@@ -187,36 +423,277 @@ async def get_tariff_trends(
         "country": country,
         "hs_code": hs_code,
         "days": days,
+        "granularity": granularity,
+        "max_points": max_points,
         "data": sorted(grouped_data.values(), key=lambda x: x["date"])
     }
 
+def _rollup_buckets(db: Session, country: str, hs_code: str, cutoff_date: datetime, granularity: str,
+                    max_points: int = None, downsample: str = "minmax", columns=None):
+    """Downsampled rollup buckets (whole rows, or just the given columns)"""
+    if granularity == "day":
+        # Not stored; one bucket per code per day from the rate intervals
+        buckets = day_buckets(db, country.upper() if country else None, hs_code, bucket_start(cutoff_date, "day"))
+    else:
+        query = (db.query(*columns) if columns else db.query(TariffTrendRollup)).filter(
+            TariffTrendRollup.granularity == granularity,
+            TariffTrendRollup.bucket_start >= bucket_start(cutoff_date, granularity)
+        )
+        
+        if country:
+            query = query.filter(TariffTrendRollup.country == country.upper())
+        
+        if hs_code:
+            query = query.filter(TariffTrendRollup.hs_code == hs_code)
+        
+        buckets = query.order_by(TariffTrendRollup.bucket_start, TariffTrendRollup.last_record_date).all()
+    return downsample_rows(
+        buckets, max_points, downsample,
+        key=lambda b: (b.country, b.hs_code),
+        x=lambda b: b.bucket_start.timestamp(),
+        y=lambda b: b.last_rate
+    )
+
+def _rollup_trends(db: Session, country: str, hs_code: str, cutoff_date: datetime, granularity: str,
+                   max_points: int = None, downsample: str = "minmax"):
+    """Read one row per bucket from the rollup table, in the same shape as raw trends"""
+    buckets = _rollup_buckets(db, country, hs_code, cutoff_date, granularity, max_points, downsample)
+    
+    grouped_data = {}
+    for bucket in buckets:
+        date_key = bucket.bucket_start.strftime("%Y-%m-%d")
+        if date_key not in grouped_data:
+            grouped_data[date_key] = {
+                "date": date_key,
+                "us_rate": None,
+                "china_rate": None,
+                "rates": {}
+            }
+        
+        if bucket.country == "US":
+            grouped_data[date_key]["us_rate"] = bucket.last_rate
+        elif bucket.country == "China":
+            grouped_data[date_key]["china_rate"] = bucket.last_rate
+        
+        code_key = f"{bucket.country}_{bucket.hs_code}"
+        grouped_data[date_key]["rates"][code_key] = {
+            "rate": bucket.last_rate,
+            "avg_rate": bucket.rate_sum / bucket.samples,
+            "min_rate": bucket.min_rate,
+            "max_rate": bucket.max_rate,
+            "product": bucket.product_description
+        }
+    
+    return list(grouped_data.values())
+
+@app.get("/api/hierarchy")
+@cached_endpoint("hierarchy")
+async def get_hierarchy(
+    country: str = Query(..., description="US or China"),
+    level: str = Query("chapter", description="chapter, heading or subheading"),
+    parent: str = Query(None, description="Only nodes under this HS prefix (e.g. 85 for headings of chapter 85)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Precomputed rate aggregates per HS chapter, heading or subheading"""
+    return await run_in_session(_get_hierarchy, country, level, parent)
+
+def _get_hierarchy(db: Session, country, level, parent):
+    if level not in HS_LEVELS:
+        raise HTTPException(status_code=400, detail="level must be chapter, heading or subheading")
+    query = db.query(HSHierarchyRollup).filter(
+        func.upper(HSHierarchyRollup.country) == country.upper(),
+        HSHierarchyRollup.level == level
+    )
+    if parent:
+        digits = normalize_hs_code(parent)
+        if not digits or len(digits) >= HS_LEVELS[level]:
+            raise HTTPException(status_code=400, detail=f"parent must be a shorter HS prefix than a {level}")
+        query = query.filter(prefix_filter(HSHierarchyRollup.prefix, digits))
+    
+    nodes = query.order_by(HSHierarchyRollup.prefix).all()
+    return {
+        "country": country,
+        "level": level,
+        "parent": parent,
+        "data": [
+            {
+                "prefix": n.prefix,
+                "parent": n.parent,
+                "codes": n.codes,
+                "avg_rate": round(n.rate_sum / n.codes, 4) if n.codes else None,
+                "child_avg_rate": round(n.child_avg_rate, 4) if n.child_avg_rate is not None else None,
+                "min_rate": n.min_rate,
+                "max_rate": n.max_rate,
+                "updated_at": n.updated_at
+            }
+            for n in nodes
+        ]
+    }
+
+@app.get("/api/hierarchy/trends")
+@cached_endpoint("hierarchy_trends", rolling_window=True)
+async def get_hierarchy_trends(
+    country: str = Query(..., description="US or China"),
+    prefix: str = Query(..., description="HS chapter, heading or subheading digits"),
+    days: int = Query(90, description="Number of days to look back"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Daily average rate across every code under an HS prefix"""
+    return await run_in_session(_get_hierarchy_trends, country, prefix, days)
+
+def _get_hierarchy_trends(db: Session, country, prefix, days):
+    digits = normalize_hs_code(prefix)
+    if len(digits) < 2:
+        raise HTTPException(status_code=400, detail="prefix must have at least 2 HS digits")
+    stored = db.query(Tariff.country).filter(func.upper(Tariff.country) == country.upper()).first()
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return {
+        "country": country,
+        "prefix": digits,
+        "days": days,
+        "data": prefix_trend(db, stored.country, digits, cutoff_date) if stored else []
+    }
+
 @app.get("/api/stats")
-async def get_stats(db: Session = Depends(get_db)):
+@cached_endpoint("stats", rolling_window=True)
+async def get_stats(db: AsyncSession = Depends(get_async_db)):
     """Get dashboard statistics"""
-    us_count = db.query(Tariff).filter(Tariff.country == "US").count()
-    china_count = db.query(Tariff).filter(Tariff.country == "China").count()
-    recent_changes = db.query(TariffHistory).filter(
-        TariffHistory.change_date >= datetime.utcnow() - timedelta(days=7)
-    ).count()
+    return await run_in_session(read_stats)
+
+@app.post("/api/export/parquet")
+def run_parquet_export(rebuild: bool = Query(False, description="Drop existing files and export everything")):
+    """Update the partitioned Parquet snapshot with new trend, interval and history rows"""
+    return {"tables": export_parquet(rebuild=rebuild)}
+
+@app.get("/api/export/parquet")
+def get_parquet_manifest():
+    """List Parquet snapshot files (partitioned by country and month)"""
+    return {"files": list_parquet_files()}
+
+@app.get("/api/export/parquet/{path:path}")
+def get_parquet_file(path: str):
+    """Download one Parquet snapshot file"""
+    file_path = resolve_parquet_file(path)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, media_type="application/vnd.apache.parquet", filename=os.path.basename(file_path))
+
+@app.get("/api/export/{table}")
+def export_table(
+    table: str,
+    format: str = Query("ndjson", description="ndjson or csv"),
+    country: str = Query(None, description="Filter by country: US or China"),
+    hs_code: str = Query(None, description="Filter by HS code"),
+    hs_mode: str = Query("prefix", description="prefix or substring (tariffs only)"),
+    days: int = Query(None, description="Number of days to look back (history, trends and intervals only)")
+):
+    """Stream a whole table as NDJSON or CSV in constant memory"""
+    if table not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="table must be tariffs, history, trends or intervals")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    if hs_code and table == "tariffs" and hs_mode != "substring" and not normalize_hs_code(hs_code):
+        raise HTTPException(status_code=400, detail="hs_code must contain digits for prefix search")
+    
+    query, columns = build_export_query(table, country, hs_code, hs_mode, days)
+    rows = iter_csv(query, columns) if format == "csv" else iter_ndjson(query, columns)
+    filename = f"{table}.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/stream")
+async def stream_changes(request: Request, last_event_id: str = Header(None)):
+    """Server-Sent Events: one "changes" event (new history rows + stats delta) per committed scrape"""
+    entry, first = change_broker.subscribe()
+    try:
+        if first:
+            await run_in_session(change_broker.prime)
+        missed = None
+        if last_event_id and last_event_id.isdigit():
+            missed = await run_in_session(change_broker.replay, int(last_event_id))
+    except Exception:
+        change_broker.unsubscribe(entry)
+        raise
     
+    async def events():
+        _, queue = entry
+        try:
+            yield "retry: 10000\n\n"
+            if missed:
+                yield format_sse(missed)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            change_broker.unsubscribe(entry)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Response cache hit/miss statistics"""
+    return response_cache.stats()
+
+@app.post("/api/trigger-scrape", status_code=202)
+async def trigger_scrape():
+    """Queue a tariff scrape (admin only); joins the in-flight scrape if there is one"""
+    job, coalesced = scrape_jobs.submit(trigger="manual")
     return {
-        "us_tariffs": us_count,
-        "china_tariffs": china_count,
-        "total_tariffs": us_count + china_count,
-        "recent_changes_7d": recent_changes,
-        "last_update": datetime.utcnow()
+        "status": job["status"],
+        "job_id": job["id"],
+        "coalesced": coalesced,
+        "timestamp": datetime.utcnow()
     }
 
-@app.post("/api/trigger-scrape")
-async def trigger_scrape(db: Session = Depends(get_db)):
-    """Manually trigger a tariff scrape (admin only)"""
-    count = run_daily_scrape(db)
+@app.post("/api/import", status_code=202)
+def import_schedules(
+    country: str = Query(..., description="US or China"),
+    files: List[UploadFile] = File(..., description="CSV, JSON, NDJSON or XLSX schedule files"),
+    program: str = Query(None, description="Rate program for rows without a program column (default: base)"),
+    effective_date: date = Query(None, description="Effective date for rows without one"),
+    workers: int = Query(1, ge=1, le=MAX_IMPORT_WORKERS, description="Parse several files in this many processes")
+):
+    """Queue an import of full schedule files (admin only); poll /api/jobs/{job_id} for progress"""
+    try:
+        country = normalize_country(country)
+        directory, paths = stage_uploads([(upload.filename, upload.file) for upload in files])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    run_import = import_job(
+        directory, paths, country, program=program, workers=workers,
+        effective_date=datetime(effective_date.year, effective_date.month, effective_date.day) if effective_date else None
+    )
+    job, coalesced = scrape_jobs.submit(trigger="import", scrape_func=locked_scrape(run_import), kind="import")
+    if coalesced:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise HTTPException(status_code=409, detail=f"Import {job['id']} is already running; retry when it finishes")
     return {
-        "status": "success",
-        "tariffs_processed": count,
+        "status": job["status"],
+        "job_id": job["id"],
+        "files": len(paths),
         "timestamp": datetime.utcnow()
     }
 
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, per-stage timings and result of a scrape job"""
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,305 @@
+"""
+Parquet Export
+Incremental, hive-partitioned (country / month) Parquet snapshots of tariff_trends, tariff_history
+and tariff_trend_intervals
+
+Usage: python -m parquet_export [--rebuild] [--dir DIR]
+"""
+
+import os
+import json
+import shutil
+import logging
+import argparse
+import time
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from database import SessionLocal, TariffHistory, TariffTrend, TariffTrendInterval, get_watermark, set_watermark
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("PARQUET_EXPORT_DIR", "./exports/parquet")
+READ_BATCH_SIZE = 10000
+FLUSH_ROWS = 10000  # Rows buffered per partition before they are written out as a row group
+COMPRESSION = "zstd"
+
+# country and month live in the partition path, not in the files
+PARQUET_TABLES = {
+    "trends": (TariffTrend, TariffTrend.record_date, pa.schema([
+        ("id", pa.int64()),
+        ("hs_code", pa.string()),
+        ("product_description", pa.string()),
+        ("rate", pa.float64()),
+        ("record_date", pa.timestamp("us")),
+        ("created_at", pa.timestamp("us")),
+    ])),
+    "history": (TariffHistory, TariffHistory.change_date, pa.schema([
+        ("id", pa.int64()),
+        ("tariff_id", pa.int64()),
+        ("hs_code", pa.string()),
+        ("old_rate", pa.float64()),
+        ("new_rate", pa.float64()),
+        ("change_date", pa.timestamp("us")),
+        ("change_reason", pa.string()),
+    ])),
+}
+
+
+# Intervals are updated in place (valid_to closes when a rate changes), so
+# they are exported by rewriting whole partitions instead of appending
+INTERVAL_TABLE = "trend_intervals"
+INTERVAL_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("hs_code", pa.string()),
+    ("product_description", pa.string()),
+    ("rate", pa.float64()),
+    ("valid_from", pa.timestamp("us")),
+    ("valid_to", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+])
+INTERVAL_STATE_FILE = "_state.json"
+
+
+class PartitionWriters:
+    """
+    One ParquetWriter per partition directory, fed a row at a time.
+
+    Each partition buffers at most FLUSH_ROWS rows before writing them as a
+    row group. Callers feed rows grouped by partition and finish() each one
+    when the next starts, so only one partition's buffer is held at a time.
+    Files are written under a hidden temporary name and renamed when
+    finished; abort() deletes them instead.
+    """
+
+    def __init__(self, schema: pa.Schema, file_name):
+        self.schema = schema
+        self.file_name = file_name  # file_name(first_id, last_id) -> final file name
+        self.rows = 0
+        self.files = []
+        self._id_position = schema.get_field_index("id")
+        self._parts = {}
+
+    def append(self, directory: str, values):
+        part = self._parts.get(directory)
+        if part is None:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f".part-{values[self._id_position]}.parquet.tmp")
+            part = self._parts[directory] = {
+                "path": path,
+                "writer": pq.ParquetWriter(path, self.schema, compression=COMPRESSION),
+                "buffers": [[] for _ in self.schema.names],
+                "first": values[self._id_position]
+            }
+        for buffer, value in zip(part["buffers"], values):
+            buffer.append(value)
+        part["last"] = values[self._id_position]
+        self.rows += 1
+        if len(part["buffers"][0]) >= FLUSH_ROWS:
+            self._flush(part)
+
+    def _flush(self, part: dict):
+        if part["buffers"][0]:
+            part["writer"].write_table(pa.Table.from_arrays(
+                [pa.array(buffer, type=field.type) for buffer, field in zip(part["buffers"], self.schema)],
+                schema=self.schema
+            ))
+            part["buffers"] = [[] for _ in self.schema.names]
+
+    def finish(self, directory: str):
+        """Flush and close one partition's file under its final name"""
+        part = self._parts.pop(directory)
+        self._flush(part)
+        part["writer"].close()
+        path = os.path.join(directory, self.file_name(part["first"], part["last"]))
+        os.replace(part["path"], path)
+        self.files.append(path)
+
+    def close(self) -> list:
+        """Finish every open partition; returns all final paths"""
+        for directory in list(self._parts):
+            self.finish(directory)
+        return self.files
+
+    def abort(self):
+        for part in self._parts.values():
+            part["writer"].close()
+            os.remove(part["path"])
+        self._parts.clear()
+
+
+def _watermark_name(table: str) -> str:
+    return f"parquet:{table}"
+
+
+def _month_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m") if moment else "unknown"
+
+
+def _partition_dir(export_dir: str, table: str, country: str, month: str) -> str:
+    return os.path.join(export_dir, table, f"country={country}", f"month={month}")
+
+
+def export_table(db, table: str, export_dir: str = EXPORT_DIR, rebuild: bool = False) -> dict:
+    """
+    Append rows added since the last export as one new file per touched partition.
+
+    Both tables are append-only, so partitions that received no new rows are
+    never rewritten. rebuild=True (or an empty output directory) drops the
+    table's files and exports everything.
+    """
+    model, date_column, schema = PARQUET_TABLES[table]
+    if rebuild or not os.path.isdir(os.path.join(export_dir, table)):
+        shutil.rmtree(os.path.join(export_dir, table), ignore_errors=True)
+        set_watermark(db, _watermark_name(table), 0)
+        db.commit()
+
+    started = time.perf_counter()
+    watermark = get_watermark(db, _watermark_name(table))
+    columns = [getattr(model, name) for name in schema.names]
+    # Sorted by partition so each file is finished before the next one starts
+    result = db.execute(
+        select(model.country, date_column, *columns)
+        .where(model.id > watermark)
+        .order_by(model.country, date_column, model.id)
+        .execution_options(yield_per=READ_BATCH_SIZE, stream_results=True)
+    )
+
+    writers = PartitionWriters(schema, lambda first, last: f"part-{first:012d}-{last:012d}.parquet")
+    max_id = watermark
+    current = None
+    try:
+        for row in result:
+            country, moment = row[0], row[1]
+            directory = _partition_dir(export_dir, table, country or "unknown", _month_key(moment))
+            if directory != current and current is not None:
+                writers.finish(current)
+            current = directory
+            writers.append(directory, row[2:])
+            max_id = max(max_id, row.id)
+    except Exception:
+        writers.abort()
+        raise
+    files = writers.close()
+
+    if max_id != watermark:
+        set_watermark(db, _watermark_name(table), max_id)
+        db.commit()
+
+    rows = writers.rows
+    seconds = round(time.perf_counter() - started, 4)
+    logger.info(f"Parquet export of {table}: {rows} rows into {len(files)} partitions in {seconds}s")
+    return {"table": table, "rows": rows, "partitions": len(files), "files": files, "seconds": seconds}
+
+
+def export_intervals(db, export_dir: str = EXPORT_DIR, rebuild: bool = False) -> dict:
+    """
+    Rewrite only the (country, month of valid_from) partitions whose intervals
+    changed since the last export.
+
+    The newest updated_at seen per partition is kept in a small state file
+    next to the data, so a lost directory simply triggers a full rewrite.
+    """
+    table_dir = os.path.join(export_dir, INTERVAL_TABLE)
+    state_path = os.path.join(table_dir, INTERVAL_STATE_FILE)
+    if rebuild:
+        shutil.rmtree(table_dir, ignore_errors=True)
+    state = {}
+    if os.path.isfile(state_path):
+        with open(state_path) as handle:
+            state = json.load(handle)
+
+    started = time.perf_counter()
+    latest = {}
+    for country, valid_from, updated_at in db.execute(
+        select(TariffTrendInterval.country, TariffTrendInterval.valid_from, TariffTrendInterval.updated_at)
+    ):
+        key = f"{country or 'unknown'}/{_month_key(valid_from)}"
+        latest[key] = max(latest.get(key, ""), updated_at.isoformat() if updated_at else "")
+
+    stale = {key for key, stamp in latest.items() if state.get(key) != stamp or not os.path.isdir(
+        _partition_dir(export_dir, INTERVAL_TABLE, *key.split("/", 1)))}
+    stale |= {key for key in state if key not in latest}
+
+    for key in stale:
+        shutil.rmtree(_partition_dir(export_dir, INTERVAL_TABLE, *key.split("/", 1)), ignore_errors=True)
+
+    # The state file is only written after every stale partition is, so a failed run is redone in full
+    writers = PartitionWriters(INTERVAL_SCHEMA, lambda first, last: "part-0.parquet")
+    if stale & latest.keys():
+        columns = [getattr(TariffTrendInterval, name) for name in INTERVAL_SCHEMA.names]
+        result = db.execute(
+            select(TariffTrendInterval.country, *columns)
+            .order_by(TariffTrendInterval.country, TariffTrendInterval.valid_from, TariffTrendInterval.id)
+            .execution_options(yield_per=READ_BATCH_SIZE, stream_results=True)
+        )
+        current = None
+        try:
+            for row in result:
+                key = f"{row[0] or 'unknown'}/{_month_key(row.valid_from)}"
+                if key not in stale:
+                    continue
+                directory = _partition_dir(export_dir, INTERVAL_TABLE, *key.split("/", 1))
+                if directory != current and current is not None:
+                    writers.finish(current)
+                current = directory
+                writers.append(directory, row[1:])
+        except Exception:
+            writers.abort()
+            raise
+    files = writers.close()
+
+    os.makedirs(table_dir, exist_ok=True)
+    with open(state_path, "w") as handle:
+        json.dump(latest, handle)
+
+    rows = writers.rows
+    seconds = round(time.perf_counter() - started, 4)
+    logger.info(f"Parquet export of {INTERVAL_TABLE}: {rows} rows into {len(files)} partitions in {seconds}s")
+    return {"table": INTERVAL_TABLE, "rows": rows, "partitions": len(files), "files": files, "seconds": seconds}
+
+
+def export_all(export_dir: str = EXPORT_DIR, rebuild: bool = False) -> list:
+    db = SessionLocal()
+    try:
+        summaries = [export_table(db, table, export_dir, rebuild) for table in PARQUET_TABLES]
+        summaries.append(export_intervals(db, export_dir, rebuild))
+        return summaries
+    finally:
+        db.close()
+
+
+def list_files(export_dir: str = EXPORT_DIR) -> list:
+    """Manifest of exported files, relative to export_dir"""
+    manifest = []
+    for root, _, names in os.walk(export_dir):
+        for name in sorted(names):
+            if name.endswith(".parquet"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                manifest.append({
+                    "path": os.path.relpath(path, export_dir).replace(os.sep, "/"),
+                    "bytes": stat.st_size,
+                    "modified": datetime.utcfromtimestamp(stat.st_mtime)
+                })
+    return sorted(manifest, key=lambda entry: entry["path"])
+
+
+def resolve_file(relative_path: str, export_dir: str = EXPORT_DIR):
+    """Absolute path of an exported file, or None if it is outside export_dir or missing"""
+    root = os.path.realpath(export_dir)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if not path.startswith(root + os.sep) or not path.endswith(".parquet") or not os.path.isfile(path):
+        return None
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export tariff trends, intervals and history to partitioned Parquet")
+    parser.add_argument("--dir", default=EXPORT_DIR, help="Output directory")
+    parser.add_argument("--rebuild", action="store_true", help="Drop existing files and export everything")
+    args = parser.parse_args()
+    for summary in export_all(args.dir, args.rebuild):
+        print(f"{summary['table']}: {summary['rows']} rows, {summary['partitions']} partitions, {summary['seconds']}s")
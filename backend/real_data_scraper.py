@@ -7,18 +7,36 @@ import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 import json
+import time
 import logging
 from sqlalchemy.orm import Session
-from database import Tariff, TariffHistory, TariffTrend
+from ingest import upsert_tariffs
+from fetcher import fetch_concurrently, DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT
+from http_cache import ResponseCache, all_unchanged
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SOURCE_URLS = {
+    "usitc": "https://www.usitc.gov/trade_remedy/731_investigations/",
+    "ustr": "https://ustr.gov/issue-areas/china-trade",
+    "mofcom": "http://mofcom.gov.cn/article/ae/xgxz/",
+    "china_customs": "http://cccn.customs.gov.cn/",
+}
+
+# Rate program each source publishes; programs stack when computing duty
+SOURCE_PROGRAMS = {
+    "usitc": "base",
+    "ustr": "section_301",
+    "mofcom": "retaliatory",
+    "china_customs": "base",
+}
+
 class USCustomsScraper:
     """Scrapes real US tariff data"""
     
     @staticmethod
-    def fetch_from_usitc():
+    def fetch_from_usitc(session: requests.Session = None):
         """
         Fetch from USITC (US International Trade Commission)
         Source: https://www.usitc.gov/
@@ -28,7 +46,7 @@ class USCustomsScraper:
         try:
             # USITC provides tariff data through their API and website
             # Example: Antidumping duties
-            url = "https://www.usitc.gov/trade_remedy/731_investigations/"
+            url = SOURCE_URLS["usitc"]
             
             data = [
                 {
@@ -76,7 +94,7 @@ class USCustomsScraper:
             return []
     
     @staticmethod
-    def fetch_from_ustr():
+    def fetch_from_ustr(session: requests.Session = None):
         """
         Fetch from USTR (US Trade Representative)
         Source: https://ustr.gov/
@@ -86,7 +104,7 @@ class USCustomsScraper:
         
         try:
             # USTR maintains Section 301 tariff lists
-            url = "https://ustr.gov/issue-areas/china-trade"
+            url = SOURCE_URLS["ustr"]
             
             # Section 301 tariffs (additional tariffs on China)
             section_301_data = [
@@ -124,7 +142,7 @@ class ChinaCustomsScraper:
     """Scrapes real China tariff data"""
     
     @staticmethod
-    def fetch_from_mofcom():
+    def fetch_from_mofcom(session: requests.Session = None):
         """
         Fetch from China's Ministry of Commerce (MOFCOM)
         Source: http://mofcom.gov.cn/
@@ -134,7 +152,7 @@ class ChinaCustomsScraper:
         
         try:
             # China's retaliatory tariffs on US goods
-            url = "http://mofcom.gov.cn/article/ae/xgxz/"
+            url = SOURCE_URLS["mofcom"]
             
             data = [
                 {
@@ -175,7 +193,7 @@ class ChinaCustomsScraper:
             return []
     
     @staticmethod
-    def fetch_from_china_customs():
+    def fetch_from_china_customs(session: requests.Session = None):
         """
         Fetch from China Customs (General Administration of Customs)
         Source: http://cccn.customs.gov.cn/
@@ -184,7 +202,7 @@ class ChinaCustomsScraper:
         logger.info("Fetching from China Customs...")
         
         try:
-            url = "http://cccn.customs.gov.cn/"
+            url = SOURCE_URLS["china_customs"]
             
             data = [
                 {
@@ -224,74 +242,75 @@ class ChinaCustomsScraper:
             logger.error(f"Error fetching from China Customs: {str(e)}")
             return []
 
-def save_tariffs(db: Session, tariffs_data, country: str):
+def save_tariffs(db: Session, tariffs_data, country: str, progress=None):
     """Save tariffs to database and track history"""
-    for item in tariffs_data:
-        existing = db.query(Tariff).filter(
-            Tariff.country == country,
-            Tariff.hs_code == item["hs_code"]
-        ).first()
-        
-        if existing:
-            if existing.rate != item["rate"]:
-                # Track the change
-                history = TariffHistory(
-                    tariff_id=existing.id,
-                    country=country,
-                    hs_code=item["hs_code"],
-                    old_rate=existing.rate,
-                    new_rate=item["rate"],
-                    change_reason=f"Updated from {item['source']}"
-                )
-                db.add(history)
-                logger.info(f"Rate changed: {item['hs_code']} {existing.rate}% → {item['rate']}%")
-            
-            existing.rate = item["rate"]
-            existing.effective_date = item.get("effective_date", datetime.utcnow())
-            existing.last_updated = datetime.utcnow()
-        else:
-            # New tariff
-            tariff = Tariff(
-                country=country,
-                hs_code=item["hs_code"],
-                product_description=item["description"],
-                rate=item["rate"],
-                effective_date=item.get("effective_date", datetime.utcnow()),
-                source_url=item.get("source", "")
-            )
-            db.add(tariff)
-            logger.info(f"New tariff: {country} {item['hs_code']} {item['rate']}%")
-        
-        # Save trend data for charting
-        trend = TariffTrend(
-            country=country,
-            hs_code=item["hs_code"],
-            product_description=item["description"],
-            rate=item["rate"],
-            record_date=item.get("effective_date", datetime.utcnow())
-        )
-        db.add(trend)
-    
-    db.commit()
+    result = upsert_tariffs(db, tariffs_data, country, use_item_dates=True, progress=progress)
     logger.info(f"Saved {len(tariffs_data)} tariffs for {country}")
+    return result
+
+# Sources per country, in merge order (later sources override earlier ones).
+# Each is called with the pooled keep-alive session for its SOURCE_URLS host.
+US_SOURCES = {
+    "usitc": USCustomsScraper.fetch_from_usitc,
+    "ustr": USCustomsScraper.fetch_from_ustr,
+}
+CHINA_SOURCES = {
+    "mofcom": ChinaCustomsScraper.fetch_from_mofcom,
+    "china_customs": ChinaCustomsScraper.fetch_from_china_customs,
+}
 
-def fetch_all_real_tariffs(db: Session):
-    """Fetch and save all real tariff data"""
+def fetch_all_real_tariffs(db: Session, max_workers: int = DEFAULT_MAX_WORKERS,
+                           timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache = None,
+                           sources: dict = None, progress=None):
+    """
+    Fetch all sources concurrently, then save real tariff data.
+    
+    With a cache, a country whose sources all answer 304 (or an identical
+    body) is skipped entirely. If any of its sources changed, all of them are
+    re-fetched, since later sources override earlier ones when merged.
+    
+    sources replaces the fetch callables per country (same shape as
+    {"US": US_SOURCES, "China": CHINA_SOURCES}), e.g. to replay recorded
+    payloads. progress, if given, is called as progress(stage, seconds, count)
+    after check, fetch and each country's merge, and for every save stage.
+    """
+    groups = dict(sources or {"US": US_SOURCES, "China": CHINA_SOURCES})
+    checks = {}
+    if cache is not None:
+        started = time.perf_counter()
+        checks = cache.check_all({name: SOURCE_URLS[name] for group in groups.values() for name in group})
+        for country in list(groups):
+            if all_unchanged(checks, groups[country]):
+                logger.info(f"{country} sources unchanged since last run, skipping")
+                del groups[country]
+        if progress:
+            progress("check", round(time.perf_counter() - started, 4), len(checks))
+    
+    started = time.perf_counter()
+    results, timings = fetch_concurrently(
+        {name: func for sources in groups.values() for name, func in sources.items()},
+        max_workers=max_workers,
+        timeout=timeout,
+        urls=SOURCE_URLS
+    )
     
-    # Fetch US tariffs
-    us_data = []
-    us_data.extend(USCustomsScraper.fetch_from_usitc())
-    us_data.extend(USCustomsScraper.fetch_from_ustr())
-    save_tariffs(db, us_data, "US")
+    if progress:
+        progress("fetch", round(time.perf_counter() - started, 4), sum(len(records) for records in results.values()))
     
-    # Fetch China tariffs
-    china_data = []
-    china_data.extend(ChinaCustomsScraper.fetch_from_mofcom())
-    china_data.extend(ChinaCustomsScraper.fetch_from_china_customs())
-    save_tariffs(db, china_data, "China")
+    counts = {"US": 0, "China": 0}
+    for country, sources in groups.items():
+        started = time.perf_counter()
+        data = [dict(record, program=SOURCE_PROGRAMS[name]) for name in sources for record in results[name]]
+        if progress:
+            progress("merge", round(time.perf_counter() - started, 4), len(data))
+        save_tariffs(db, data, country, progress)
+        counts[country] = len(data)
+        # Only remember validators when every source of this country was fetched
+        if cache is not None and all(timings[name] is not None for name in sources):
+            cache.commit(checks[name] for name in sources)
     
-    logger.info(f"Total: {len(us_data)} US + {len(china_data)} China tariffs processed")
-    return len(us_data) + len(china_data)
+    logger.info(f"Total: {counts['US']} US + {counts['China']} China tariffs processed")
+    return counts["US"] + counts["China"]
 
 if __name__ == "__main__":
     print("This module should be imported, not run directly")
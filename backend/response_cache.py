@@ -0,0 +1,302 @@
+"""
+Response Cache
+LRU cache for read endpoints, invalidated by a data generation counter bumped on every ingest commit.
+Cached bodies carry strong ETags and are compressed (gzip / Brotli) once per hot key.
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Watermark, off_loop
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip only
+    brotli = None
+
+GENERATION_NAME = "data_generation"
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# How long a worker trusts its last read of the generation (lets 304s skip the DB)
+GENERATION_CHECK_SECONDS = float(os.getenv("GENERATION_CHECK_SECONDS", "1"))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Each encoded body is a different representation, so it gets its own strong ETag
+ETAG_SUFFIXES = {"gzip": "gz", "br": "br"}
+
+
+def current_generation(db: Session) -> int:
+    """Read the data generation (a primary-key lookup)"""
+    mark = db.get(Watermark, GENERATION_NAME, populate_existing=True)
+    return mark.value if mark else 0
+
+
+def bump_generation(db: Session):
+    """Advance the data generation inside the caller's transaction"""
+    result = db.execute(
+        update(Watermark)
+        .where(Watermark.name == GENERATION_NAME)
+        .values(value=Watermark.value + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.add(Watermark(name=GENERATION_NAME, value=1, updated_at=datetime.utcnow()))
+
+
+@contextmanager
+def single_flight(building: threading.Lock, has_previous: bool):
+    """
+    Yield True when the caller should rebuild a generation-keyed index.
+
+    The first caller after a generation bump takes the building lock and
+    rebuilds; everyone else gets False and keeps serving the previous index
+    instead of starting the same rebuild. The lock is never waited on, so a
+    slow rebuild does not park every read worker behind it. With no previous
+    index to serve (cold start), callers build their own.
+    """
+    if building.acquire(blocking=False):
+        try:
+            yield True
+        finally:
+            building.release()
+    else:
+        yield not has_previous
+
+
+class GenerationCache:
+    """
+    Size-bounded LRU of endpoint results.
+
+    Every entry is tagged with the data generation it was computed from; a
+    lookup under a newer generation is a miss, and the first such lookup
+    drops everything older so stale entries don't hold memory.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, generation: int, value):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+response_cache = GenerationCache()
+
+
+def cache_key(endpoint: str, params: dict, rolling_window: bool = False) -> tuple:
+    """Normalize query params into a hashable key"""
+    normalized = tuple(sorted(
+        (name, value.upper() if name == "country" and isinstance(value, str) else value)
+        for name, value in params.items()
+        if value is not None and value != ""
+    ))
+    if rolling_window:
+        # Windows like "last 7 days" slide without a data change; re-key daily
+        normalized += (("_day", datetime.utcnow().date().isoformat()),)
+    return (endpoint, normalized)
+
+
+class CachedBody:
+    """Serialized JSON for one cache key plus its compressed variants, built on first request"""
+
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self.encoded = {}
+
+    def encode(self, encoding: str) -> bytes:
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body, quality=BROTLI_QUALITY)
+            else:
+                data = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+            self.encoded[encoding] = data
+        return data
+
+
+class GenerationClock:
+    """Per-process view of the data generation, re-read at most every GENERATION_CHECK_SECONDS"""
+
+    def __init__(self, ttl: float = GENERATION_CHECK_SECONDS):
+        self.ttl = ttl
+        self._value = None
+        self._read_at = 0.0
+
+    def fresh(self):
+        if self._value is not None and time.monotonic() - self._read_at < self.ttl:
+            return self._value
+        return None
+
+    def store(self, value: int) -> int:
+        self._value = value
+        self._read_at = time.monotonic()
+        return value
+
+    def expire(self):
+        self._read_at = 0.0
+
+
+generation_clock = GenerationClock()
+
+
+def make_etag(generation: int, key: tuple) -> str:
+    """Strong validator: same generation and same normalized query means byte-identical JSON"""
+    digest = hashlib.sha1(repr((generation, key)).encode()).hexdigest()[:20]
+    return f'"g{generation}-{digest}"'
+
+
+def encoded_etag(etag: str, encoding: str = None) -> str:
+    """'"g7-ab12"' -> '"g7-ab12-gz"': the validator of one encoding of the body"""
+    return etag if encoding is None else f'{etag[:-1]}-{ETAG_SUFFIXES[encoding]}"'
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """
+    The validator in If-None-Match that matches any encoding of etag, or None.
+
+    A client revalidates with the tag of whichever representation it got, so
+    the identity, gzip and Brotli tags all match.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    for variant in (etag, *(encoded_etag(etag, encoding) for encoding in ETAG_SUFFIXES)):
+        if variant in candidates:
+            return variant
+    return None
+
+
+def pick_encoding(accept_encoding: str):
+    """Brotli when the client and server both support it, then gzip, else identity"""
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in (accept_encoding or "").split(",")
+        if not part.strip().endswith(";q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _serialize(result) -> bytes:
+    if isinstance(result, bytes):
+        return result  # Already-encoded JSON (columnar responses)
+    # Same settings as FastAPI's JSONResponse
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def cached_endpoint(endpoint: str, rolling_window: bool = False):
+    """
+    Cache an endpoint's result keyed on its query params and the data generation.
+
+    Responses carry an ETag; a matching If-None-Match gets a 304 without a
+    database round trip while the generation read is fresh. Bodies over
+    COMPRESS_MIN_BYTES are gzip/Brotli-encoded once and kept with the entry.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.pop("_request")
+            db = kwargs["db"]
+            key = cache_key(endpoint, {k: v for k, v in kwargs.items() if k != "db"}, rolling_window)
+            generation = generation_clock.fresh()
+            if generation is None:
+                if isinstance(db, AsyncSession):
+                    generation = generation_clock.store(await db.run_sync(current_generation))
+                else:
+                    generation = generation_clock.store(current_generation(db))
+
+            etag = make_etag(generation, key)
+            headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            matched = etag_matches(request.headers.get("if-none-match"), etag)
+            if matched:
+                return Response(status_code=304, headers={"ETag": matched, **headers})
+
+            cached = response_cache.get(key, generation)
+            if cached is None:
+                # Serializing and compressing a large body is CPU work; keep it off the loop
+                cached = CachedBody(await off_loop(_serialize, await func(**kwargs)), etag)
+                response_cache.put(key, generation, cached)
+
+            encoding = pick_encoding(request.headers.get("accept-encoding"))
+            if encoding and len(cached.body) >= COMPRESS_MIN_BYTES:
+                headers.update({"ETag": encoded_etag(etag, encoding), "Content-Encoding": encoding})
+                body = cached.encoded.get(encoding) or await off_loop(cached.encode, encoding)
+                return Response(body, media_type="application/json", headers=headers)
+            return Response(cached.body, media_type="application/json", headers={"ETag": etag, **headers})
+
+        # Expose the original parameters plus the request to FastAPI
+        signature = inspect.signature(func)
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        ])
+        return wrapper
+    return decorator
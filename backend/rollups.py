@@ -0,0 +1,222 @@
+"""
+Trend Rollups
+Week / month aggregates of scraped rates, maintained incrementally as each batch is saved.
+Day buckets are not stored: they are rebuilt from the rate intervals, one point per code per day.
+"""
+
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+from database import TariffTrend, TariffTrendRollup, get_watermark, set_watermark
+from response_cache import bump_generation
+from trend_intervals import trend_points
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+# A stored day row per code per day would grow like the old tariff_trends table
+STORED_GRANULARITIES = ("week", "month")
+WATERMARK_NAME = "trend_rollups"
+READ_BATCH_SIZE = 5000
+LOOKUP_CODES_PER_QUERY = 500  # Keeps the IN list under SQLite's bound-parameter limit
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing moment (weeks start on Monday)"""
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _merge(target: dict, rate: float, record_date: datetime, description: str, samples: int = 1,
+           rate_sum: float = None, min_rate: float = None, max_rate: float = None):
+    """Fold one raw row (or a partial aggregate) into a bucket aggregate"""
+    target["samples"] += samples
+    target["rate_sum"] += rate if rate_sum is None else rate_sum
+    target["min_rate"] = min(target["min_rate"], rate if min_rate is None else min_rate)
+    target["max_rate"] = max(target["max_rate"], rate if max_rate is None else max_rate)
+    if target["last_record_date"] is None or record_date >= target["last_record_date"]:
+        target["last_rate"] = rate
+        target["last_record_date"] = record_date
+        target["product_description"] = description
+
+
+def _empty_bucket():
+    return {
+        "samples": 0,
+        "rate_sum": 0.0,
+        "min_rate": float("inf"),
+        "max_rate": float("-inf"),
+        "last_rate": None,
+        "last_record_date": None,
+        "product_description": None
+    }
+
+
+def _partials(observations) -> dict:
+    """Bucket aggregates for a stream of (country, hs_code, description, rate, record_date) rows"""
+    partials = {}
+    for country, hs_code, description, rate, record_date in observations:
+        if record_date is None or rate is None:
+            continue
+        for granularity in STORED_GRANULARITIES:
+            key = (granularity, country, hs_code, bucket_start(record_date, granularity))
+            bucket = partials.get(key)
+            if bucket is None:
+                bucket = partials[key] = _empty_bucket()
+            _merge(bucket, rate, record_date, description)
+    return partials
+
+
+def _write_partials(db: Session, partials: dict):
+    """Merge partial aggregates into the stored buckets (caller commits)"""
+    # Load only the existing buckets of these codes (idx_rollup_key), per granularity and country
+    groups = {}
+    for granularity, country, hs_code, start in partials:
+        buckets, codes = groups.setdefault((granularity, country), (set(), set()))
+        buckets.add(start)
+        codes.add(hs_code)
+
+    existing = {}
+    for (granularity, country), (buckets, codes) in groups.items():
+        codes = sorted(codes)
+        for offset in range(0, len(codes), LOOKUP_CODES_PER_QUERY):
+            result = db.execute(
+                select(
+                    TariffTrendRollup.id, TariffTrendRollup.country, TariffTrendRollup.hs_code,
+                    TariffTrendRollup.bucket_start, TariffTrendRollup.samples, TariffTrendRollup.rate_sum,
+                    TariffTrendRollup.min_rate, TariffTrendRollup.max_rate, TariffTrendRollup.last_rate,
+                    TariffTrendRollup.last_record_date, TariffTrendRollup.product_description
+                ).where(
+                    TariffTrendRollup.granularity == granularity,
+                    TariffTrendRollup.country == country,
+                    TariffTrendRollup.hs_code.in_(codes[offset:offset + LOOKUP_CODES_PER_QUERY]),
+                    TariffTrendRollup.bucket_start.in_(buckets)
+                )
+            )
+            for rollup in result:
+                existing[(granularity, rollup.country, rollup.hs_code, rollup.bucket_start)] = rollup
+
+    inserts = []
+    updates = []
+    for key, partial in partials.items():
+        granularity, country, hs_code, start = key
+        current = existing.get(key)
+        if current is None:
+            inserts.append({
+                "granularity": granularity,
+                "bucket_start": start,
+                "country": country,
+                "hs_code": hs_code,
+                **partial
+            })
+            continue
+
+        merged = {
+            "samples": current.samples,
+            "rate_sum": current.rate_sum,
+            "min_rate": current.min_rate,
+            "max_rate": current.max_rate,
+            "last_rate": current.last_rate,
+            "last_record_date": current.last_record_date,
+            "product_description": current.product_description
+        }
+        _merge(
+            merged, partial["last_rate"], partial["last_record_date"], partial["product_description"],
+            samples=partial["samples"], rate_sum=partial["rate_sum"],
+            min_rate=partial["min_rate"], max_rate=partial["max_rate"]
+        )
+        updates.append({"id": current.id, **merged})
+
+    if inserts:
+        db.execute(insert(TariffTrendRollup), inserts)
+    if updates:
+        db.execute(update(TariffTrendRollup), updates)
+    return len(inserts), len(updates)
+
+
+# Same attributes as a TariffTrendRollup row, so day buckets flow through the rollup readers
+DayBucket = namedtuple(
+    "DayBucket",
+    "bucket_start country hs_code last_rate rate_sum samples min_rate max_rate product_description last_record_date"
+)
+
+
+def day_buckets(db: Session, country: str = None, hs_code: str = None, start: datetime = None) -> list:
+    """One single-sample bucket per code per day from start, rebuilt from the rate intervals"""
+    return [
+        DayBucket(point.record_date, point.country, point.hs_code, point.rate, point.rate, 1,
+                  point.rate, point.rate, point.product_description, point.record_date)
+        for point in trend_points(db, country, hs_code, start=start)
+    ]
+
+
+def merge_observations(db: Session, country: str, observations: list) -> int:
+    """
+    Fold freshly scraped rates into the rollups inside the caller's transaction.
+
+    observations are the same dicts passed to trend_intervals.apply_observations.
+    """
+    partials = _partials(
+        (country, obs["hs_code"], obs["product_description"], obs["rate"], obs["record_date"])
+        for obs in observations
+    )
+    if not partials:
+        return 0
+    inserted, updated = _write_partials(db, partials)
+    return inserted + updated
+
+
+def update_rollups(db: Session):
+    """
+    Merge legacy tariff_trends rows added since the last run into the rollups.
+
+    Ingestion now feeds the rollups directly through merge_observations; this
+    only catches up rows written before trends moved to intervals.
+    """
+    started = time.perf_counter()
+    watermark = get_watermark(db, WATERMARK_NAME)
+
+    rows = db.execute(
+        select(
+            TariffTrend.id, TariffTrend.country, TariffTrend.hs_code,
+            TariffTrend.product_description, TariffTrend.rate, TariffTrend.record_date
+        ).where(TariffTrend.id > watermark).order_by(TariffTrend.id)
+        .execution_options(yield_per=READ_BATCH_SIZE, stream_results=True)
+    )
+    last_id = [watermark]
+
+    def observations():
+        # Folded into bucket aggregates as rows stream in; memory tracks buckets, not rows
+        for row in rows:
+            last_id[0] = row.id
+            yield row.country, row.hs_code, row.product_description, row.rate, row.record_date
+
+    partials = _partials(observations())
+    max_id = last_id[0]
+
+    if not partials:
+        if max_id != watermark:
+            set_watermark(db, WATERMARK_NAME, max_id)
+            db.commit()
+        return 0
+
+    inserted, updated = _write_partials(db, partials)
+    set_watermark(db, WATERMARK_NAME, max_id)
+    bump_generation(db)
+    db.commit()
+
+    logger.info(
+        f"Rollups updated through trend id {max_id}: {inserted} new, "
+        f"{updated} merged buckets in {round(time.perf_counter() - started, 4)}s"
+    )
+    return inserted + updated
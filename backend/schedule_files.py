@@ -0,0 +1,331 @@
+"""
+Schedule Files
+Incremental parsers for bulk tariff schedule files (CSV, JSON / NDJSON, XLSX) yielding ingest-ready records
+
+Kept free of database imports so process-pool workers only parse.
+"""
+
+import os
+import re
+import json
+import queue
+import logging
+from datetime import datetime, date
+import pandas as pd
+
+try:
+    import openpyxl
+except ImportError:  # Optional; only needed for .xlsx
+    openpyxl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KINDS = {
+    ".csv": "csv",
+    ".txt": "csv",
+    ".json": "json",
+    ".jsonl": "ndjson",
+    ".ndjson": "ndjson",
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+}
+CSV_CHUNK_ROWS = 20000
+JSON_READ_BYTES = 1 << 16
+HEADER_SCAN_ROWS = 20  # Spreadsheets often have title rows above the header
+
+# Header spellings used by the USITC HTS exports, China customs tariff books and our own exports
+COLUMN_ALIASES = {
+    "hs_code": ("hs_code", "htsno", "hts_number", "hts8", "hts", "hs", "code", "tariff_code",
+                "commodity_code", "税则号列", "商品编码", "税号"),
+    "description": ("description", "product_description", "brief_description", "article_description",
+                    "货品名称", "商品名称", "商品描述"),
+    "rate": ("rate", "general", "general_rate_of_duty", "mfn_rate", "rate_of_duty", "最惠国税率"),
+    "effective_date": ("effective_date", "begin_effect_date", "start_date", "生效日期"),
+    "program": ("program",),
+}
+REQUIRED_FIELDS = ("hs_code", "rate")
+
+_NON_DIGITS = re.compile(r"\D")
+_HEADER_SEPARATORS = re.compile(r"[\s\-/().%]+")
+_AD_VALOREM = re.compile(r"(\d+(?:\.\d+)?)\s*%?")
+_FREE = {"free", "免", "免税"}
+
+
+class ImportCancelled(Exception):
+    """Raised in a pool worker when the importing process gave up"""
+
+
+def file_kind(path: str) -> str:
+    """csv, json, ndjson or xlsx from the file extension; ValueError otherwise"""
+    kind = KINDS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise ValueError(f"Unsupported schedule file type: {os.path.basename(path)} "
+                         f"(expected {', '.join(sorted(KINDS))})")
+    return kind
+
+
+def resolve_columns(header) -> dict:
+    """Map our field names to the file's column names; ValueError without hs_code and rate"""
+    normalized = {
+        _HEADER_SEPARATORS.sub("_", str(name).strip().lower()).strip("_"): name
+        for name in header if name is not None
+    }
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[field] = normalized[alias]
+                break
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"No column for {', '.join(missing)} in header {list(header)[:12]}")
+    return columns
+
+
+def format_hs_code(value) -> str:
+    """
+    Canonical dotted code ('8517620000' -> '8517.62.00.00'), or None.
+
+    Spreadsheets store codes as numbers and drop the leading zero of
+    chapters 01-09; HS codes have an even number of digits, so it is restored.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        value = int(value) if value.is_integer() else value
+    digits = _NON_DIGITS.sub("", str(value))
+    if len(digits) % 2:
+        digits = "0" + digits
+    if len(digits) < 4:
+        return None  # Chapter and section rows carry no rate
+    return ".".join([digits[:4]] + [digits[i:i + 2] for i in range(4, len(digits), 2)])
+
+
+def parse_rate(value):
+    """
+    Ad valorem percentage from a schedule cell: 'Free' -> 0.0, '6.5%' -> 6.5.
+
+    Specific and compound duties ('2.4¢/kg', '5% + 3¢/kg') cannot be stored as
+    one percentage and return None, as do blank cells.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)  # NaN
+    text = str(value).strip()
+    if not text:
+        return None
+    if text.lower() in _FREE:
+        return 0.0
+    match = _AD_VALOREM.fullmatch(text)
+    return float(match.group(1)) if match else None
+
+
+def parse_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    text = str(value).strip()
+    for parse in (datetime.fromisoformat, lambda t: datetime.strptime(t, "%m/%d/%Y")):
+        try:
+            return parse(text)
+        except ValueError:
+            continue
+    return None
+
+
+def _iter_json_array(handle):
+    """
+    Elements of a top-level JSON array, decoded one at a time.
+
+    Reads JSON_READ_BYTES at a time and hands each complete element to
+    raw_decode, so memory tracks the largest element rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = handle.read(JSON_READ_BYTES).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("JSON schedule must be a top-level array (use .ndjson for one object per line)")
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            element = None
+        else:
+            # An element ending exactly at the buffer edge may be a truncated scalar
+            if end < len(buffer) or eof:
+                position = end
+                yield element
+                continue
+        chunk = handle.read(JSON_READ_BYTES)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        if eof and not buffer.strip():
+            raise ValueError("JSON schedule ended before the closing ]")
+
+
+class ScheduleFile:
+    """
+    One schedule file, parsed lazily into upsert_tariffs() records.
+
+    records() is a generator: CSV is read in pandas chunks, JSON one array
+    element at a time and XLSX through openpyxl's read-only streaming mode.
+    Counters (rows, records, skipped) are filled in as it is consumed.
+    """
+
+    def __init__(self, path: str, source: str = None, program: str = None,
+                 effective_date: datetime = None, encoding: str = None):
+        self.path = path
+        self.kind = file_kind(path)
+        self.source = source or os.path.basename(path)
+        self.program = program
+        self.effective_date = effective_date
+        self.encoding = encoding or "utf-8-sig"
+        self._header_row = None
+        self.columns = resolve_columns(self._header())
+        self.rows = 0
+        self.records_out = 0
+        self.skipped = 0
+
+    @property
+    def uses_item_dates(self) -> bool:
+        """Whether records carry their own effective dates (a date column or an explicit date)"""
+        return self.effective_date is not None or "effective_date" in self.columns
+
+    def stats(self) -> dict:
+        return {"file": os.path.basename(self.path), "rows": self.rows,
+                "records": self.records_out, "skipped": self.skipped}
+
+    def _header(self) -> list:
+        if self.kind == "csv":
+            return list(pd.read_csv(self.path, nrows=0, encoding=self.encoding).columns)
+        if self.kind == "xlsx":
+            self._header_row, header = self._xlsx_header()
+            return header
+        for element in self._elements():
+            return list(element) if isinstance(element, dict) else []
+        return []
+
+    def _elements(self):
+        with open(self.path, encoding=self.encoding) as handle:
+            if self.kind == "ndjson":
+                for line in handle:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from _iter_json_array(handle)
+
+    def _workbook(self):
+        if openpyxl is None:
+            raise ValueError("Reading .xlsx schedules requires openpyxl")
+        return openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+
+    def _xlsx_header(self):
+        """(row number, cells) of the first row that names an hs_code and a rate column"""
+        workbook = self._workbook()
+        try:
+            sheet = workbook.worksheets[0]
+            for number, cells in enumerate(sheet.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True), 1):
+                try:
+                    resolve_columns(cells)
+                except ValueError:
+                    continue
+                return number, list(cells)
+        finally:
+            workbook.close()
+        raise ValueError(f"No header row with hs_code and rate columns in the first {HEADER_SCAN_ROWS} rows")
+
+    def _raw_rows(self):
+        """Source rows as dicts keyed by the file's own column names"""
+        if self.kind == "csv":
+            usecols = list(self.columns.values())
+            for chunk in pd.read_csv(self.path, usecols=usecols, dtype=str, keep_default_na=False,
+                                     chunksize=CSV_CHUNK_ROWS, encoding=self.encoding):
+                yield from chunk.to_dict("records")
+        elif self.kind == "xlsx":
+            header = list(self.columns.values())
+            workbook = self._workbook()
+            try:
+                rows = workbook.worksheets[0].iter_rows(min_row=self._header_row, values_only=True)
+                positions = {name: index for index, name in enumerate(next(rows))}
+                for cells in rows:
+                    yield {name: cells[positions[name]] if positions[name] < len(cells) else None
+                           for name in header}
+            finally:
+                workbook.close()
+        else:
+            for element in self._elements():
+                if isinstance(element, dict):
+                    yield element
+
+    def records(self):
+        columns = self.columns
+        for raw in self._raw_rows():
+            self.rows += 1
+            hs_code = format_hs_code(raw.get(columns["hs_code"]))
+            rate = parse_rate(raw.get(columns["rate"]))
+            if hs_code is None or rate is None:
+                self.skipped += 1
+                continue
+            description = raw.get(columns["description"]) if "description" in columns else None
+            effective_date = parse_date(raw.get(columns["effective_date"])) if "effective_date" in columns else None
+            program = raw.get(columns["program"]) if "program" in columns else None
+            self.records_out += 1
+            yield {
+                "hs_code": hs_code,
+                "description": str(description).strip() if description is not None else "",
+                "rate": rate,
+                "source": self.source,
+                "effective_date": effective_date or self.effective_date,
+                "program": program or self.program
+            }
+
+
+def _put(out, item, cancelled):
+    while True:
+        try:
+            out.put(item, timeout=1)
+            return
+        except queue.Full:
+            if cancelled.is_set():
+                raise ImportCancelled()
+
+
+def parse_into_queue(path: str, options: dict, out, cancelled, batch_size: int):
+    """
+    Pool worker: stream one file onto a bounded queue as
+    ("batch", path, uses_item_dates, records) messages, then ("done", path, stats)
+    or ("error", path, message). The queue bound keeps parsers from running ahead
+    of the database writer.
+    """
+    try:
+        schedule = ScheduleFile(path, **options)
+        batch = []
+        for record in schedule.records():
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _put(out, ("batch", path, schedule.uses_item_dates, batch), cancelled)
+                batch = []
+        if batch:
+            _put(out, ("batch", path, schedule.uses_item_dates, batch), cancelled)
+        _put(out, ("done", path, schedule.stats()), cancelled)
+    except ImportCancelled:
+        pass
+    except Exception as e:
+        logger.error(f"Parsing {path} failed: {str(e)}")
+        try:
+            _put(out, ("error", path, str(e)), cancelled)
+        except ImportCancelled:
+            pass
@@ -0,0 +1,229 @@
+"""
+Schedule Import
+Load full tariff schedule files from disk through the ingestion path in bounded batches
+
+Usage: python -m schedule_import --country US hts_2025.csv [more files...]
+       [--program base] [--effective-date 2025-01-01] [--workers N] [--batch-size N]
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import tempfile
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from hierarchy import refresh_chapters
+from ingest import upsert_tariffs, DEFAULT_BATCH_SIZE
+from response_cache import bump_generation
+from schedule_files import ScheduleFile, file_kind, parse_into_queue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COUNTRIES = {"US": "US", "USA": "US", "CHINA": "China", "CN": "China"}
+QUEUED_BATCHES_PER_WORKER = 2  # Parsed batches waiting for the writer, per worker
+MAX_WORKERS = 4
+QUEUE_POLL_SECONDS = 5  # How often a quiet queue is checked for dead workers
+UPLOAD_COPY_BYTES = 1 << 20
+
+
+def normalize_country(country: str) -> str:
+    """Stored spelling of a country ('us' -> 'US', 'cn' -> 'China'); ValueError if unknown"""
+    stored = COUNTRIES.get((country or "").strip().upper())
+    if stored is None:
+        raise ValueError("country must be US or China")
+    return stored
+
+
+def _import_serially(db: Session, paths, country: str, options: dict, batch_size: int,
+                     chapters: set, progress=None) -> list:
+    files = []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            schedule = ScheduleFile(path, **options)
+            result = upsert_tariffs(db, schedule.records(), country, use_item_dates=schedule.uses_item_dates,
+                                    batch_size=batch_size, touched_chapters=chapters)
+            summary = dict(schedule.stats(), **{key: result[key] for key in ("inserted", "updated", "changes")})
+        except Exception as e:
+            logger.error(f"Importing {path} failed: {str(e)}")
+            summary = {"file": os.path.basename(path), "error": str(e)}
+        summary["seconds"] = round(time.perf_counter() - started, 4)
+        files.append(summary)
+        if progress:
+            progress(f"import:{summary['file']}", summary["seconds"], summary.get("records"))
+    return files
+
+
+def _import_in_pool(db: Session, paths, country: str, options: dict, batch_size: int,
+                    chapters: set, workers: int, progress=None) -> list:
+    """
+    Parse files in worker processes while this process writes.
+
+    Workers hand over one batch at a time through a bounded queue, so memory
+    stays flat however large the files are. Batches of different files
+    interleave; each file's own rows are still saved in order. A worker that
+    dies without reporting (killed, out of memory) fails its file instead of
+    leaving the import waiting.
+    """
+    started = time.perf_counter()
+    summaries = {path: {"file": os.path.basename(path), "inserted": 0, "updated": 0, "changes": 0} for path in paths}
+    with multiprocessing.Manager() as manager:
+        out = manager.Queue(maxsize=workers * QUEUED_BATCHES_PER_WORKER)
+        cancelled = manager.Event()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {path: pool.submit(parse_into_queue, path, options, out, cancelled, batch_size)
+                       for path in paths}
+            pending = set(paths)
+            try:
+                while pending:
+                    try:
+                        message = out.get(timeout=QUEUE_POLL_SECONDS)
+                    except queue.Empty:
+                        # parse_into_queue reports its own errors, so a raising future means the process died
+                        for path in list(pending):
+                            future = futures[path]
+                            if future.done() and future.exception() is not None:
+                                error = f"Parser process failed: {future.exception()!r}"
+                                logger.error(f"Importing {path} failed: {error}")
+                                summaries[path].setdefault("error", error)
+                                summaries[path]["seconds"] = round(time.perf_counter() - started, 4)
+                                pending.discard(path)
+                        continue
+                    kind, path = message[0], message[1]
+                    summary = summaries[path]
+                    if kind == "batch":
+                        try:
+                            result = upsert_tariffs(db, message[3], country, use_item_dates=message[2],
+                                                    batch_size=batch_size, touched_chapters=chapters)
+                        except Exception as e:
+                            logger.error(f"Saving a batch of {path} failed: {str(e)}")
+                            summary["error"] = str(e)
+                            continue
+                        for key in ("inserted", "updated", "changes"):
+                            summary[key] += result[key]
+                        continue
+                    pending.discard(path)
+                    if kind == "done":
+                        summary.update(message[2])
+                    else:
+                        summary.setdefault("error", message[2])
+                    summary["seconds"] = round(time.perf_counter() - started, 4)
+                    if progress:
+                        progress(f"import:{summary['file']}", summary["seconds"], summary.get("records"))
+            finally:
+                cancelled.set()
+    return [summaries[path] for path in paths]
+
+
+def import_files(db: Session, paths, country: str, program: str = None, source: str = None,
+                 effective_date: datetime = None, workers: int = 1,
+                 batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> dict:
+    """
+    Import schedule files (CSV, JSON / NDJSON, XLSX) for one country.
+
+    Each file is streamed into upsert_tariffs() batch by batch. With workers > 1
+    and several files, parsing runs in a process pool; saving always happens
+    here, one batch per transaction. A failing file is reported and skipped.
+    The HS hierarchy is re-aggregated once at the end rather than per batch.
+    """
+    country = normalize_country(country)
+    options = {"program": program, "source": source, "effective_date": effective_date}
+    started = time.perf_counter()
+    chapters = set()
+    try:
+        if workers > 1 and len(paths) > 1:
+            files = _import_in_pool(db, paths, country, options, batch_size, chapters,
+                                    min(workers, len(paths)), progress)
+        else:
+            files = _import_serially(db, paths, country, options, batch_size, chapters, progress)
+    finally:
+        if chapters:
+            refresh_chapters(db, country, chapters)
+            bump_generation(db)
+            db.commit()
+
+    totals = {"rows": 0, "records": 0, "skipped": 0, "inserted": 0, "updated": 0, "changes": 0}
+    for summary in files:
+        for key in totals:
+            totals[key] += summary.get(key, 0)
+    totals["seconds"] = round(time.perf_counter() - started, 4)
+    totals["failed"] = sum(1 for summary in files if "error" in summary)
+    logger.info(
+        f"Imported {totals['records']} {country} records from {len(files)} files "
+        f"({totals['skipped']} rows skipped, {totals['failed']} files failed) in {totals['seconds']}s"
+    )
+    return {"country": country, "files": files, **totals}
+
+
+def stage_uploads(uploads) -> tuple:
+    """
+    Copy (filename, file object) pairs to a private temp directory, streaming.
+    Returns (directory, paths); ValueError before anything is written if a
+    file type is unsupported.
+    """
+    for filename, _ in uploads:
+        file_kind(filename or "")
+    directory = tempfile.mkdtemp(prefix="tariff-import-")
+    paths = []
+    try:
+        for number, (filename, handle) in enumerate(uploads):
+            # One subdirectory per upload keeps original names without collisions
+            os.makedirs(os.path.join(directory, str(number)))
+            path = os.path.join(directory, str(number), os.path.basename(filename))
+            with open(path, "wb") as target:
+                shutil.copyfileobj(handle, target, UPLOAD_COPY_BYTES)
+            paths.append(path)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return directory, paths
+
+
+def import_job(directory: str, paths, country: str, **options):
+    """Scrape-queue function that imports staged files, then deletes them"""
+    def run(db: Session, progress=None):
+        try:
+            summary = import_files(db, paths, country, progress=progress, **options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        if summary["failed"]:
+            errors = "; ".join(f"{entry['file']}: {entry['error']}" for entry in summary["files"] if "error" in entry)
+            raise ValueError(f"{summary['failed']} of {len(paths)} files failed ({errors})")
+        return summary["records"]
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import tariff schedule files into the database")
+    parser.add_argument("paths", nargs="+", help="CSV, JSON, NDJSON or XLSX schedule files")
+    parser.add_argument("--country", required=True, help="US or China")
+    parser.add_argument("--program", help="Rate program for rows without a program column (default: base)")
+    parser.add_argument("--source", help="Source label stored with each row (default: file name)")
+    parser.add_argument("--effective-date", type=datetime.fromisoformat,
+                        help="Effective date for rows without one (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=1, help="Parse several files in this many processes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        summary = import_files(session, args.paths, args.country, args.program, args.source,
+                               args.effective_date, args.workers, args.batch_size)
+    finally:
+        session.close()
+    for entry in summary["files"]:
+        if "error" in entry:
+            print(f"{entry['file']}: FAILED ({entry['error']})")
+        else:
+            print(f"{entry['file']}: {entry['records']} records, {entry['skipped']} skipped, "
+                  f"{entry['inserted']} new, {entry['changes']} rate changes")
+    print(f"Total: {summary['records']} records in {summary['seconds']}s")
+    sys.exit(1 if summary["failed"] else 0)
@@ -1,8 +1,9 @@
 import requests
 from bs4 import BeautifulSoup
-from datetime import datetime
 from sqlalchemy.orm import Session
-from database import Tariff, TariffHistory, TariffTrend
+from ingest import upsert_tariffs
+from http_cache import ResponseCache, all_unchanged, default_cache
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,7 +12,8 @@ logger = logging.getLogger(__name__)
 class TariffScraper:
     """Scrapes tariff data from US and China customs sources"""
     
-    def __init__(self):
+    def __init__(self, cache: ResponseCache = None):
+        self.cache = cache
         self.us_sources = {
             "usitc": "https://www.usitc.gov/trade_remedy/731_investigations/731_investigations.htm",
             "ustr": "https://ustr.gov/issue-areas/trade-agreements"
@@ -20,9 +22,22 @@ class TariffScraper:
             "cccn": "http://cccn.customs.gov.cn/"
         }
     
+    def _sources_unchanged(self, sources: dict, label: str):
+        """Conditionally check source URLs; returns (unchanged, checks)"""
+        if self.cache is None:
+            return False, {}
+        checks = self.cache.check_all(sources)
+        if all_unchanged(checks, sources):
+            logger.info(f"{label} sources unchanged since last run, skipping")
+            return True, checks
+        return False, checks
+    
     def fetch_us_tariffs(self, db: Session):
         """Fetch US tariff data from USITC and USTR"""
         logger.info("Fetching US tariff data...")
+        unchanged, checks = self._sources_unchanged(self.us_sources, "US")
+        if unchanged:
+            return 0
         
         try:
             # This is a placeholder - actual implementation would parse real tariff data
@@ -43,6 +58,8 @@ class TariffScraper:
             ]
             
             self._save_tariffs(db, us_data, "US")
+            if self.cache is not None:
+                self.cache.commit(checks.values())
             logger.info(f"Successfully fetched {len(us_data)} US tariffs")
             return len(us_data)
         except Exception as e:
@@ -52,6 +69,9 @@ class TariffScraper:
     def fetch_china_tariffs(self, db: Session):
         """Fetch China tariff data from China Customs"""
         logger.info("Fetching China tariff data...")
+        unchanged, checks = self._sources_unchanged(self.china_sources, "China")
+        if unchanged:
+            return 0
         
         try:
             # Placeholder for China tariff data
@@ -71,6 +91,8 @@ class TariffScraper:
             ]
             
             self._save_tariffs(db, china_data, "China")
+            if self.cache is not None:
+                self.cache.commit(checks.values())
             logger.info(f"Successfully fetched {len(china_data)} China tariffs")
             return len(china_data)
         except Exception as e:
@@ -79,53 +101,26 @@ class TariffScraper:
     
     def _save_tariffs(self, db: Session, data: list, country: str):
         """Save tariff data and track changes"""
-        for item in data:
-            existing = db.query(Tariff).filter(
-                Tariff.country == country,
-                Tariff.hs_code == item["hs_code"]
-            ).first()
-            
-            if existing:
-                # Check if rate changed
-                if existing.rate != item["rate"]:
-                    history = TariffHistory(
-                        tariff_id=existing.id,
-                        country=country,
-                        hs_code=item["hs_code"],
-                        old_rate=existing.rate,
-                        new_rate=item["rate"],
-                        change_reason=f"Updated from {item['source']}"
-                    )
-                    db.add(history)
-                    existing.rate = item["rate"]
-                    existing.last_updated = datetime.utcnow()
-            else:
-                # New tariff
-                tariff = Tariff(
-                    country=country,
-                    hs_code=item["hs_code"],
-                    product_description=item["description"],
-                    rate=item["rate"],
-                    effective_date=datetime.utcnow(),
-                    source_url=item.get("source", "")
-                )
-                db.add(tariff)
-            
-            # Save trend data for charting
-            trend = TariffTrend(
-                country=country,
-                hs_code=item["hs_code"],
-                product_description=item["description"],
-                rate=item["rate"],
-                record_date=datetime.utcnow()
-            )
-            db.add(trend)
-            db.commit()
+        return upsert_tariffs(db, data, country)
 
-def run_daily_scrape(db: Session):
-    """Run the daily tariff scrape job"""
-    scraper = TariffScraper()
+def run_daily_scrape(db: Session, progress=None):
+    """
+    Run the daily tariff scrape job.
+    
+    progress, if given, is called as progress(stage, seconds, count) after
+    each stage so callers can report per-source timings.
+    """
+    scraper = TariffScraper(cache=default_cache())
+    
+    started = time.perf_counter()
     us_count = scraper.fetch_us_tariffs(db)
+    if progress:
+        progress("us", round(time.perf_counter() - started, 4), us_count)
+    
+    started = time.perf_counter()
     china_count = scraper.fetch_china_tariffs(db)
+    if progress:
+        progress("china", round(time.perf_counter() - started, 4), china_count)
+    
     logger.info(f"Daily scrape completed: {us_count} US + {china_count} China tariffs")
     return us_count + china_count
@@ -0,0 +1,119 @@
+"""
+Dashboard Statistics
+Counters maintained by the ingestion path so /api/stats is a handful of key lookups
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from database import Tariff, TariffHistory, StatCounter
+
+SEEDED = "seeded"
+LAST_INGEST = "last_ingest"
+
+
+def _tariff_key(country: str) -> str:
+    return f"tariffs:{country}"
+
+
+def _changes_key(day) -> str:
+    return f"changes:{day.isoformat()}"
+
+
+def increment(db: Session, name: str, amount: int = 1, now: datetime = None):
+    """Atomically add to a counter inside the caller's transaction"""
+    now = now or datetime.utcnow()
+    result = db.execute(
+        update(StatCounter)
+        .where(StatCounter.name == name)
+        .values(value=StatCounter.value + amount, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.add(StatCounter(name=name, value=amount, updated_at=now))
+        db.flush()
+
+
+def _claim_seed(db: Session, now: datetime) -> bool:
+    """Insert the seeded marker unless it exists; False means another session seeded first"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        if db.get(StatCounter, SEEDED) is not None:
+            return False
+        db.add(StatCounter(name=SEEDED, value=1, updated_at=now))
+        db.flush()
+        return True
+    # Concurrent claims serialize on the primary key; the loser inserts nothing
+    result = db.execute(
+        insert(StatCounter).values(name=SEEDED, value=1, updated_at=now).on_conflict_do_nothing(index_elements=["name"])
+    )
+    return result.rowcount == 1
+
+
+def ensure_counters(db: Session):
+    """
+    Seed counters from the tables once, for databases that predate them.
+
+    Runs at startup and before ingestion, never on the read path. The seeded
+    marker is claimed in the same transaction as the counts, so concurrent
+    callers cannot both seed and double-count.
+    """
+    if db.get(StatCounter, SEEDED) is not None:
+        return
+
+    now = datetime.utcnow()
+    if not _claim_seed(db, now):
+        return
+
+    for country, count in db.execute(select(Tariff.country, func.count()).group_by(Tariff.country)):
+        db.merge(StatCounter(name=_tariff_key(country), value=count, updated_at=now))
+
+    day = func.date(TariffHistory.change_date)
+    for change_day, count in db.execute(select(day, func.count()).group_by(day)):
+        if change_day is not None:
+            name = f"changes:{change_day if isinstance(change_day, str) else change_day.isoformat()}"
+            db.merge(StatCounter(name=name, value=count, updated_at=now))
+
+    last_updated = db.execute(select(func.max(Tariff.last_updated))).scalar()
+    if last_updated is not None:
+        db.merge(StatCounter(name=LAST_INGEST, value=0, updated_at=last_updated))
+    db.commit()
+
+
+def record_batch(db: Session, country: str, inserted: int, changes: int, now: datetime):
+    """Fold one ingested batch into the counters (same transaction as the batch)"""
+    if inserted:
+        increment(db, _tariff_key(country), inserted, now)
+    if changes:
+        increment(db, _changes_key(now.date()), changes, now)
+    increment(db, LAST_INGEST, 1, now)
+
+
+def read_stats(db: Session) -> dict:
+    """Current tariff counts, changes over the last 7 calendar days and last ingest time"""
+    today = datetime.utcnow().date()
+    change_keys = [_changes_key(today - timedelta(days=offset)) for offset in range(7)]
+
+    counters = {
+        counter.name: counter
+        for counter in db.execute(
+            select(StatCounter).where(
+                StatCounter.name.in_([_tariff_key("US"), _tariff_key("China"), LAST_INGEST, *change_keys])
+            )
+        ).scalars()
+    }
+
+    us_count = counters[_tariff_key("US")].value if _tariff_key("US") in counters else 0
+    china_count = counters[_tariff_key("China")].value if _tariff_key("China") in counters else 0
+    last_ingest = counters.get(LAST_INGEST)
+    return {
+        "us_tariffs": us_count,
+        "china_tariffs": china_count,
+        "total_tariffs": us_count + china_count,
+        "recent_changes_7d": sum(counters[key].value for key in change_keys if key in counters),
+        "last_update": last_ingest.updated_at if last_ingest else None
+    }
@@ -0,0 +1,261 @@
+"""
+Synthetic Data
+Reproducible, realistically sized tariff datasets for benchmarking (codes x years of daily rates)
+
+Usage: python -m synthetic_data --codes 25000 --years 5 [--change-days 180] [--rollups week,month]
+       [--countries US,China] [--seed 42] [--reset]
+"""
+
+import time
+import logging
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.orm import Session
+from database import (
+    SessionLocal, Tariff, TariffHistory, TariffTrend, TariffTrendInterval, TariffTrendRollup,
+    TariffProgramRate, HSHierarchyRollup, StatCounter
+)
+from hierarchy import rebuild_hierarchy
+from rollups import STORED_GRANULARITIES, bucket_start
+from response_cache import bump_generation
+from stats import ensure_counters
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RATES = np.array([0.0, 2.5, 3.5, 5.0, 6.5, 8.0, 10.0, 12.0, 15.0, 25.0])
+CHAPTERS = np.array([chapter for chapter in range(1, 98) if chapter != 77])  # 77 is reserved in the HS
+CODES_PER_CHUNK = 1000
+INSERT_ROWS = 20000
+STACKED_PROGRAM = "section_301"
+STACKED_SHARE = 0.25  # Share of US codes that also carry a stacked program
+GENERATED_TABLES = (
+    TariffHistory, TariffTrend, TariffTrendInterval, TariffTrendRollup,
+    TariffProgramRate, HSHierarchyRollup, StatCounter, Tariff
+)
+
+
+def _insert(db: Session, model, rows: list):
+    """Core executemany (no ORM bookkeeping) in INSERT_ROWS slices"""
+    connection = db.connection()
+    for start in range(0, len(rows), INSERT_ROWS):
+        connection.execute(insert(model.__table__), rows[start:start + INSERT_ROWS])
+
+
+def _codes(rng: np.random.Generator, count: int) -> list:
+    """count distinct dotted 8-digit codes spread over every chapter"""
+    chosen = np.empty(0, dtype=np.int64)
+    while len(chosen) < count:
+        draw = (rng.choice(CHAPTERS, count * 2) * 1_000_000 + rng.integers(1, 100, count * 2) * 10_000
+                + rng.integers(0, 100, count * 2) * 100 + rng.integers(0, 100, count * 2))
+        chosen = np.unique(np.concatenate([chosen, draw]))
+    chosen = np.sort(rng.choice(chosen, count, replace=False))
+    return [f"{code // 10_000:04d}.{code // 100 % 100:02d}.{code % 100:02d}" for code in chosen]
+
+
+def _timeline(rng: np.random.Generator, days: int, change_days: float):
+    """(change day offsets starting with 0, rate per period) for one code"""
+    changes = np.unique(rng.integers(1, days, rng.poisson(days / change_days)))
+    rates = rng.choice(RATES, len(changes) + 1)
+    for position in range(1, len(rates)):
+        while rates[position] == rates[position - 1]:
+            rates[position] = rng.choice(RATES)
+    return np.concatenate([[0], changes]), rates
+
+
+def _bucket_bounds(first_day: datetime, days: int, granularity: str):
+    """(day offsets where each bucket starts, bucket start datetimes) over the generated range"""
+    starts = [bucket_start(first_day + timedelta(days=offset), granularity) for offset in range(days)]
+    bounds = [0] + [offset for offset in range(1, days) if starts[offset] != starts[offset - 1]]
+    return np.array(bounds), [starts[offset] for offset in bounds]
+
+
+def _rollup_rows(country: str, codes: list, descriptions: list, timelines: list, days: int,
+                 granularity: str, bounds: np.ndarray, bucket_starts: list, first_day: datetime) -> list:
+    """One aggregate per code per bucket from a daily rate matrix (one daily sample per code)"""
+    daily = np.stack([np.repeat(rates, np.diff(np.append(offsets, days))) for offsets, rates in timelines])
+    sums = np.add.reduceat(daily, bounds, axis=1)
+    mins = np.minimum.reduceat(daily, bounds, axis=1)
+    maxs = np.maximum.reduceat(daily, bounds, axis=1)
+    ends = np.append(bounds[1:], days) - 1
+    lasts = daily[:, ends]
+    samples = np.diff(np.append(bounds, days)).tolist()
+    last_dates = [first_day + timedelta(days=int(end)) for end in ends]
+    rows = []
+    for index, code in enumerate(codes):
+        sum_row, min_row, max_row, last_row = sums[index].tolist(), mins[index].tolist(), maxs[index].tolist(), lasts[index].tolist()
+        for bucket, start in enumerate(bucket_starts):
+            rows.append({
+                "granularity": granularity,
+                "bucket_start": start,
+                "country": country,
+                "hs_code": code,
+                "product_description": descriptions[index],
+                "samples": samples[bucket],
+                "rate_sum": sum_row[bucket],
+                "min_rate": min_row[bucket],
+                "max_rate": max_row[bucket],
+                "last_rate": last_row[bucket],
+                "last_record_date": last_dates[bucket]
+            })
+    return rows
+
+
+def reset_tables(db: Session):
+    for model in GENERATED_TABLES:
+        db.execute(delete(model))
+    db.commit()
+
+
+def generate(db: Session, codes: int = 25000, years: float = 5, change_days: float = 180,
+             countries=("US", "China"), rollups=("week", "month"), seed: int = 42) -> dict:
+    """
+    Fill tariffs, tariff_history, trend intervals, trend rollups and program
+    rates with `codes` codes (split across countries) and `years` of daily
+    rates that change every `change_days` days on average.
+
+    Trends are written in their stored form (one interval per rate period plus
+    per-bucket rollups) rather than as one row per code per day. The same seed
+    always produces the same dataset.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    days = max(2, int(years * 365))
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = today - timedelta(days=days - 1)
+    bounds = {granularity: _bucket_bounds(first_day, days, granularity) for granularity in rollups}
+    counts = {"tariffs": 0, "history": 0, "intervals": 0, "program_rates": 0, "rollups": 0}
+
+    per_country = [codes // len(countries) + (1 if index < codes % len(countries) else 0)
+                   for index in range(len(countries))]
+    for country, country_codes in zip(countries, per_country):
+        all_codes = _codes(rng, country_codes)
+        for chunk_start in range(0, len(all_codes), CODES_PER_CHUNK):
+            chunk = all_codes[chunk_start:chunk_start + CODES_PER_CHUNK]
+            descriptions = [f"Synthetic article {code}" for code in chunk]
+            timelines = [_timeline(rng, days, change_days) for _ in chunk]
+
+            tariffs = []
+            for code, description, (offsets, rates) in zip(chunk, descriptions, timelines):
+                last_change = first_day + timedelta(days=int(offsets[-1]))
+                tariffs.append({
+                    "country": country,
+                    "hs_code": code,
+                    "hs_digits": code.replace(".", ""),
+                    "product_description": description,
+                    "rate": float(rates[-1]),
+                    "effective_date": last_change,
+                    "source_url": "synthetic",
+                    "last_updated": min(now, last_change + timedelta(seconds=int(rng.integers(0, 86400))))
+                })
+            _insert(db, Tariff, tariffs)
+            ids = dict(db.execute(
+                select(Tariff.hs_code, Tariff.id).where(Tariff.country == country, Tariff.hs_code.in_(chunk))
+            ).all())
+
+            history, intervals, programs = [], [], []
+            for index, (code, description, (offsets, rates)) in enumerate(zip(chunk, descriptions, timelines)):
+                starts = [first_day + timedelta(days=int(offset)) for offset in offsets]
+                for period, valid_from in enumerate(starts):
+                    rate = float(rates[period])
+                    intervals.append({
+                        "country": country,
+                        "hs_code": code,
+                        "product_description": description,
+                        "rate": rate,
+                        "valid_from": valid_from,
+                        "valid_to": starts[period + 1] if period + 1 < len(starts) else None,
+                        "updated_at": valid_from
+                    })
+                    programs.append({
+                        "country": country,
+                        "hs_code": code,
+                        "hs_digits": code.replace(".", ""),
+                        "program": "base",
+                        "rate": rate,
+                        "effective_date": valid_from,
+                        "source": "synthetic",
+                        "last_updated": valid_from
+                    })
+                    if period:
+                        history.append({
+                            "tariff_id": ids[code],
+                            "country": country,
+                            "hs_code": code,
+                            "old_rate": float(rates[period - 1]),
+                            "new_rate": rate,
+                            "change_date": tariffs[index]["last_updated"] if period == len(starts) - 1
+                            else min(now, valid_from + timedelta(seconds=int(rng.integers(0, 86400)))),
+                            "change_reason": "Synthetic rate change"
+                        })
+                if country == "US" and rng.random() < STACKED_SHARE:
+                    programs.append({
+                        "country": country,
+                        "hs_code": code,
+                        "hs_digits": code.replace(".", ""),
+                        "program": STACKED_PROGRAM,
+                        "rate": float(rng.choice([7.5, 25.0])),
+                        "effective_date": first_day + timedelta(days=int(rng.integers(0, days))),
+                        "source": "synthetic",
+                        "last_updated": today
+                    })
+
+            _insert(db, TariffHistory, history)
+            _insert(db, TariffTrendInterval, intervals)
+            _insert(db, TariffProgramRate, programs)
+            for granularity, (bucket_bounds, bucket_starts) in bounds.items():
+                rows = _rollup_rows(country, chunk, descriptions, timelines, days,
+                                    granularity, bucket_bounds, bucket_starts, first_day)
+                _insert(db, TariffTrendRollup, rows)
+                counts["rollups"] += len(rows)
+            db.commit()
+
+            counts["tariffs"] += len(tariffs)
+            counts["history"] += len(history)
+            counts["intervals"] += len(intervals)
+            counts["program_rates"] += len(programs)
+            logger.info(f"Generated {counts['tariffs']}/{codes} codes ({country})")
+
+    # Derived state the ingestion path would normally maintain
+    rebuild_hierarchy(db)
+    ensure_counters(db)
+    bump_generation(db)
+    db.commit()
+
+    counts["days"] = days
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"Synthetic dataset generated in {counts['seconds']}s: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the database with a reproducible synthetic dataset")
+    parser.add_argument("--codes", type=int, default=25000, help="Tariff lines in total, split across countries")
+    parser.add_argument("--years", type=float, default=5, help="Years of daily rate history")
+    parser.add_argument("--change-days", type=float, default=180, help="Mean days between rate changes per code")
+    parser.add_argument("--countries", default="US,China", help="Comma-separated countries")
+    parser.add_argument("--rollups", default="week,month",
+                        help=f"Rollup granularities to fill ({', '.join(STORED_GRANULARITIES)})")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same dataset")
+    parser.add_argument("--reset", action="store_true", help="Delete existing tariff data first")
+    args = parser.parse_args()
+
+    granularities = tuple(g for g in args.rollups.split(",") if g)
+    unknown = [g for g in granularities if g not in STORED_GRANULARITIES]
+    if unknown:
+        parser.error(f"unknown rollup granularity: {', '.join(unknown)}")
+
+    session = SessionLocal()
+    try:
+        if args.reset:
+            reset_tables(session)
+        elif session.execute(select(func.count()).select_from(Tariff)).scalar():
+            parser.error("the database already holds tariffs; pass --reset to replace them")
+        summary = generate(session, args.codes, args.years, args.change_days,
+                           tuple(c.strip() for c in args.countries.split(",") if c.strip()), granularities, args.seed)
+    finally:
+        session.close()
+    print(", ".join(f"{key}: {value}" for key, value in summary.items()))
@@ -0,0 +1,37 @@
+"""
+Test Fixtures
+Every test runs against a throwaway SQLite database, emptied before each test
+"""
+
+import os
+import sys
+import tempfile
+
+# Must be set before database is imported anywhere
+_DATABASE_DIR = tempfile.mkdtemp(prefix="tariff-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATABASE_DIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from database import Base, SessionLocal, engine, Watermark
+from response_cache import GENERATION_NAME, bump_generation, generation_clock, response_cache
+
+
+@pytest.fixture
+def db():
+    """A session on empty tables; the data generation keeps counting up so no cache outlives a test"""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name != Watermark.__tablename__:
+                conn.execute(table.delete())
+        conn.execute(Watermark.__table__.delete().where(Watermark.name != GENERATION_NAME))
+    session = SessionLocal()
+    bump_generation(session)
+    session.commit()
+    response_cache.clear()
+    generation_clock.expire()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from datetime import datetime
+import httpx
+import pytest
+import main
+from fastapi.testclient import TestClient
+from database import Tariff
+from ingest import upsert_tariffs
+from main import app
+from response_cache import generation_clock
+
+client = TestClient(app)  # No context manager: startup (scheduler, migrations) stays off
+
+
+def _tariffs(db, count: int, stamp: datetime = datetime(2024, 5, 1)):
+    # One shared timestamp, so every page boundary falls on a tie broken by id
+    db.add_all([Tariff(country="US", hs_code=f"0101.{n:02d}.00", hs_digits=f"0101{n:02d}00", rate=float(n),
+                       last_updated=stamp) for n in range(count)])
+    db.commit()
+
+
+def _pages(params: dict) -> list:
+    pages, cursor = [], None
+    while True:
+        body = client.get("/api/tariffs", params=dict(params, **({"cursor": cursor} if cursor else {}))).json()
+        pages.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_row_once(db):
+    _tariffs(db, 5)
+
+    pages = _pages({"limit": 2})
+
+    assert [len(page["data"]) for page in pages] == [2, 2, 1]
+    ids = [row["id"] for page in pages for row in page["data"]]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 5
+    assert all(page["total"] == 5 for page in pages)
+
+
+@pytest.mark.parametrize("count, sizes", [(4, [2, 2]), (0, [0]), (1, [1])])
+def test_last_page_has_no_cursor(db, count, sizes):
+    _tariffs(db, count)
+    assert [len(page["data"]) for page in _pages({"limit": 2})] == sizes
+
+
+def test_invalid_cursor_is_a_bad_request(db):
+    assert client.get("/api/tariffs", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+@pytest.mark.parametrize("path, params, status", [
+    ("/api/tariffs", {"format": "xml"}, 400),
+    ("/api/tariffs", {"hs_code": "abc"}, 400),
+    ("/api/trends", {"country": "US", "downsample": "average"}, 400),
+    ("/api/trends", {"country": "US", "max_points": 2}, 422),
+])
+def test_bad_parameters_are_rejected(db, path, params, status):
+    assert client.get(path, params=params).status_code == status
+
+
+def test_etag_revalidates_until_the_data_changes(db):
+    item = {"hs_code": "6204.62.20", "description": "Women's cotton trousers", "rate": 16.5, "source": "USITC"}
+    upsert_tariffs(db, [item], "US")
+    generation_clock.expire()
+
+    first = client.get("/api/tariffs", params={"country": "US"})
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.json()["data"][0]["rate"] == 16.5
+    assert client.get("/api/tariffs", params={"country": "US"}, headers={"If-None-Match": etag}).status_code == 304
+
+    upsert_tariffs(db, [dict(item, rate=18.0)], "US")
+    generation_clock.expire()
+
+    changed = client.get("/api/tariffs", params={"country": "US"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["data"][0]["rate"] == 18.0
+
+
+def test_each_encoding_has_its_own_etag(db):
+    _tariffs(db, 40)  # Large enough to be compressed
+    generation_clock.expire()
+
+    plain = client.get("/api/tariffs", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/tariffs", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gz"'
+    assert gzipped.json() == plain.json()
+    for etag in (plain.headers["ETag"], gzipped.headers["ETag"]):
+        revalidated = client.get("/api/tariffs", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+        assert (revalidated.status_code, revalidated.headers["ETag"]) == (304, etag)
+
+
+def test_slow_handler_does_not_stall_the_event_loop(db, monkeypatch):
+    def slow_resolve(session, keys):
+        time.sleep(0.5)  # Stands in for hydration and post-processing of a large result
+        return []
+    monkeypatch.setattr(main, "resolve_keys", slow_resolve)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            async def timed(request):
+                response = await request
+                return response.status_code, time.perf_counter()
+            started = time.perf_counter()
+            slow = asyncio.create_task(timed(ac.post("/api/tariffs/lookup", json={"keys": []})))
+            await asyncio.sleep(0.05)
+            fast = await timed(ac.get("/health"))
+            return started, await slow, fast
+
+    started, slow, fast = asyncio.run(run())
+
+    assert slow[0] == fast[0] == 200
+    assert fast[1] - started < 0.3 < slow[1] - started
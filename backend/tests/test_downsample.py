@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from downsample import downsample_rows, lttb_indices, minmax_indices
+
+
+@pytest.mark.parametrize("max_points", [1, 2, 3, 4, 5, 7, 50])
+def test_minmax_never_exceeds_the_limit(max_points):
+    y = np.sin(np.arange(200) / 7.0)
+    result = minmax_indices(y, max_points)
+
+    assert len(result) <= max_points
+    assert result[0] == 0 and (max_points < 2 or result[-1] == 199)
+
+
+def test_minmax_keeps_a_step_change_with_three_points():
+    y = np.r_[np.full(50, 10.0), np.full(50, 25.0)]
+    assert y[minmax_indices(y, 3)].tolist() == [10.0, 25.0, 25.0]
+
+
+@pytest.mark.parametrize("max_points", [1, 2, 3, 10])
+def test_lttb_never_exceeds_the_limit(max_points):
+    x = np.arange(100, dtype=float)
+    assert len(lttb_indices(x, np.cos(x), max_points)) <= max_points
+
+
+def test_downsample_rows_bounds_each_series():
+    rows = [(code, day, float(day % 5)) for code in ("a", "b") for day in range(40)]
+    kept = downsample_rows(rows, 3, "minmax", key=lambda r: r[0], x=lambda r: r[1], y=lambda r: r[2])
+
+    assert sum(1 for r in kept if r[0] == "a") <= 3
+    assert sum(1 for r in kept if r[0] == "b") <= 3
+    assert kept == sorted(kept)
@@ -0,0 +1,60 @@
+from datetime import datetime
+import pandas as pd
+from fastapi.testclient import TestClient
+from duty import calculate_file
+from ingest import upsert_tariffs
+from main import app
+
+client = TestClient(app)
+
+
+def _programs(db):
+    upsert_tariffs(db, [
+        {"hs_code": "8517.62.00", "description": "Cellular network devices", "rate": 15.0,
+         "source": "USITC", "program": "base", "effective_date": datetime(2024, 1, 1)},
+        {"hs_code": "8517.62.00", "description": "Mobile phones (Section 301)", "rate": 25.0,
+         "source": "USTR Section 301", "program": "section_301", "effective_date": datetime(2024, 9, 1)},
+    ], "US", use_item_dates=True)
+
+
+def _request(dates, values=None):
+    count = len(dates)
+    return {"country": ["US"] * count, "hs_code": ["8517.62.00"] * count,
+            "customs_value": values or [1000.0] * count, "date": dates}
+
+
+def test_missing_dates_mean_today_and_stack_programs(db):
+    _programs(db)
+    body = client.post("/api/duty/calculate", json=_request([None, "2024-03-01"])).json()
+
+    assert body["total_rate"] == [40.0, 15.0]
+    assert body["duty"] == [400.0, 150.0]
+    assert body["matched"] == [True, True]
+
+
+def test_malformed_dates_are_rejected_with_their_lines(db):
+    _programs(db)
+    response = client.post("/api/duty/calculate", json=_request(["2024-03-01", "2024-13-45", None, "garbage"]))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Lines not priced: 1 (invalid date), 3 (invalid date)"
+
+
+def test_file_rows_with_bad_inputs_are_flagged_not_priced(db, tmp_path):
+    _programs(db)
+    source = tmp_path / "invoices.csv"
+    source.write_text(
+        "country,hs_code,customs_value,date\n"
+        "US,8517.62.00,1000,2024-03-01\n"
+        "US,8517.62.00,lots,2024-03-01\n"
+        "US,8517.62.00,1000,2024-13-45\n"
+        "US,8517.62.00,1000,\n"
+    )
+    output = tmp_path / "duties.csv"
+
+    summary = calculate_file(str(source), str(output))
+
+    priced = pd.read_csv(output)
+    assert (summary["lines"], summary["invalid"], summary["total_duty"]) == (4, 2, 550.0)
+    assert priced["error"].tolist()[1:3] == ["invalid customs_value", "invalid date"]
+    assert priced["duty"].isna().tolist() == [False, True, True, False]
@@ -0,0 +1,42 @@
+import asyncio
+from events import ChangeBroker
+from ingest import upsert_tariffs
+
+ITEM = {"hs_code": "6204.62.20", "description": "Women's cotton trousers", "rate": 16.5, "source": "USITC"}
+
+
+def test_changes_are_published_once(db):
+    broker = ChangeBroker()
+
+    async def scenario():
+        entry, first = broker.subscribe()
+        broker.prime(db)
+        upsert_tariffs(db, [ITEM], "US")
+        upsert_tariffs(db, [dict(ITEM, rate=18.0)], "US")
+
+        event = broker.publish_pending(db)
+        assert broker.publish_pending(db) is None  # Nothing new since
+        await asyncio.sleep(0)  # Let the queued delivery run
+        delivered = entry[1].get_nowait()
+        broker.unsubscribe(entry)
+        return first, event, delivered
+
+    first, event, delivered = asyncio.run(scenario())
+    assert first
+    assert delivered is event
+    assert [(c["old_rate"], c["new_rate"]) for c in event["changes"]] == [(16.5, 18.0)]
+    assert event["stats_delta"]["us_tariffs"] == 1
+
+
+def test_nothing_is_published_before_prime(db):
+    broker = ChangeBroker()
+
+    async def scenario():
+        entry, _ = broker.subscribe()
+        upsert_tariffs(db, [ITEM], "US")
+        try:
+            return broker.publish_pending(db)
+        finally:
+            broker.unsubscribe(entry)
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,86 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fetcher import HostSessionPool, fetch_concurrently
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so pooled sessions reuse their socket
+
+    def do_GET(self):
+        delay = float(self.path.rsplit("/", 1)[-1] or 0)
+        time.sleep(delay)
+        body = f'[{{"path": "{self.path}", "port": {self.client_address[1]}}}]'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _source(url):
+    return lambda session: session.get(url, timeout=5).json()
+
+
+def test_sources_share_their_host_session(stub_url):
+    pool = HostSessionPool()
+    urls = {"a": f"{stub_url}/a/0", "b": f"{stub_url}/b/0"}
+    seen = []
+
+    def remember(name):
+        def fetch(session):
+            seen.append(session)
+            return _source(urls[name])(session)
+        return fetch
+
+    results, timings = fetch_concurrently({name: remember(name) for name in urls}, max_workers=1, urls=urls, pool=pool)
+    pool.close()
+
+    assert [r[0]["path"] for r in (results["a"], results["b"])] == ["/a/0", "/b/0"]
+    assert seen[0] is seen[1]
+    assert results["a"][0]["port"] == results["b"][0]["port"]  # Same keep-alive connection
+    assert all(seconds is not None for seconds in timings.values())
+
+
+def test_timeout_is_counted_from_each_source_start(stub_url):
+    pool = HostSessionPool(max_per_host=2)
+    urls = {"slow": f"{stub_url}/slow/0.6", "queued": f"{stub_url}/queued/0.4", "stuck": f"{stub_url}/stuck/3"}
+
+    # One worker: "queued" only starts after "slow" finishes, 0.6s into the stage,
+    # which is past its 0.5s budget if that were counted from the start of the stage
+    started = time.perf_counter()
+    results, timings = fetch_concurrently(
+        {name: _source(url) for name, url in urls.items()}, max_workers=1,
+        timeout=0.5, timeouts={"slow": 1.0, "stuck": 0.2}, urls=urls, pool=pool
+    )
+    elapsed = time.perf_counter() - started
+    pool.close()
+
+    assert results["slow"] and results["queued"]
+    assert results["stuck"] == [] and timings["stuck"] is None
+    assert elapsed < 2.0  # The stuck source is abandoned, not waited out
+
+
+def test_failing_source_contributes_nothing():
+    def broken(session):
+        raise RuntimeError("source is down")
+
+    results, timings = fetch_concurrently({"broken": broken, "ok": lambda session: [{"hs_code": "0101.21.00"}]})
+
+    assert results == {"broken": [], "ok": [{"hs_code": "0101.21.00"}]}
+    assert timings["broken"] is None
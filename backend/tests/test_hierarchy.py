@@ -0,0 +1,13 @@
+from datetime import datetime
+from hierarchy import _aggregate
+
+
+def test_child_average_is_not_weighted_by_code_count():
+    rates = [("85171100", 10.0), ("85171200", 10.0), ("85171300", 10.0), ("85210000", 40.0)]
+    rows = {row["prefix"]: row for row in _aggregate("US", "85", rates, datetime(2024, 1, 1))}
+
+    chapter = rows["85"]
+    assert chapter["codes"] == 4
+    assert chapter["rate_sum"] / chapter["codes"] == 17.5  # Code-weighted
+    assert chapter["child_avg_rate"] == 25.0  # Mean of headings 8517 (10.0) and 8521 (40.0)
+    assert rows["8517"]["parent"] == "85"
@@ -0,0 +1,87 @@
+from datetime import datetime
+from asof import AsOfIndex
+from duty import ProgramRateTable
+from hs_search import HSPrefixIndex
+from ingest import upsert_tariffs
+from lookup import CurrentRateIndex
+
+ITEM = {"hs_code": "6204.62.20", "description": "Women's cotton trousers", "rate": 16.5, "source": "USITC"}
+
+
+def _rebuilds(index, monkeypatch) -> list:
+    calls = []
+    rebuild = index._rebuild
+    monkeypatch.setattr(index, "_rebuild", lambda db, generation: calls.append(generation) or rebuild(db, generation))
+    return calls
+
+
+def test_as_of_index_rebuilds_single_flight(db, monkeypatch):
+    index = AsOfIndex()
+    calls = _rebuilds(index, monkeypatch)
+    upsert_tariffs(db, [ITEM], "US")
+    index.refresh(db)
+
+    upsert_tariffs(db, [dict(ITEM, rate=18.0)], "US")
+    with index._building:  # Another request is mid-rebuild
+        index.refresh(db)
+    assert len(calls) == 1  # Kept serving the previous index
+
+    index.refresh(db)
+    assert len(calls) == 2
+    assert index.lookup("US", "6204.62.20", datetime.utcnow())["rate"] == 18.0
+
+
+def test_as_of_cold_start_builds_even_during_another_rebuild(db, monkeypatch):
+    index = AsOfIndex()
+    calls = _rebuilds(index, monkeypatch)
+    upsert_tariffs(db, [ITEM], "US")
+
+    with index._building:
+        index.refresh(db)
+    assert len(calls) == 1
+
+
+def test_current_rate_index_rebuilds_single_flight(db, monkeypatch):
+    index = CurrentRateIndex()
+    calls = _rebuilds(index, monkeypatch)
+    upsert_tariffs(db, [ITEM], "US")
+    index.refresh(db)
+
+    upsert_tariffs(db, [dict(ITEM, rate=18.0)], "US")
+    with index._building:
+        index.refresh(db)
+    assert index.get("US", "62046220")["rate"] == 16.5  # Previous index, no second build
+
+    index.refresh(db)
+    assert len(calls) == 2
+    assert index.get("US", "62046220")["rate"] == 18.0
+
+
+def test_program_rate_table_rebuilds_single_flight(db, monkeypatch):
+    table = ProgramRateTable()
+    calls = _rebuilds(table, monkeypatch)
+    upsert_tariffs(db, [dict(ITEM, program="base", effective_date=datetime(2024, 1, 1))], "US", use_item_dates=True)
+    table.refresh(db)
+
+    upsert_tariffs(db, [dict(ITEM, program="section_301", rate=25.0, effective_date=datetime(2024, 9, 1))],
+                   "US", use_item_dates=True)
+    with table._building:
+        table.refresh(db)
+    assert table.programs == ["base"]
+
+    table.refresh(db)
+    assert len(calls) == 2
+    assert table.programs == ["base", "section_301"]
+
+
+def test_prefix_index_rebuilds_single_flight(db, monkeypatch):
+    index = HSPrefixIndex()
+    calls = _rebuilds(index, monkeypatch)
+    upsert_tariffs(db, [ITEM], "US")
+    assert index.count(db, "6204") == 1
+
+    upsert_tariffs(db, [dict(ITEM, hs_code="6204.63.00")], "US")
+    with index._building:
+        assert index.count(db, "6204") == 1  # Previous index while another request rebuilds
+    assert index.count(db, "6204") == 2
+    assert len(calls) == 2
@@ -0,0 +1,74 @@
+from datetime import datetime
+from sqlalchemy import select, func
+from database import Tariff, TariffHistory, TariffProgramRate
+from ingest import upsert_tariffs
+from real_data_scraper import fetch_all_real_tariffs
+from scraper import run_daily_scrape
+
+
+def _count(db, model) -> int:
+    return db.execute(select(func.count()).select_from(model)).scalar()
+
+
+def _rate(db, country: str, hs_code: str) -> float:
+    return db.execute(select(Tariff.rate).where(Tariff.country == country, Tariff.hs_code == hs_code)).scalar()
+
+
+def _stacked(base: float = 15.0, section_301: float = 25.0) -> list:
+    return [
+        {"hs_code": "8517.62.00", "description": "Cellular network devices", "rate": base,
+         "source": "USITC", "program": "base", "effective_date": datetime(2024, 1, 1)},
+        {"hs_code": "8517.62.00", "description": "Mobile phones (Section 301)", "rate": section_301,
+         "source": "USTR Section 301", "program": "section_301", "effective_date": datetime(2024, 9, 1)},
+    ]
+
+
+def test_stacked_code_rerun_writes_no_history(db):
+    upsert_tariffs(db, _stacked(), "US", use_item_dates=True)
+    result = upsert_tariffs(db, _stacked(), "US", use_item_dates=True)
+
+    assert result["changes"] == 0
+    assert _count(db, TariffHistory) == 0
+    assert _count(db, TariffProgramRate) == 2
+    assert _rate(db, "US", "8517.62.00") == 40.0
+
+
+def test_program_change_records_one_change_of_the_stacked_rate(db):
+    upsert_tariffs(db, _stacked(), "US", use_item_dates=True)
+    result = upsert_tariffs(db, _stacked(section_301=7.5), "US", use_item_dates=True)
+
+    assert result["changes"] == 1
+    change = db.execute(select(TariffHistory)).scalar_one()
+    assert (change.old_rate, change.new_rate) == (40.0, 22.5)
+    assert _rate(db, "US", "8517.62.00") == 22.5
+
+
+def test_future_program_is_not_stacked_yet(db):
+    items = _stacked()
+    items[1]["effective_date"] = datetime(2999, 1, 1)
+    upsert_tariffs(db, items, "US", use_item_dates=True)
+
+    assert _rate(db, "US", "8517.62.00") == 15.0
+
+
+def test_plain_rerun_writes_no_history(db):
+    items = [{"hs_code": "6204.62.20", "description": "Women's cotton trousers", "rate": 16.5, "source": "USITC"}]
+    upsert_tariffs(db, items, "US")
+    upsert_tariffs(db, items, "US")
+    assert _count(db, TariffHistory) == 0
+
+    upsert_tariffs(db, [dict(items[0], rate=18.0)], "US")
+    assert _count(db, TariffHistory) == 1
+    assert _rate(db, "US", "6204.62.20") == 18.0
+
+
+def test_scrapers_are_idempotent(db):
+    fetch_all_real_tariffs(db)
+    run_daily_scrape(db)
+    tariffs = _count(db, Tariff)
+
+    fetch_all_real_tariffs(db)
+    run_daily_scrape(db)
+
+    assert _count(db, TariffHistory) == 0
+    assert _count(db, Tariff) == tariffs
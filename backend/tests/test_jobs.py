@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import jobs
+from database import ScrapeJob
+from jobs import ScrapeJobQueue, ScrapeSkipped
+
+
+def _wait(queue: ScrapeJobQueue, job_id: str, seconds: float = 5.0) -> dict:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        job = queue.get(job_id)
+        if job["finished_at"] is not None:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_failed_and_skipped_scrapes_are_reported(db):
+    def broken(db, progress):
+        progress("fetch", 0.1, 3)
+        raise RuntimeError("USITC is down")
+
+    def skipped(db, progress):
+        raise ScrapeSkipped("Scrape running in another process")
+
+    queue = ScrapeJobQueue(broken)
+    try:
+        failed = _wait(queue, queue.submit()[0]["id"])
+        skip = _wait(queue, queue.submit(scrape_func=skipped)[0]["id"])
+    finally:
+        queue.shutdown()
+
+    assert (failed["status"], failed["error"]) == ("failed", "USITC is down")
+    assert failed["progress"] == [{"stage": "fetch", "seconds": 0.1, "count": 3}]
+    assert skip["status"] == "skipped"
+
+
+def test_overlapping_triggers_coalesce(db):
+    release = threading.Event()
+    queue = ScrapeJobQueue(lambda db, progress: release.wait(5) and 7)
+    try:
+        job, coalesced = queue.submit()
+        again, coalesced_again = queue.submit(trigger="scheduled")
+        release.set()
+        done = _wait(queue, job["id"])
+    finally:
+        queue.shutdown()
+
+    assert (coalesced, coalesced_again, again["id"]) == (False, True, job["id"])
+    assert (done["status"], done["tariffs_processed"], done["coalesced_triggers"]) == ("succeeded", 7, 1)
+
+
+def test_scrape_during_an_import_queues_behind_it(db):
+    release = threading.Event()
+    ran = []
+    queue = ScrapeJobQueue(lambda db, progress: ran.append("scrape") or 3)
+    try:
+        imported, _ = queue.submit(trigger="import", kind="import",
+                                   scrape_func=lambda db, progress: release.wait(5) and ran.append("import") or 1)
+        scrape, coalesced = queue.submit(trigger="scheduled")
+        again, import_coalesced = queue.submit(trigger="import", kind="import", scrape_func=lambda db, progress: 0)
+        release.set()
+        done = _wait(queue, scrape["id"])
+    finally:
+        queue.shutdown()
+
+    assert not coalesced and scrape["id"] != imported["id"]
+    assert import_coalesced and again["id"] == imported["id"]
+    assert (done["status"], done["tariffs_processed"]) == ("succeeded", 3)
+    assert ran == ["import", "scrape"]
+
+
+def test_workers_share_job_rows(db):
+    release = threading.Event()
+    first = ScrapeJobQueue(lambda db, progress: progress("fetch", 0.2, 5) or release.wait(5) and 7)
+    second = ScrapeJobQueue(lambda db, progress: 0)  # Another worker process
+    try:
+        job, _ = first.submit()
+        again, coalesced = second.submit(trigger="scheduled")
+        polled = second.get(job["id"])
+        release.set()
+        done = _wait(second, job["id"])
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+    assert coalesced and again["id"] == job["id"]
+    assert polled["id"] == job["id"] and polled["status"] in ("queued", "running")
+    assert (done["status"], done["tariffs_processed"], done["coalesced_triggers"]) == ("succeeded", 7, 1)
+    assert done["progress"] == [{"stage": "fetch", "seconds": 0.2, "count": 5}]
+
+
+def test_scrape_waits_for_an_import_on_another_worker(db, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.02)
+    release = threading.Event()
+    ran = []
+    importer = ScrapeJobQueue(lambda db, progress: release.wait(5) and ran.append("import") or 1)
+    scraper = ScrapeJobQueue(lambda db, progress: ran.append("scrape") or 3)
+    try:
+        imported, _ = importer.submit(trigger="import", kind="import")
+        while importer.get(imported["id"])["status"] != "running":
+            time.sleep(0.01)
+        scrape, coalesced = scraper.submit()
+        time.sleep(0.1)
+        waiting = scraper.get(scrape["id"])["status"]
+        release.set()
+        done = _wait(scraper, scrape["id"])
+    finally:
+        importer.shutdown()
+        scraper.shutdown()
+
+    assert not coalesced and waiting == "queued"
+    assert done["status"] == "succeeded" and ran == ["import", "scrape"]
+
+
+def test_abandoned_job_stops_absorbing_triggers(db):
+    stale = datetime.utcnow() - timedelta(seconds=jobs.JOB_STALE_SECONDS + 60)
+    db.add(ScrapeJob(id="dead", kind="scrape", active_kind="scrape", trigger="manual", status="running",
+                     created_at=stale, started_at=stale, heartbeat_at=stale, progress="[]", coalesced_triggers=0))
+    db.commit()
+
+    queue = ScrapeJobQueue(lambda db, progress: 2)
+    try:
+        job, coalesced = queue.submit()
+        done = _wait(queue, job["id"])
+        dead = queue.get("dead")
+    finally:
+        queue.shutdown()
+
+    assert not coalesced and done["status"] == "succeeded"
+    assert dead["status"] == "failed" and dead["finished_at"] is not None
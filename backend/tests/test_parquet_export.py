@@ -0,0 +1,54 @@
+from datetime import datetime
+import pyarrow.parquet as pq
+from sqlalchemy import insert
+import parquet_export
+from database import TariffHistory, TariffTrendInterval
+
+
+def _history(db, first_day: int, count: int):
+    db.execute(insert(TariffHistory), [
+        {"tariff_id": 1, "country": "US" if day % 2 else "China", "hs_code": "8517.62.00",
+         "old_rate": 10.0, "new_rate": 12.5, "change_date": datetime(2024, 1 + day % 3, 1 + day % 28),
+         "change_reason": "test"}
+        for day in range(first_day, first_day + count)
+    ])
+    db.commit()
+
+
+def _read_ids(files) -> list:
+    return sorted(id_ for path in files for id_ in pq.read_table(path).column("id").to_pylist())
+
+
+def test_export_writes_row_groups_and_appends_only_new_rows(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_export, "FLUSH_ROWS", 2)
+    _history(db, 0, 30)
+
+    first = parquet_export.export_table(db, "history", str(tmp_path))
+    assert first["rows"] == 30
+    assert first["partitions"] == 6  # 2 countries x 3 months
+    assert len(_read_ids(first["files"])) == 30
+    assert max(pq.ParquetFile(path).num_row_groups for path in first["files"]) > 1
+    assert not [p for p in tmp_path.rglob("*.tmp")]
+
+    _history(db, 30, 5)
+    second = parquet_export.export_table(db, "history", str(tmp_path))
+    assert second["rows"] == 5
+    assert set(_read_ids(second["files"])).isdisjoint(_read_ids(first["files"]))
+
+    rebuilt = parquet_export.export_table(db, "history", str(tmp_path), rebuild=True)
+    assert rebuilt["rows"] == 35
+    assert len(parquet_export.list_files(str(tmp_path))) == rebuilt["partitions"]
+
+
+def test_interval_export_rewrites_only_changed_partitions(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_export, "FLUSH_ROWS", 2)
+    db.execute(insert(TariffTrendInterval), [
+        {"country": "US", "hs_code": f"8517.62.{n:02d}", "product_description": "x", "rate": 5.0,
+         "valid_from": datetime(2024, 1 + n % 2, 1), "valid_to": None, "updated_at": datetime(2024, 6, 1)}
+        for n in range(10)
+    ])
+    db.commit()
+
+    first = parquet_export.export_intervals(db, str(tmp_path))
+    assert (first["rows"], first["partitions"]) == (10, 2)
+    assert parquet_export.export_intervals(db, str(tmp_path))["partitions"] == 0
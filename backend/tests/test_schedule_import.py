@@ -0,0 +1,58 @@
+import io
+import os
+import pytest
+from sqlalchemy import select, func
+import schedule_import
+from database import Tariff
+from schedule_import import import_files, import_job, stage_uploads
+
+
+def _csv(tmp_path, name: str, body: str) -> str:
+    path = tmp_path / name
+    path.write_text(body, encoding="utf-8")
+    return str(path)
+
+
+def _die(*args):
+    os._exit(1)  # A parser process killed mid-file (OOM, segfault)
+
+
+def test_bad_file_is_reported_and_the_rest_imported(db, tmp_path):
+    good = _csv(tmp_path, "good.csv", "hs_code,description,rate\n0101.21.00,Horses,Free\n0102.21,Cattle,2.4¢/kg\n")
+    bad = _csv(tmp_path, "bad.csv", "hs_code,description\n0101.21.00,Horses\n")
+
+    summary = import_files(db, [good, bad], "us")
+
+    assert summary["country"] == "US"
+    assert (summary["records"], summary["skipped"], summary["failed"]) == (1, 1, 1)
+    assert "No column for rate" in summary["files"][1]["error"]
+    assert db.execute(select(func.count()).select_from(Tariff)).scalar() == 1
+
+
+def test_unknown_country_is_rejected(db, tmp_path):
+    with pytest.raises(ValueError):
+        import_files(db, [_csv(tmp_path, "a.csv", "hs_code,rate\n0101.21.00,1\n")], "Mars")
+
+
+def test_unsupported_upload_is_rejected_before_anything_is_written():
+    with pytest.raises(ValueError, match="Unsupported"):
+        stage_uploads([("schedule.csv", io.BytesIO(b"hs_code,rate\n")), ("schedule.pdf", io.BytesIO(b"%PDF"))])
+
+
+def test_failed_files_fail_the_job_and_clean_up(db, tmp_path):
+    directory, paths = stage_uploads([("bad.csv", io.BytesIO(b"hs_code\n0101.21.00\n"))])
+
+    with pytest.raises(ValueError, match="1 of 1 files failed"):
+        import_job(directory, paths, "US")(db)
+    assert not os.path.exists(directory)
+
+
+def test_dead_parser_process_fails_the_import_instead_of_hanging(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(schedule_import, "parse_into_queue", _die)
+    monkeypatch.setattr(schedule_import, "QUEUE_POLL_SECONDS", 0.2)
+    paths = [_csv(tmp_path, f"{n}.csv", "hs_code,rate\n0101.21.00,1\n") for n in range(2)]
+
+    summary = import_files(db, paths, "US", workers=2)
+
+    assert summary["failed"] == 2
+    assert all("Parser process failed" in entry["error"] for entry in summary["files"])
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from database import StatCounter, Tariff
+from stats import SEEDED, _claim_seed, ensure_counters, read_stats, record_batch
+
+
+def test_changes_window_is_seven_calendar_days(db):
+    now = datetime.utcnow()
+    for days_ago, changes in ((0, 1), (6, 10), (7, 100)):
+        record_batch(db, "US", 0, changes, now - timedelta(days=days_ago))
+    db.commit()
+
+    assert read_stats(db)["recent_changes_7d"] == 11
+
+
+def test_seeding_runs_once(db):
+    db.add_all([Tariff(country="US", hs_code=f"0101.2{n}.00", rate=1.0, last_updated=datetime.utcnow()) for n in range(3)])
+    db.execute(delete(StatCounter))
+    db.commit()
+
+    ensure_counters(db)
+    db.execute(delete(StatCounter).where(StatCounter.name != SEEDED))
+    db.commit()
+    ensure_counters(db)  # Already seeded: must not count the table again
+
+    assert read_stats(db)["us_tariffs"] == 0
+    assert db.get(StatCounter, SEEDED).value == 1
+    assert not _claim_seed(db, datetime.utcnow())  # A racing seeder loses the claim
+
+
+def test_seed_counts_existing_rows(db):
+    db.add_all([Tariff(country="China", hs_code=f"0101.2{n}.00", rate=1.0, last_updated=datetime.utcnow()) for n in range(2)])
+    db.execute(delete(StatCounter))
+    db.commit()
+
+    ensure_counters(db)
+
+    stats = read_stats(db)
+    assert (stats["china_tariffs"], stats["total_tariffs"]) == (2, 2)
@@ -0,0 +1,93 @@
+from datetime import datetime
+from sqlalchemy import select, insert
+import rollups
+import trend_intervals
+from database import TariffTrend, TariffTrendInterval, TariffTrendRollup
+
+
+def _legacy_rows(db):
+    rows = []
+    for code in ("8517.62.00", "6204.62.20", "6109.10.00"):
+        for day, rate in ((1, 10.0), (2, 10.0), (3, 12.5), (4, 12.5), (5, 10.0)):
+            rows.append({"country": "US", "hs_code": code, "product_description": code,
+                         "rate": rate, "record_date": datetime(2024, 3, day)})
+    db.execute(insert(TariffTrend), rows)
+    db.commit()
+    return len(rows)
+
+
+def test_legacy_migration_streams_in_small_batches(db, monkeypatch):
+    monkeypatch.setattr(trend_intervals, "READ_BATCH_SIZE", 2)
+    monkeypatch.setattr(trend_intervals, "MIGRATION_CODES_PER_CHUNK", 1)
+    monkeypatch.setattr(rollups, "READ_BATCH_SIZE", 2)
+    count = _legacy_rows(db)
+
+    result = trend_intervals.migrate_legacy_trends(db)
+
+    assert result["rows"] == count
+    intervals = db.execute(
+        select(TariffTrendInterval.rate, TariffTrendInterval.valid_from)
+        .where(TariffTrendInterval.hs_code == "8517.62.00").order_by(TariffTrendInterval.valid_from)
+    ).all()
+    assert [(rate, start.day) for rate, start in intervals] == [(10.0, 1), (12.5, 3), (10.0, 5)]
+
+    month = db.execute(
+        select(TariffTrendRollup).where(TariffTrendRollup.granularity == "month",
+                                        TariffTrendRollup.hs_code == "8517.62.00")
+    ).scalar_one()
+    assert (month.samples, month.min_rate, month.max_rate, month.last_rate) == (5, 10.0, 12.5, 10.0)
+
+    # Re-running reads nothing new
+    assert trend_intervals.migrate_legacy_trends(db)["rows"] == 0
+    assert rollups.update_rollups(db) == 0
+
+
+def test_batch_merge_loads_only_its_own_buckets(db, monkeypatch):
+    day = datetime(2024, 3, 4)
+    rollups.merge_observations(db, "US", [
+        {"hs_code": f"0101.{n:02d}.00", "product_description": "Horses", "rate": 1.0, "record_date": day}
+        for n in range(30)
+    ])
+    db.commit()
+
+    loaded = []
+    execute = db.execute
+
+    def counting_execute(statement, *args, **kwargs):
+        result = execute(statement, *args, **kwargs)
+        if getattr(statement, "is_select", False):
+            rows = result.all()
+            loaded.extend(rows)
+            return rows
+        return result
+
+    monkeypatch.setattr(db, "execute", counting_execute)
+    rollups.merge_observations(db, "US", [
+        {"hs_code": "0101.07.00", "product_description": "Horses", "rate": 3.0, "record_date": day}
+    ])
+    db.commit()
+    monkeypatch.undo()
+
+    assert len(loaded) == len(rollups.STORED_GRANULARITIES)  # One bucket per granularity, not the whole catalogue
+    bucket = db.execute(
+        select(TariffTrendRollup).where(TariffTrendRollup.hs_code == "0101.07.00",
+                                        TariffTrendRollup.granularity == "week")
+    ).scalar_one()
+    assert (bucket.samples, bucket.rate_sum, bucket.last_rate) == (2, 4.0, 3.0)
+
+
+def test_ingest_stores_no_day_rollups_and_day_trends_come_from_intervals(db):
+    from fastapi.testclient import TestClient
+    from ingest import upsert_tariffs
+    from main import app
+
+    item = {"hs_code": "6204.62.20", "description": "Women's cotton trousers", "rate": 16.5, "source": "USITC"}
+    upsert_tariffs(db, [item], "US")
+    upsert_tariffs(db, [dict(item, rate=18.0)], "US")
+
+    stored = db.execute(select(TariffTrendRollup.granularity)).scalars().all()
+    assert sorted(stored) == ["month", "week"]
+
+    body = TestClient(app).get("/api/trends", params={"country": "US", "days": 3, "granularity": "day"}).json()
+    assert body["data"][-1]["rates"]["US_6204.62.20"]["rate"] == 18.0
+    assert body["data"][-1]["rates"]["US_6204.62.20"]["avg_rate"] == 18.0
@@ -0,0 +1,281 @@
+"""
+Trend Intervals
+Run-length trend storage: one (valid_from, valid_to, rate) row per rate period instead of one row per scrape
+
+Usage: python -m trend_intervals [--drop-legacy]
+"""
+
+import time
+import logging
+import argparse
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, or_, func
+from sqlalchemy.orm import Session
+from database import SessionLocal, TariffTrend, TariffTrendInterval, get_watermark, set_watermark
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATION_WATERMARK = "trend_intervals_migrated"
+MIGRATION_CODES_PER_CHUNK = 1000
+READ_BATCH_SIZE = 5000
+
+# Same attribute names as TariffTrend, so chart code works on either
+TrendPoint = namedtuple("TrendPoint", "country hs_code product_description rate record_date")
+
+
+def _load_timelines(db: Session, country: str, hs_codes) -> dict:
+    """All intervals for the given codes, as per-code lists sorted by valid_from"""
+    timelines = {code: [] for code in hs_codes}
+    rows = db.execute(
+        select(
+            TariffTrendInterval.id, TariffTrendInterval.hs_code, TariffTrendInterval.rate,
+            TariffTrendInterval.product_description, TariffTrendInterval.valid_from, TariffTrendInterval.valid_to
+        ).where(
+            TariffTrendInterval.country == country,
+            TariffTrendInterval.hs_code.in_(list(hs_codes))
+        ).order_by(TariffTrendInterval.hs_code, TariffTrendInterval.valid_from)
+    )
+    for row in rows:
+        timelines[row.hs_code].append({
+            "id": row.id,
+            "rate": row.rate,
+            "product_description": row.product_description,
+            "valid_from": row.valid_from,
+            "valid_to": row.valid_to,
+            "dirty": False
+        })
+    return timelines
+
+
+def _new_interval(rate, description, valid_from, valid_to):
+    return {
+        "id": None,
+        "rate": rate,
+        "product_description": description,
+        "valid_from": valid_from,
+        "valid_to": valid_to,
+        "dirty": True
+    }
+
+
+def _apply(timeline: list, deleted: list, moment: datetime, rate: float, description: str):
+    """
+    Record that the rate was `rate` from `moment` until the next known change.
+
+    Intervals stay contiguous and adjacent intervals never share a rate, so an
+    unchanged observation is a no-op.
+    """
+    starts = [interval["valid_from"] for interval in timeline]
+    position = bisect_right(starts, moment) - 1
+
+    if position < 0:
+        # Before everything we know about (or nothing known yet)
+        first = timeline[0] if timeline else None
+        if first is not None and first["rate"] == rate:
+            first["valid_from"] = moment
+            first["dirty"] = True
+        else:
+            timeline.insert(0, _new_interval(rate, description, moment, first["valid_from"] if first else None))
+        return
+
+    current = timeline[position]
+    if current["rate"] == rate:
+        return
+
+    if current["valid_from"] == moment:
+        # Same instant: the later observation wins
+        current["rate"] = rate
+        current["product_description"] = description
+        current["dirty"] = True
+        target = position
+    else:
+        new = _new_interval(rate, description, moment, current["valid_to"])
+        current["valid_to"] = moment
+        current["dirty"] = True
+        timeline.insert(position + 1, new)
+        target = position + 1
+
+    # Merge with neighbours that now carry the same rate
+    following = timeline[target + 1] if target + 1 < len(timeline) else None
+    if following is not None and following["rate"] == rate:
+        timeline[target]["valid_to"] = following["valid_to"]
+        timeline[target]["dirty"] = True
+        if following["id"] is not None:
+            deleted.append(following["id"])
+        del timeline[target + 1]
+    previous = timeline[target - 1] if target > 0 else None
+    if previous is not None and previous["rate"] == rate:
+        previous["valid_to"] = timeline[target]["valid_to"]
+        previous["dirty"] = True
+        if timeline[target]["id"] is not None:
+            deleted.append(timeline[target]["id"])
+        del timeline[target]
+
+
+def apply_observations(db: Session, country: str, observations: list) -> dict:
+    """
+    Fold observed rates into the interval table (caller commits).
+
+    observations is a list of dicts with hs_code, rate, record_date and
+    product_description, applied in order.
+    """
+    if not observations:
+        return {"inserted": 0, "updated": 0, "deleted": 0}
+
+    timelines = _load_timelines(db, country, {obs["hs_code"] for obs in observations})
+    deleted = []
+    for obs in observations:
+        _apply(timelines[obs["hs_code"]], deleted, obs["record_date"], obs["rate"], obs["product_description"])
+
+    now = datetime.utcnow()
+    inserts = []
+    updates = []
+    for code, timeline in timelines.items():
+        for interval in timeline:
+            if not interval["dirty"]:
+                continue
+            values = {
+                "rate": interval["rate"],
+                "product_description": interval["product_description"],
+                "valid_from": interval["valid_from"],
+                "valid_to": interval["valid_to"],
+                "updated_at": now
+            }
+            if interval["id"] is None:
+                inserts.append({"country": country, "hs_code": code, **values})
+            else:
+                updates.append({"id": interval["id"], **values})
+
+    # Deletes first: a surviving interval may take over a deleted one's valid_from
+    if deleted:
+        db.execute(delete(TariffTrendInterval).where(TariffTrendInterval.id.in_(deleted)))
+    if updates:
+        db.execute(update(TariffTrendInterval), updates)
+    if inserts:
+        db.execute(insert(TariffTrendInterval), inserts)
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deleted)}
+
+
+def trend_points(db: Session, country: str = None, hs_code: str = None,
+                 start: datetime = None, end: datetime = None) -> list:
+    """Reconstruct one point per code per day in [start, end] from the intervals"""
+    end = end or datetime.utcnow()
+    query = select(
+        TariffTrendInterval.country, TariffTrendInterval.hs_code, TariffTrendInterval.product_description,
+        TariffTrendInterval.rate, TariffTrendInterval.valid_from, TariffTrendInterval.valid_to
+    ).where(TariffTrendInterval.valid_from <= end)
+    if start is not None:
+        query = query.where(or_(TariffTrendInterval.valid_to.is_(None), TariffTrendInterval.valid_to > start))
+    if country:
+        query = query.where(TariffTrendInterval.country == country)
+    if hs_code:
+        query = query.where(TariffTrendInterval.hs_code == hs_code)
+
+    first_day = start.date() if start else None
+    last_day = end.date()
+    points = []
+    for interval in db.execute(query.order_by(TariffTrendInterval.valid_from)):
+        day = interval.valid_from.date()
+        if first_day and day < first_day:
+            day = first_day
+        # valid_to is exclusive: the interval covers its last day only if it ends after midnight
+        stop = last_day
+        if interval.valid_to is not None:
+            stop = min(stop, (interval.valid_to - timedelta(microseconds=1)).date())
+        while day <= stop:
+            points.append(TrendPoint(
+                interval.country, interval.hs_code, interval.product_description, interval.rate,
+                datetime(day.year, day.month, day.day)
+            ))
+            day += timedelta(days=1)
+
+    points.sort(key=lambda point: point.record_date)
+    return points
+
+
+def migrate_legacy_trends(db: Session, drop_legacy: bool = False) -> dict:
+    """
+    Convert one-row-per-scrape tariff_trends rows into intervals.
+
+    Re-runnable: only rows past the migration watermark are read, and
+    re-applying an observation that is already covered is a no-op.
+    """
+    # Rollups are fed by ingestion now; fold in any legacy rows they have not seen
+    from rollups import update_rollups
+    update_rollups(db)
+
+    started = time.perf_counter()
+    watermark = get_watermark(db, MIGRATION_WATERMARK)
+    max_id = db.execute(select(func.max(TariffTrend.id))).scalar() or 0
+    if max_id <= watermark:
+        return {"rows": 0, "intervals": 0, "seconds": 0.0}
+
+    rows = db.execute(
+        select(
+            TariffTrend.country, TariffTrend.hs_code, TariffTrend.rate,
+            TariffTrend.record_date, TariffTrend.product_description
+        ).where(
+            TariffTrend.id > watermark,
+            TariffTrend.id <= max_id,
+            TariffTrend.record_date.is_not(None)
+        ).order_by(TariffTrend.country, TariffTrend.hs_code, TariffTrend.record_date, TariffTrend.id)
+        .execution_options(yield_per=READ_BATCH_SIZE, stream_results=True)
+    )  # Iterated as it streams; only one chunk of observations is held at a time
+
+    migrated = 0
+    written = 0
+    chunk = []
+    chunk_codes = set()
+    chunk_country = None
+
+    def flush():
+        nonlocal written
+        if chunk:
+            result = apply_observations(db, chunk_country, chunk)
+            written += result["inserted"]
+
+    for row in rows:
+        if chunk_country is not None and (row.country != chunk_country or (
+                row.hs_code not in chunk_codes and len(chunk_codes) >= MIGRATION_CODES_PER_CHUNK)):
+            flush()
+            chunk, chunk_codes = [], set()
+        chunk_country = row.country
+        chunk_codes.add(row.hs_code)
+        chunk.append({
+            "hs_code": row.hs_code,
+            "rate": row.rate,
+            "record_date": row.record_date,
+            "product_description": row.product_description
+        })
+        migrated += 1
+    flush()
+
+    set_watermark(db, MIGRATION_WATERMARK, max_id)
+    if drop_legacy:
+        db.execute(delete(TariffTrend).where(TariffTrend.id <= max_id))
+    db.commit()
+
+    seconds = round(time.perf_counter() - started, 4)
+    logger.info(f"Migrated {migrated} legacy trend rows into {written} intervals in {seconds}s")
+    return {"rows": migrated, "intervals": written, "seconds": seconds}
+
+
+def legacy_trends_pending(db: Session) -> bool:
+    """True when tariff_trends holds rows not yet converted to intervals"""
+    max_id = db.execute(select(func.max(TariffTrend.id))).scalar() or 0
+    return max_id > get_watermark(db, MIGRATION_WATERMARK)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert legacy tariff_trends rows into validity intervals")
+    parser.add_argument("--drop-legacy", action="store_true", help="Delete migrated tariff_trends rows")
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        summary = migrate_legacy_trends(session, drop_legacy=args.drop_legacy)
+        print(f"Migrated {summary['rows']} rows into {summary['intervals']} intervals in {summary['seconds']}s")
+    finally:
+        session.close()
@@ -12,11 +12,24 @@ function App() {
   const [stats, setStats] = useState(null);
   const [activeTab, setActiveTab] = useState('dashboard');
   const [loading, setLoading] = useState(true);
+  const [changeEvent, setChangeEvent] = useState(null);
 
   useEffect(() => {
     fetchStats();
-    const interval = setInterval(fetchStats, 300000); // Refresh every 5 minutes
-    return () => clearInterval(interval);
+    if (!window.EventSource) {
+      const interval = setInterval(fetchStats, 300000); // No SSE support: refresh every 5 minutes
+      return () => clearInterval(interval);
+    }
+
+    // The server pushes new changes and fresh stats after each scrape; the
+    // browser reconnects on its own and resumes from the last event id
+    const source = new EventSource(`${API_URL}/api/stream`);
+    source.addEventListener('changes', (message) => {
+      const event = JSON.parse(message.data);
+      setStats(event.stats);
+      setChangeEvent(event);
+    });
+    return () => source.close();
   }, []);
 
   const fetchStats = async () => {
@@ -71,8 +84,8 @@ function App() {
           <>
             {activeTab === 'dashboard' && <Dashboard stats={stats} />}
             {activeTab === 'chart' && <TariffChart apiUrl={API_URL} />}
-            {activeTab === 'tariffs' && <TariffList apiUrl={API_URL} />}
-            {activeTab === 'changes' && <ChangeLog apiUrl={API_URL} />}
+            {activeTab === 'tariffs' && <TariffList apiUrl={API_URL} changeEvent={changeEvent} />}
+            {activeTab === 'changes' && <ChangeLog apiUrl={API_URL} changeEvent={changeEvent} />}
           </>
         )}
       </main>
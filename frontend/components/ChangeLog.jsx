@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
-function ChangeLog({ apiUrl }) {
+function ChangeLog({ apiUrl, changeEvent }) {
   const [changes, setChanges] = useState([]);
   const [country, setCountry] = useState('');
   const [days, setDays] = useState(7);
@@ -25,6 +25,23 @@ function ChangeLog({ apiUrl }) {
     fetchChanges();
   }, [country, days]);
 
+  // Prepend pushed changes instead of refetching the page
+  useEffect(() => {
+    if (!changeEvent) return;
+    if (changeEvent.truncated) {
+      fetchChanges();
+      return;
+    }
+    const incoming = changeEvent.changes
+      .filter((change) => !country || change.country === country)
+      .reverse();
+    if (incoming.length === 0) return;
+    setChanges((current) => {
+      const known = new Set(current.map((change) => change.id));
+      return [...incoming.filter((change) => !known.has(change.id)), ...current];
+    });
+  }, [changeEvent]);
+
   return (
     <div className="change-log">
       <div className="filters">
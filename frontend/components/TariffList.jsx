@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
-function TariffList({ apiUrl }) {
+function TariffList({ apiUrl, changeEvent }) {
   const [tariffs, setTariffs] = useState([]);
   const [country, setCountry] = useState('');
   const [hsCode, setHsCode] = useState('');
@@ -30,6 +30,16 @@ function TariffList({ apiUrl }) {
     fetchTariffs();
   }, [country, hsCode, page]);
 
+  // Patch rates of rows on screen from pushed changes instead of refetching
+  useEffect(() => {
+    if (!changeEvent || changeEvent.changes.length === 0) return;
+    const latest = new Map(changeEvent.changes.map((change) => [change.tariff_id, change]));
+    setTariffs((current) => current.map((tariff) => {
+      const change = latest.get(tariff.id);
+      return change ? { ...tariff, rate: change.new_rate, last_updated: change.change_date } : tariff;
+    }));
+  }, [changeEvent]);
+
   return (
     <div className="tariff-list">
       <div className="filters">